@@ -6,18 +6,23 @@ See the following link for more details on the PamFax API:
 
 http://www.pamfax.biz/en/extensions/developers/
 
-NOTE: This module has only been tested with python 2.7.
+NOTE: This module requires python 3.
 """
 
-from httplib import HTTPSConnection
-from urllib import urlencode
+from queue import Empty, Queue
+from urllib.parse import urlencode
 
-from processors import Common, FaxHistory, FaxJob, NumberInfo, OnlineStorage, Session, Shopping, UserInfo, _get, _get_url
+from .cache import REMOTE, UploadCache
+from .preprocess import optimize_files
+from .processors import DEFAULT_TIMEOUT, CircuitBreaker, CircuitOpenError, Common, ConnectionPool, FaxHistory, FaxJob, Hedging, NumberInfo, OnlineStorage, Session, Shopping, Timeout, UserInfo, request_timeout
+from .responses import check
 
 import logging
+import shutil
 import sys
+import tempfile
+import threading
 import time
-import types
 
 logger = logging.getLogger('pamfax')
 try:
@@ -26,6 +31,8 @@ except:
     pass
 logger.setLevel(logging.DEBUG)
 
+PROCESSORS = (Session, Common, FaxHistory, FaxJob, NumberInfo, OnlineStorage, Shopping, UserInfo)
+
 class PamFax:
     """Class encapsulating the PamFax API. Actions related to the sending of faxes are called on objects of this class.
     For example, the 'create' action resides in the FaxJob class, but you can just use the following 'shortcut' logic:
@@ -36,33 +43,57 @@ class PamFax:
     
     """
     
-    def __init__(self, username, password, host='api.pamfax.biz', apikey='', apisecret=''):
-        """Creates an instance of the PamFax class and initiates an HTTPS session."""
+    def __init__(self, username, password, host='api.pamfax.biz', apikey='', apisecret='', connections=4, warm=False, context=None, timeout=DEFAULT_TIMEOUT, timeouts=None, hedging=None, breaker=None, usertoken=None):
+        """Creates an instance of the PamFax class and initiates an HTTPS session.
+        
+        Requests are sent over a pool of up to 'connections' HTTPS connections,
+        so the same PamFax object may be used from several threads at once.
+        If warm is true, all of them are opened up front, in parallel. The
+        connections share the given ssl.SSLContext and resume each other's
+        TLS sessions where the ssl module supports it.
+        
+        timeout is the Timeout (connect, read and total limits) for actions
+        without one of their own, and timeouts a dict of action names to
+        Timeouts that overrides the built-in ones, e.g. {'GetFaxState':
+        Timeout(2, 5, 5)}. Use request_timeout to override both for a call.
+        
+        If hedging is true (or a Hedging object), slow get_fax_state,
+        get_number_info and get_fax_details calls are duplicated on a second
+        connection and answered by whichever response arrives first.
+        
+        If breaker is true (or a CircuitBreaker), requests fail fast with
+        CircuitOpenError once the host keeps failing, and the session's
+        ping is used to probe whether it has recovered.
+        
+        If usertoken is given, the session it belongs to is used instead of
+        verifying the user again. The token of the session is available as
+        the usertoken attribute.
+        
+        """
         logger.info("Connecting to %s", host)
-        http = HTTPSConnection(host, None, None, None, None, 142)
+        if hedging is True:
+            hedging = Hedging()
+        if breaker is True:
+            breaker = CircuitBreaker()
+        http = ConnectionPool(host, connections, timeout, context, timeouts, hedging or None, breaker or None)
+        if warm:
+            http.warm()
         api_credentials = '?%s' % urlencode({'apikey': apikey, 'apisecret': apisecret, 'apioutputformat': 'API_FORMAT_JSON'})
-        usertoken = self._get_user_token(http, api_credentials, username, password)
+        if usertoken is None:
+            usertoken = self._get_user_token(http, api_credentials, username, password)
         api_credentials = '%s&%s' % (api_credentials, urlencode({'usertoken': usertoken}))
-        common = Common(api_credentials, http)
-        fax_history = FaxHistory(api_credentials, http)
-        fax_job = FaxJob(api_credentials, http)
-        number_info = NumberInfo(api_credentials, http)
-        online_storage = OnlineStorage(api_credentials, http)
-        session = Session(api_credentials, http)
-        shopping = Shopping(api_credentials, http)
-        user_info = UserInfo(api_credentials, http)
-        attrs = dir(self)
-        for processor in (session, common, fax_history, fax_job, number_info, online_storage, shopping, user_info):
-            for attr_key in dir(processor):
-                if attr_key not in attrs:
-                    attr_value = getattr(processor, attr_key)
-                    if isinstance(attr_value, types.MethodType):
-                        setattr(self, attr_key, attr_value)
+        self.http = http
+        self.usertoken = usertoken
+        self.api_credentials = api_credentials
+        processors = [processor(api_credentials, http) for processor in PROCESSORS]
+        if http.breaker is not None and http.breaker.probe is None:
+            http.breaker.probe = processors[0].ping
+        for index, name in self._delegated:
+            setattr(self, name, getattr(processors[index], name))
     
     def _verify_user(self, http, api_credentials, username, password):
         """Verifies a user via username/password"""
-        url = _get_url('/Session', 'VerifyUser', api_credentials, username=username, password=password)
-        return _get(http, url)
+        return Session(api_credentials, http).verify_user(username, password)
     
     def _get_user_token(self, http, api_credentials, username, password):
         """Gets the user token to use with subsequent requests."""
@@ -98,15 +129,164 @@ class PamFax:
                 if state == '' or state == 'converting':
                     converting = True
         return converting
+    
+    def add_file_cached(self, filename, cache, origin=None, progress=None):
+        """Adds a file to the current fax, reusing a cached reference to its content instead of uploading it where possible.
+        
+        If the cache has a remote URL or online storage file with the same content, that is added
+        in its place. A reference that PamFax rejects is dropped from the cache and the file is
+        uploaded as usual. An upload does not produce such a reference, so the URLs and online
+        storage files have to be registered with the cache by the caller.
+        
+        Arguments:
+        filename -- The local file to add
+        cache -- An UploadCache (see pamfax.cache)
+        
+        Keyword arguments:
+        origin -- Optional file origin passed on to add_file
+        progress -- Optional callable(bytes_sent, bytes_total) passed on to add_file
+        
+        """
+        response = self._add_cached_reference(filename, cache)
+        if response is None:
+            response = self.add_file(filename, origin, progress)
+        return response
+    
+    def _add_cached_reference(self, filename, cache):
+        """Adds the cached stand-in for a file to the current fax and returns the response, or None if there is none."""
+        entry = cache.lookup(filename)
+        if entry is None:
+            return None
+        if entry[0] == REMOTE:
+            response = self.add_remote_file(entry[1])
+        else:
+            response = self.add_file_from_online_storage(entry[1], entry[2])
+        if response['result']['code'] == 'success':
+            return response
+        logger.warning("Cached reference for %s was rejected: %s", filename, response['result']['message'])
+        cache.forget(filename)
+        return None
+    
+    def create_with_files(self, filenames, cache, **kwargs):
+        """Starts a new fax job that contains the given documents and returns the Create or CloneFax response.
+        
+        If the cache knows a sent fax with exactly these documents, that fax is cloned and its
+        recipients are removed, which avoids uploading anything. Otherwise a new fax is created
+        and the files are added with add_files, using the cache for each file. Note that a cloned
+        fax also keeps the cover and notification settings of the original.
+        
+        Create returns the fax still in edit mode in this session, if any, so
+        its files and recipients are removed first. Once all files were added
+        successfully, the new fax is recorded in the cache for these documents,
+        so that later faxes with the same documents are cloned from it instead
+        of uploading them again. The fax is recorded before it is sent: if it
+        is never sent, cloning it fails later, and the entry is dropped and a
+        new fax created instead.
+        
+        Arguments:
+        filenames -- Sequence of local files the fax should contain
+        cache -- An UploadCache (see pamfax.cache)
+        
+        Keyword arguments:
+        **kwargs -- passed on to add_files
+        
+        """
+        uuid = cache.lookup_fax(filenames)
+        if uuid is not None:
+            response = self.clone_fax(uuid)
+            if response['result']['code'] == 'success':
+                self.remove_all_recipients()
+                return response
+            logger.warning("Cached fax %s could not be cloned: %s", uuid, response['result']['message'])
+            cache.forget_fax(filenames)
+        response = self.create()
+        if response['result']['code'] != 'success':
+            return response
+        check(self.remove_all_files())
+        check(self.remove_all_recipients())
+        responses = self.add_files(filenames, cache=cache, **kwargs)
+        uuid = response.get('FaxContainer', {}).get('uuid')
+        if uuid is not None and all(added['result']['code'] == 'success' for added in responses):
+            cache.register_fax(filenames, uuid)
+        return response
+    
+    def add_files(self, filenames, origin=None, progress=None, blocking=True, interval=1, optimize=False, cache=None):
+        """Uploads several files to the current fax job concurrently, then waits for all of them to be converted.
+        
+        Each upload runs on its own pooled connection, so the whole set takes
+        roughly as long as the slowest file rather than the sum of all of them.
+        Returns the AddFile responses in the same order as filenames.
+        
+        Arguments:
+        filenames -- Sequence of local files to add to the fax
+        
+        Keyword arguments:
+        origin -- Optional file origin passed on to add_file
+        progress -- Optional callable(filename, bytes_sent, bytes_total) invoked as each upload proceeds
+        blocking -- If true, returns only once no file in the fax job is converting any more
+        interval -- Seconds to wait between fax state checks while files are converting
+        optimize -- If true, shrinks images to fax resolution locally before uploading them (see pamfax.preprocess)
+        cache -- Optional UploadCache whose references are added instead of uploading files with the same content
+        
+        """
+        directory = None
+        uploads = filenames
+        if optimize:
+            directory = tempfile.mkdtemp(prefix='pamfax-')
+            uploads = optimize_files(filenames, directory)
+        pending = Queue()
+        for i, filename in enumerate(filenames):
+            pending.put((i, filename, uploads[i]))
+        responses = [None] * len(filenames)
+        errors = []
+        
+        def upload():
+            while True:
+                try:
+                    i, filename, upload_filename = pending.get_nowait()
+                except Empty:
+                    return
+                callback = None
+                if progress is not None:
+                    callback = lambda sent, total, filename=filename: progress(filename, sent, total)
+                try:
+                    response = None
+                    if cache is not None:
+                        response = self._add_cached_reference(filename, cache)
+                    if response is None:
+                        response = self.add_file(upload_filename, origin, callback)
+                    responses[i] = response
+                except Exception as e:
+                    logger.error("Uploading %s failed: %s", filename, e)
+                    errors.append(e)
+        
+        try:
+            workers = [threading.Thread(target=upload) for i in range(min(len(filenames), self.http.size))]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            if directory is not None:
+                shutil.rmtree(directory, True)
+        if errors:
+            raise errors[0]
+        if blocking:
+            while self.is_converting(self.get_fax_state()):
+                time.sleep(interval)
+        return responses
 
-if __name__ == '__main__':
-    print >>sys.stderr, """
+# the processor methods that PamFax objects delegate to, as (index into PROCESSORS, name) pairs, looked up once
+PamFax._delegated = tuple((index, name) for index, processor in enumerate(PROCESSORS) for name in processor.methods if not hasattr(PamFax, name))
 
+if __name__ == '__main__':
+    print("""
+ 
  This is the Python implementation of the PamFax API.
-
+ 
  To run the test suite, please run:
-
+    
     cd test
     python test.py
 
-"""
+""", file=sys.stderr)
@@ -0,0 +1,179 @@
+"""
+Archiving of inbound faxes into a content-addressed store on disk.
+
+InboxArchiver pages through FaxHistory/ListInboxFaxes and downloads the file
+of every fax not archived yet with Common/GetFile, several at a time over the
+connection pool. Each file is streamed straight to a temporary file, hashed
+on the way, and atomically renamed to objects/<sha1> in the archive
+directory. An append-only index maps file uuids to their content hash, so an
+interrupted run picks up where it stopped, and temporary files left behind by
+a crash are removed when the archive is opened again. Newly stored faxes are
+marked as read in bulk with FaxHistory/SetFaxesAsRead.
+"""
+
+from .responses import ITEMS_PER_PAGE, check, pages
+
+from queue import Queue
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+READ_BATCH_SIZE = 100
+
+logger = logging.getLogger('pamfax')
+
+class _HashingWriter:
+    """A file wrapper that computes the SHA-1 of everything written through it."""
+    
+    def __init__(self, f):
+        """Instantiates the _HashingWriter class"""
+        self.f = f
+        self.sha1 = hashlib.sha1()
+    
+    def write(self, data):
+        """Writes data to the file and adds it to the hash."""
+        self.sha1.update(data)
+        self.f.write(data)
+
+class InboxArchiver:
+    """Downloads inbox faxes into a content-addressed directory, skipping what is already stored."""
+    
+    def __init__(self, pamfax, directory, threads=None):
+        """Instantiates the InboxArchiver class
+        
+        Arguments:
+        pamfax -- The PamFax object to list and download faxes with
+        directory -- The archive directory, created if it does not exist
+        
+        Keyword arguments:
+        threads -- Number of concurrent downloads (the PamFax connection pool size by default)
+        
+        """
+        self.pamfax = pamfax
+        self.directory = directory
+        self.threads = threads or pamfax.http.size
+        self._lock = threading.Lock()
+        self._objects = os.path.join(directory, 'objects')
+        self._temp = os.path.join(directory, 'tmp')
+        for path in (self._objects, self._temp):
+            if not os.path.isdir(path):
+                os.makedirs(path)
+        for name in os.listdir(self._temp):
+            logger.info("Removing temporary file %s left by an interrupted run", name)
+            os.remove(os.path.join(self._temp, name))
+        self._index_filename = os.path.join(directory, 'index')
+        self.index = {}
+        if os.path.exists(self._index_filename):
+            f = open(self._index_filename, 'r')
+            try:
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) == 3:
+                        self.index[fields[0]] = (fields[1], fields[2])
+            finally:
+                f.close()
+        self._index = open(self._index_filename, 'a')
+    
+    def path(self, file_uuid):
+        """Returns the path of an archived file, or None if it has not been archived."""
+        entry = self.index.get(file_uuid)
+        if entry is None:
+            return None
+        return os.path.join(self._objects, entry[0])
+    
+    def _store(self, file_uuid):
+        """Downloads a file into the store and records it in the index."""
+        fd, temp = tempfile.mkstemp(dir=self._temp)
+        f = os.fdopen(fd, 'wb')
+        try:
+            writer = _HashingWriter(f)
+            result = self.pamfax.get_file(file_uuid, sink=writer)
+            if isinstance(result, dict):
+                raise Exception(result['result']['message'])
+            content_type = result[1] or ''
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+            digest = writer.sha1.hexdigest()
+            os.replace(temp, os.path.join(self._objects, digest))
+        except:
+            f.close()
+            os.remove(temp)
+            raise
+        self._lock.acquire()
+        try:
+            self._index.write('%s\t%s\t%s\n' % (file_uuid, digest, content_type))
+            self._index.flush()
+            os.fsync(self._index.fileno())
+            self.index[file_uuid] = (digest, content_type)
+        finally:
+            self._lock.release()
+    
+    def archive(self, mark_read=True, items_per_page=ITEMS_PER_PAGE):
+        """Archives all inbox faxes not stored yet and returns a dict of counts.
+        
+        The result has the keys 'stored', 'skipped', 'failed' and 'unmarked'.
+        Faxes stored by this call are marked as read if mark_read is true;
+        'unmarked' counts those the API refused to mark. Faxes that were
+        already archived are left as they are.
+        
+        """
+        counts = {'stored': 0, 'skipped': 0, 'failed': 0, 'unmarked': 0}
+        stored_uuids = []
+        downloads = Queue(self.threads * 2)
+        
+        def download():
+            while True:
+                fax = downloads.get()
+                if fax is None:
+                    return
+                try:
+                    self._store(fax['file_uuid'])
+                except Exception as e:
+                    logger.error("Archiving fax %s failed: %s", fax['uuid'], e)
+                    self._count(counts, 'failed')
+                    continue
+                self._count(counts, 'stored')
+                stored_uuids.append(fax['uuid'])
+        
+        workers = [threading.Thread(target=download) for i in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        try:
+            for faxes in pages(self.pamfax.list_inbox_faxes, items_per_page):
+                for fax in faxes:
+                    if not fax.get('file_uuid'):
+                        continue
+                    if fax['file_uuid'] in self.index:
+                        counts['skipped'] += 1
+                    else:
+                        downloads.put(fax)
+        finally:
+            for worker in workers:
+                downloads.put(None)
+            for worker in workers:
+                worker.join()
+        if mark_read:
+            for i in range(0, len(stored_uuids), READ_BATCH_SIZE):
+                batch = stored_uuids[i:i + READ_BATCH_SIZE]
+                try:
+                    check(self.pamfax.set_faxes_as_read(batch))
+                except Exception as e:
+                    logger.error("Marking %d faxes as read failed: %s", len(batch), e)
+                    counts['unmarked'] += len(batch)
+        return counts
+    
+    def _count(self, counts, key):
+        """Increments one of the counts of a running archive call."""
+        self._lock.acquire()
+        try:
+            counts[key] += 1
+        finally:
+            self._lock.release()
+    
+    def close(self):
+        """Closes the index file."""
+        self._index.close()
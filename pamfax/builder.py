@@ -0,0 +1,118 @@
+"""
+A pipelined builder for sending a single fax.
+
+Sending a fax the plain way is a chain of blocking calls: create, add each
+file, add the recipients, set the cover, wait for the files to be converted
+and send. Only create has to come first. FaxBuilder runs the remaining setup
+steps at the same time on pooled connections, so the recipients and cover are
+set while the files upload and convert, and returns a Future that resolves
+with the Send response once the fax has been accepted.
+"""
+
+from .futures import Future, run_async
+from .responses import check
+
+import time
+
+class FaxBuilder:
+    """Collects the settings of a fax and sends it with as many steps overlapped as possible.
+    
+    PamFax keeps one fax job in edit mode per session, so only one builder per
+    PamFax object should be sending at a time.
+    
+    """
+    
+    def __init__(self, pamfax):
+        """Instantiates the FaxBuilder class
+        
+        Arguments:
+        pamfax -- The PamFax object to build and send the fax with
+        
+        """
+        self.pamfax = pamfax
+        self.files = []
+        self.remote_files = []
+        self.numbers = []
+        self.names = []
+        self.cover = None
+        self.notifications = None
+    
+    def add_file(self, filename):
+        """Adds a local file to upload. Returns the builder."""
+        self.files.append(filename)
+        return self
+    
+    def add_remote_file(self, url):
+        """Adds a file that PamFax fetches from url. Returns the builder."""
+        self.remote_files.append(url)
+        return self
+    
+    def add_recipient(self, number, name=None):
+        """Adds a recipient. Returns the builder."""
+        self.numbers.append(number)
+        self.names.append(name or '')
+        return self
+    
+    def set_cover(self, template_id, text=None):
+        """Sets the cover template and text. Returns the builder."""
+        self.cover = (template_id, text)
+        return self
+    
+    def set_notifications(self, notifications, group_notification=None, error_notification=None):
+        """Sets the notification options (see FaxJob.set_notifications). Returns the builder."""
+        self.notifications = (notifications, group_notification, error_notification)
+        return self
+    
+    def _add_files(self):
+        """Uploads the local files concurrently and adds the remote ones, without waiting for conversion."""
+        for url in self.remote_files:
+            check(self.pamfax.add_remote_file(url))
+        if self.files:
+            for response in self.pamfax.add_files(self.files, blocking=False):
+                check(response)
+    
+    def _set_recipients(self):
+        """Sets the recipients of the fax in one call."""
+        names = self.names
+        if not any(names):
+            names = None
+        check(self.pamfax.set_recipients(self.numbers, names))
+    
+    def _set_options(self):
+        """Sets the cover and notification options."""
+        if self.cover is not None:
+            check(self.pamfax.set_cover(*self.cover))
+        if self.notifications is not None:
+            check(self.pamfax.set_notifications(*self.notifications))
+    
+    def _build_and_send(self, send_at, interval, timeout):
+        """Runs all steps of the fax job and returns the Send response."""
+        check(self.pamfax.create())
+        steps = [run_async(self._add_files), run_async(self._set_recipients), run_async(self._set_options)]
+        for exception in [step.exception() for step in steps]:
+            if exception is not None:
+                raise exception
+        deadline = time.time() + timeout
+        while self.pamfax.is_converting(self.pamfax.get_fax_state()):
+            if time.time() > deadline:
+                raise Exception("Files still converting after %d seconds" % timeout)
+            time.sleep(interval)
+        return check(self.pamfax.send(send_at))
+    
+    def send(self, send_at=None, interval=1, timeout=600):
+        """Starts building and sending the fax in the background and returns a Future.
+        
+        The future resolves with the Send response once PamFax has accepted the
+        fax, or with the exception of the first step that failed.
+        
+        Keyword arguments:
+        send_at -- Optional time to send the fax at (see FaxJob.send)
+        interval -- Seconds to wait between fax state checks while files are converting
+        timeout -- Seconds to wait for the files to be converted before giving up
+        
+        """
+        if not self.numbers:
+            future = Future()
+            future.set_exception(Exception("A fax needs at least one recipient"))
+            return future
+        return run_async(self._build_and_send, send_at, interval, timeout)
@@ -0,0 +1,134 @@
+"""
+A content-addressed cache of documents that do not need to be uploaded again.
+
+PamFax can add a document to a fax job without the client sending its bytes,
+either from a URL (FaxJob/AddRemoteFile) or from a connected online storage
+provider (FaxJob/AddFileFromOnlineStorage), and a whole sent fax including its
+documents can be copied with FaxJob/CloneFax. UploadCache remembers, keyed by
+the SHA-1 of a file's content, which of those references can stand in for a
+local file, so that a document sent with thousands of faxes is only uploaded
+once.
+
+A file added to a fax job with FaxJob/AddFile cannot be added to another job
+by reference, so the cache cannot learn URLs and online storage files from
+uploads. Registering them (see register_remote_file and
+register_online_storage_file) is up to the application, e.g. after putting a
+document on a web server or in Dropbox. Sent faxes are recorded automatically
+by PamFax.create_with_files.
+"""
+
+from .preprocess import file_digest
+from .processors import jsonlib
+
+import hashlib
+import os
+import threading
+
+REMOTE = 'remote'
+ONLINE_STORAGE = 'online_storage'
+FAX = 'fax'
+
+class UploadCache:
+    """Maps file content hashes to references PamFax can add to a fax job without an upload.
+    
+    Entries are tuples of either (REMOTE, url) or (ONLINE_STORAGE, provider,
+    uuid). Whole sets of documents may also be mapped to the uuid of a sent
+    fax that contains exactly those documents, for use with clone_fax. If a
+    filename is given, the cache is loaded from and saved to that JSON file.
+    
+    """
+    
+    def __init__(self, filename=None):
+        """Instantiates the UploadCache class
+        
+        Keyword arguments:
+        filename -- Optional JSON file to persist the cache in
+        
+        """
+        self.filename = filename
+        self._entries = {}
+        self._digests = {}
+        self._lock = threading.Lock()
+        if filename is not None and os.path.exists(filename):
+            f = open(filename, 'rb')
+            try:
+                for digest, entry in jsonlib.loads(f.read()).items():
+                    self._entries[digest] = tuple(entry)
+            finally:
+                f.close()
+    
+    def digest(self, filename):
+        """Returns the content hash of a file, hashing it only once while its size and mtime are unchanged."""
+        stat = os.stat(filename)
+        key = (os.path.abspath(filename), stat.st_size, stat.st_mtime)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = file_digest(filename)
+            self._digests[key] = digest
+        return digest
+    
+    def _set(self, digest, entry):
+        """Stores an entry and persists the cache if it has a filename."""
+        self._lock.acquire()
+        try:
+            self._entries[digest] = entry
+            self._save()
+        finally:
+            self._lock.release()
+    
+    def _save(self):
+        """Writes the cache to its file atomically. Must be called with the lock held."""
+        if self.filename is None:
+            return
+        temp = '%s.%d.tmp' % (self.filename, os.getpid())
+        f = open(temp, 'w')
+        try:
+            f.write(jsonlib.dumps(self._entries))
+        finally:
+            f.close()
+        os.replace(temp, self.filename)
+    
+    def register_remote_file(self, filename, url):
+        """Records that the content of a local file can be fetched by PamFax from url."""
+        self._set(self.digest(filename), (REMOTE, url))
+    
+    def register_online_storage_file(self, filename, provider, uuid):
+        """Records that the content of a local file is available from an online storage provider."""
+        self._set(self.digest(filename), (ONLINE_STORAGE, provider, uuid))
+    
+    def register_fax(self, filenames, uuid):
+        """Records that the sent fax uuid contains exactly the given documents, in order."""
+        self._set(self._fax_key(filenames), (FAX, uuid))
+    
+    def _fax_key(self, filenames):
+        """Returns the cache key for an ordered set of documents."""
+        return 'fax:%s' % hashlib.sha1(','.join([self.digest(filename) for filename in filenames]).encode('ascii')).hexdigest()
+    
+    def lookup(self, filename):
+        """Returns the entry that can stand in for a local file, or None."""
+        return self._entries.get(self.digest(filename))
+    
+    def lookup_fax(self, filenames):
+        """Returns the uuid of a sent fax containing exactly the given documents, or None."""
+        entry = self._entries.get(self._fax_key(filenames))
+        if entry is None:
+            return None
+        return entry[1]
+    
+    def forget(self, filename):
+        """Removes the entry for a local file, for example after its reference stopped working."""
+        self._lock.acquire()
+        try:
+            self._entries.pop(self.digest(filename), None)
+            self._save()
+        finally:
+            self._lock.release()
+    
+    def forget_fax(self, filenames):
+        """Removes the sent fax entry for a set of documents."""
+        self._lock.acquire()
+        try:
+            self._entries.pop(self._fax_key(filenames), None)
+            self._save()
+        finally:
+            self._lock.release()
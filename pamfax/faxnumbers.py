@@ -0,0 +1,149 @@
+"""
+Offline normalization and validation of fax numbers.
+
+NumberInfo/GetNumberInfo costs a round trip per number. Most malformed
+numbers can be rejected without it: NumberValidator normalizes numbers to
+E.164 form (+<country code><national number>) and detects the country by its
+calling code, using the country list from Common/ListZones and
+Common/ListCountriesForZone, which only has to be fetched once and can be
+cached in a local file. Only numbers that pass are worth sending to the API.
+"""
+
+from .processors import jsonlib
+from .responses import content, field
+
+import logging
+import os
+import re
+
+MIN_DIGITS = 7
+MAX_DIGITS = 15
+
+logger = logging.getLogger('pamfax')
+
+_SEPARATORS = re.compile(r'[\s\-\.\(\)/]')
+_DIGITS = re.compile(r'\d+')
+
+def normalize_number(number):
+    """Returns a fax number in +<digits> form, or None if it can not be one.
+    
+    Spaces, dashes, dots, slashes and parentheses are removed and a leading 00
+    international prefix is replaced with +. Country codes never start with 0.
+    Unlike NumberValidator.normalize, no country list is needed.
+    
+    """
+    number = _SEPARATORS.sub('', number)
+    if number.startswith('00'):
+        number = '+' + number[2:]
+    if not number.startswith('+') or not number[1:].isdigit() or number[1] == '0':
+        return None
+    return number
+
+class NumberValidator:
+    """Normalizes fax numbers to E.164 and detects their country without calling the API.
+    
+    Instances are callable and return whether a number is plausible, so they can be
+    used as the validator (and their normalize method as the normalizer) of
+    pamfax.recipients.load_recipients.
+    
+    """
+    
+    def __init__(self, countries, default_country=None):
+        """Instantiates the NumberValidator class
+        
+        Arguments:
+        countries -- Sequence of (country code, calling code, zone) tuples, e.g. ('DE', '49', 2)
+        
+        Keyword arguments:
+        default_country -- Country code to assume for numbers given without international prefix
+        
+        """
+        self.countries = [tuple(country) for country in countries]
+        self._prefixes = {}
+        self._trunk = None
+        for code, prefix, zone in self.countries:
+            self._prefixes[prefix] = (code, zone)
+            if code == default_country:
+                self._trunk = prefix
+        if default_country is not None and self._trunk is None:
+            raise ValueError("Unknown country: %s" % default_country)
+        self._lengths = sorted(set([len(prefix) for prefix in self._prefixes]), reverse=True)
+    
+    @classmethod
+    def from_pamfax(cls, pamfax, filename=None, default_country=None):
+        """Creates a NumberValidator from the PamFax country list.
+        
+        If filename exists, the country list is read from it instead of the API.
+        Otherwise it is fetched with ListZones and ListCountriesForZone and, if
+        filename is given, written there for next time.
+        
+        """
+        if filename is not None and os.path.exists(filename):
+            f = open(filename, 'rb')
+            try:
+                return cls(jsonlib.loads(f.read()), default_country)
+            finally:
+                f.close()
+        countries = []
+        for zone in content(pamfax.list_zones()):
+            zone = field(zone, ('zone', 'id'))
+            for country in content(pamfax.list_countries_for_zone(zone)):
+                code = field(country, ('code', 'countrycode', 'country_code'))
+                prefix = ''.join(_DIGITS.findall(str(field(country, ('prefix', 'country_prefix', 'countryprefix')) or '')))
+                if code and prefix:
+                    countries.append((code, prefix, zone))
+        logger.info("Loaded %d countries for number validation", len(countries))
+        if filename is not None:
+            f = open(filename, 'w')
+            try:
+                f.write(jsonlib.dumps(countries))
+            finally:
+                f.close()
+        return cls(countries, default_country)
+    
+    def normalize(self, number):
+        """Returns the number in E.164 form, or None if it can not be a valid fax number.
+        
+        Separators are removed, a leading 00 is treated as the international
+        prefix and, with a default country, numbers without one are taken as
+        national numbers with an optional leading trunk 0.
+        
+        """
+        number = _SEPARATORS.sub('', number)
+        if number.startswith('+'):
+            digits = number[1:]
+        elif number.startswith('00'):
+            digits = number[2:]
+        elif self._trunk is not None:
+            digits = self._trunk + (number[1:] if number.startswith('0') else number)
+        else:
+            return None
+        if not digits.isdigit() or not MIN_DIGITS <= len(digits) <= MAX_DIGITS:
+            return None
+        if self._country(digits) is None:
+            return None
+        return '+' + digits
+    
+    def _country(self, digits):
+        """Returns the (country code, zone) for the longest matching calling code, or None."""
+        for length in self._lengths:
+            country = self._prefixes.get(digits[:length])
+            if country is not None:
+                return country
+        return None
+    
+    def country(self, number):
+        """Returns the (country code, zone) of a number, or None if it is not valid."""
+        number = self.normalize(number)
+        if number is None:
+            return None
+        return self._country(number[1:])
+    
+    def normalize_all(self, numbers):
+        """Normalizes a batch of numbers, returning None in place of each invalid one."""
+        normalize = self.normalize
+        return [normalize(number) for number in numbers]
+    
+    def __call__(self, number):
+        """Returns whether the number is a plausible fax number."""
+        return self.normalize(number) is not None
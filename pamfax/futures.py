@@ -0,0 +1,29 @@
+"""
+Futures for results that are produced on background threads.
+
+The helpers in this package return concurrent.futures.Future objects, which
+are re-exported here together with TimeoutError for convenience.
+"""
+
+from concurrent.futures import Future, TimeoutError
+
+import threading
+
+def run_async(function, *args, **kwargs):
+    """Calls function(*args, **kwargs) on a new daemon thread and returns a Future for its result."""
+    future = Future()
+    
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+    
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return future
@@ -0,0 +1,231 @@
+"""
+A receiver for PamFax fax notifications.
+
+Instead of polling for the state of every sent fax, NotificationReceiver
+runs a small HTTP server that PamFax (or any other sender, such as a test)
+can deliver fax events to, by GET query or by POST of a form or JSON body.
+Each event is mapped to the uuid of its fax, and the futures and callbacks
+waiting for that fax are resolved as soon as an event says it is done.
+Changes registered with Session.register_listener can be fed in the same way
+with poll_changes. If a StatusScheduler is given, it keeps polling as a
+fallback for faxes that no notification arrives for.
+"""
+
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, quote, urlparse
+
+from .futures import Future
+from .processors import jsonlib
+from .scheduler import DONE_STATES
+
+import hmac
+import logging
+import threading
+
+DONE_EVENTS = ('faxsucceeded', 'faxfailed') + DONE_STATES
+UUID_FIELDS = ('fax_uuid', 'faxuuid', 'uuid')
+TYPE_FIELDS = ('type', 'event', 'state', 'status')
+MAX_REMEMBERED = 1000
+
+logger = logging.getLogger('pamfax')
+
+def _event(fields):
+    """Returns an event dict with 'uuid' and 'type' keys from the fields of a notification, or None if it names no fax."""
+    if 'FaxContainer' in fields and isinstance(fields['FaxContainer'], dict):
+        fields = dict(fields['FaxContainer'], **fields)
+    event = dict(fields)
+    event['uuid'] = None
+    for name in UUID_FIELDS:
+        if fields.get(name):
+            event['uuid'] = fields[name]
+            break
+    event['type'] = None
+    for name in TYPE_FIELDS:
+        if fields.get(name):
+            event['type'] = str(fields[name]).lower()
+            break
+    if event['uuid'] is None:
+        return None
+    return event
+
+class _Handler(BaseHTTPRequestHandler):
+    """Passes notifications on to the receiver of the server."""
+    
+    def _handle(self, body):
+        receiver = self.server.receiver
+        url = urlparse(self.path)
+        query = dict(parse_qsl(url.query))
+        secret = query.pop('secret', '')
+        if url.path != receiver.path or (receiver.secret is not None and not hmac.compare_digest(secret.encode('utf-8'), receiver.secret.encode('utf-8'))):
+            self.send_error(404)
+            return
+        fields = query
+        if body:
+            try:
+                if (self.headers.get('content-type') or '').startswith('application/json'):
+                    data = jsonlib.loads(body)
+                else:
+                    data = dict(parse_qsl(body.decode('utf-8')))
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                self.send_error(400, "Expected a form or a JSON object")
+                return
+            fields = dict(query, **data)
+        receiver.dispatch(fields)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def do_GET(self):
+        self._handle(b'')
+    
+    def do_POST(self):
+        self._handle(self.rfile.read(int(self.headers.get('content-length') or 0)))
+    
+    def log_message(self, format, *args):
+        logger.debug("Notification from %s: %s", self.client_address[0], format % args)
+
+class NotificationReceiver:
+    """Receives fax notifications over HTTP and resolves the futures and callbacks waiting for them.
+    
+    For example:
+    
+    receiver = NotificationReceiver(port=8080)
+    receiver.start()
+    future = receiver.expect(fax_uuid)
+    ...
+    event = future.result(timeout=600)
+    
+    """
+    
+    def __init__(self, host='127.0.0.1', port=0, path='/pamfax', secret=None, scheduler=None):
+        """Instantiates the NotificationReceiver class
+        
+        Keyword arguments:
+        host -- The address to listen on
+        port -- The port to listen on (any free port by default, see the url attribute)
+        path -- The URL path notifications are delivered to
+        secret -- Optional value that senders must pass as the 'secret' query parameter
+        scheduler -- Optional StatusScheduler to poll for expected faxes no notification arrives for
+        
+        """
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.scheduler = scheduler
+        self._pending = {}
+        self._done = OrderedDict()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._server = None
+    
+    @property
+    def url(self):
+        """The URL to have notifications sent to, once the receiver has been started."""
+        url = 'http://%s:%d%s' % (self.host, self.port, self.path)
+        if self.secret is not None:
+            url = '%s?secret=%s' % (url, quote(self.secret, safe=''))
+        return url
+    
+    def start(self):
+        """Starts the HTTP server on a background thread."""
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.receiver = self
+        self.port = self._server.server_address[1]
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        logger.info("Receiving notifications at %s", self.url)
+    
+    def stop(self):
+        """Stops the HTTP server."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    def subscribe(self, callback):
+        """Calls callback(event) for every event received, done or not."""
+        self._listeners.append(callback)
+    
+    def expect(self, uuid, callback=None, **track_kwargs):
+        """Returns a Future that resolves with the first event saying the fax with this uuid is done.
+        
+        Arguments:
+        uuid -- The uuid of a sent fax
+        
+        Keyword arguments:
+        callback -- Optional callable(future) to call once the fax is done
+        **track_kwargs -- passed on to the fallback scheduler's track (e.g. pages, recipients)
+        
+        """
+        self._lock.acquire()
+        try:
+            future = self._pending.get(uuid)
+            if future is None:
+                future = self._pending[uuid] = Future()
+            event = self._done.pop(uuid, None)
+        finally:
+            self._lock.release()
+        if callback is not None:
+            future.add_done_callback(callback)
+        if event is not None:
+            self._resolve(event)
+        elif self.scheduler is not None:
+            self.scheduler.track(uuid, callback=self._polled, **track_kwargs)
+        return future
+    
+    def _polled(self, uuid, fax):
+        """Resolves a fax found to be done by the fallback scheduler."""
+        logger.debug("Fax %s was found done by polling", uuid)
+        event = _event(dict(fax, uuid=uuid)) or {'uuid': uuid, 'type': None}
+        event['polled'] = True
+        self._resolve(event)
+    
+    def _resolve(self, event):
+        """Completes the future waiting for an event's fax, or remembers the event if none is waiting yet."""
+        self._lock.acquire()
+        try:
+            future = self._pending.pop(event['uuid'], None)
+            if future is None:
+                self._done[event['uuid']] = event
+                while len(self._done) > MAX_REMEMBERED:
+                    self._done.popitem(last=False)
+        finally:
+            self._lock.release()
+        if future is not None:
+            if self.scheduler is not None:
+                self.scheduler.untrack(event['uuid'])
+            future.set_result(event)
+    
+    def dispatch(self, fields):
+        """Handles the fields of a notification as if it had been received over HTTP. Returns the event, or None."""
+        event = _event(fields)
+        if event is None:
+            logger.warning("Ignoring notification without a fax uuid: %s", fields)
+            return None
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error("Notification listener failed: %s", e)
+        if event['type'] in DONE_EVENTS:
+            self._resolve(event)
+        return event
+    
+    def poll_changes(self, pamfax):
+        """Dispatches the fax changes from Session.list_changes (see Session.register_listener). Returns the number of events."""
+        response = pamfax.list_changes()
+        if response['result']['code'] != 'success':
+            raise Exception(response['result']['message'])
+        count = 0
+        for key, value in response.items():
+            if key == 'result' or not isinstance(value, dict):
+                continue
+            for change in value.get('content', []):
+                if isinstance(change, dict) and self.dispatch(change) is not None:
+                    count += 1
+        return count
@@ -0,0 +1,309 @@
+"""
+A durable local queue of outbound faxes.
+
+Outbox keeps faxes waiting to be sent in an SQLite database in WAL mode, so
+that requests can be accepted at any rate while workers send them at the pace
+PamFax allows. Each step of building and sending a fax (create, add files,
+set recipients and options, send) is committed to the database as it
+completes, and workers lease jobs for a limited time, so several threads or
+processes can share one outbox and a job whose worker died is picked up
+again once its lease expires.
+
+A fax job that is being built only exists in the PamFax session that created
+it, so a job interrupted before sending is built again from the start in the
+new worker's session, after removing any files and recipients an earlier
+attempt left in the fax being edited. A job interrupted while sending is
+first looked up with FaxHistory/GetFaxDetails, and only sent again if PamFax
+does not know it as sent. Attempts are counted when a job is leased, so a job
+that keeps crashing its workers also fails after max_attempts.
+"""
+
+from .processors import jsonlib
+from .responses import check, container, field
+
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+QUEUED = 'queued'
+CREATED = 'created'
+FILES_ADDED = 'files_added'
+PREPARED = 'prepared'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+UNSENT_STATES = ('editing', 'converting', 'ready_to_send')
+UNKNOWN_FAX_CODES = ('fax_not_found', 'invalid_fax', 'invalid_uuid', 'not_found')
+
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    spec TEXT NOT NULL,
+    state TEXT NOT NULL,
+    fax_uuid TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (state, lease_expires);
+CREATE TABLE IF NOT EXISTS events (
+    job_id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    at REAL NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS events_job ON events (job_id);
+"""
+
+logger = logging.getLogger('pamfax')
+
+class LeaseLost(Exception):
+    """Raised when a worker updates a job whose lease has expired and been taken over."""
+    pass
+
+class Outbox:
+    """A durable queue of faxes to send, shared by any number of worker threads and processes.
+    
+    Each worker should use its own PamFax object, since PamFax keeps only one
+    fax job in edit mode per session.
+    
+    """
+    
+    def __init__(self, filename, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY):
+        """Instantiates the Outbox class
+        
+        Arguments:
+        filename -- The SQLite database file, created if it does not exist
+        
+        Keyword arguments:
+        lease_seconds -- Seconds a worker holds a job before others may take it over; renewed at each step
+        max_attempts -- Number of failed attempts after which a job is marked as failed
+        retry_delay -- Seconds to wait before retrying a failed attempt
+        
+        """
+        self.filename = filename
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+    
+    def _connection(self):
+        """Returns the database connection of the current thread, opening it on first use."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.filename, timeout=60, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=FULL')
+            self._local.connection = connection
+        return connection
+    
+    def _transaction(self, function, *args):
+        """Runs function(connection, *args) in an immediate transaction and returns its result."""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = function(connection, *args)
+        except:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+    
+    def enqueue(self, numbers, files=(), names=None, remote_files=(), cover=None, notifications=None, send_at=None):
+        """Adds a fax to the queue and returns its job id.
+        
+        Arguments:
+        numbers -- The fax numbers of the recipients
+        
+        Keyword arguments:
+        files -- Local files to upload; they must still exist when the job is processed
+        names -- Optional recipient names, in the same order as numbers
+        remote_files -- URLs of files for PamFax to fetch
+        cover -- Optional (template_id, text) tuple for the cover page
+        notifications -- Optional (notifications, group_notification, error_notification) tuple
+        send_at -- Optional time to send the fax at (see FaxJob.send)
+        
+        """
+        spec = {'numbers': list(numbers), 'files': [os.path.abspath(f) for f in files], 'names': names and list(names),
+                'remote_files': list(remote_files), 'cover': cover, 'notifications': notifications, 'send_at': send_at}
+        
+        def insert(connection):
+            now = time.time()
+            cursor = connection.execute('INSERT INTO jobs (spec, state, created, updated) VALUES (?, ?, ?, ?)',
+                                        (jsonlib.dumps(spec), QUEUED, now, now))
+            connection.execute('INSERT INTO events (job_id, state, at) VALUES (?, ?, ?)', (cursor.lastrowid, QUEUED, now))
+            return cursor.lastrowid
+        
+        return self._transaction(insert)
+    
+    def lease(self, worker):
+        """Leases the oldest job that is neither finished nor leased by a live worker. Returns the job dict, or None if there is none.
+        
+        Leasing a job counts an attempt. A job that has already used up
+        max_attempts, e.g. because its workers died, is marked as failed instead.
+        
+        """
+        
+        def take(connection):
+            now = time.time()
+            while True:
+                row = connection.execute('SELECT id, attempts FROM jobs WHERE state NOT IN (?, ?) AND (lease_expires IS NULL OR lease_expires < ?) '
+                                         'ORDER BY id LIMIT 1', (SENT, FAILED, now)).fetchone()
+                if row is None:
+                    return None
+                if row[1] < self.max_attempts:
+                    break
+                error = 'gave up after %d attempts' % row[1]
+                connection.execute('UPDATE jobs SET state = ?, error = COALESCE(error, ?), lease_owner = NULL, lease_expires = NULL, updated = ? WHERE id = ?',
+                                   (FAILED, error, now, row[0]))
+                connection.execute('INSERT INTO events (job_id, state, at, detail) VALUES (?, ?, ?, ?)', (row[0], FAILED, now, error))
+            connection.execute('UPDATE jobs SET attempts = attempts + 1, lease_owner = ?, lease_expires = ?, updated = ? WHERE id = ?',
+                               (worker, now + self.lease_seconds, now, row[0]))
+            return row[0]
+        
+        job_id = self._transaction(take)
+        if job_id is None:
+            return None
+        return self.get(job_id)
+    
+    def _update(self, job, worker, state, detail=None, release=False, **fields):
+        """Records that a leased job reached state, renewing or releasing the lease. Raises LeaseLost if the lease is gone."""
+        
+        def update(connection):
+            now = time.time()
+            values = dict(fields, state=state, updated=now)
+            if release:
+                values.update(lease_owner=None, lease_expires=fields.get('lease_expires'))
+            else:
+                values['lease_expires'] = now + self.lease_seconds
+            names = sorted(values)
+            cursor = connection.execute('UPDATE jobs SET %s WHERE id = ? AND lease_owner = ?' % ', '.join('%s = ?' % name for name in names),
+                                        [values[name] for name in names] + [job['id'], worker])
+            if cursor.rowcount == 0:
+                raise LeaseLost("Job %d is no longer leased by %s" % (job['id'], worker))
+            connection.execute('INSERT INTO events (job_id, state, at, detail) VALUES (?, ?, ?, ?)', (job['id'], state, now, detail))
+        
+        self._transaction(update)
+        job['state'] = state
+        job.update(fields)
+    
+    def get(self, job_id):
+        """Returns a job as a dict, with its spec and send result decoded, or None if there is no such job."""
+        cursor = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        job = dict(zip([column[0] for column in cursor.description], row))
+        job['spec'] = jsonlib.loads(job['spec'])
+        if job['result'] is not None:
+            job['result'] = jsonlib.loads(job['result'])
+        return job
+    
+    def events(self, job_id):
+        """Returns the (state, time, detail) history of a job, oldest first."""
+        return self._connection().execute('SELECT state, at, detail FROM events WHERE job_id = ? ORDER BY rowid', (job_id,)).fetchall()
+    
+    def counts(self):
+        """Returns a dict of the number of jobs in each state."""
+        return dict(self._connection().execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+    
+    def process(self, pamfax, worker=None):
+        """Leases one job and sends it with pamfax. Returns the job id, or None if no job was ready.
+        
+        A failed attempt is retried after retry_delay seconds from the step it
+        reached, until max_attempts have been made and the job is marked as failed.
+        
+        Arguments:
+        pamfax -- The PamFax object to send the fax with
+        
+        Keyword arguments:
+        worker -- A name for this worker, unique among all workers (host, process and thread by default)
+        
+        """
+        if worker is None:
+            worker = '%s:%d:%d' % (socket.gethostname(), os.getpid(), threading.current_thread().ident)
+        job = self.lease(worker)
+        if job is None:
+            return None
+        try:
+            self._run(pamfax, job, worker)
+        except LeaseLost as e:
+            logger.warning("%s", e)
+        except Exception as e:
+            attempts = job['attempts']
+            logger.error("Attempt %d of outbox job %d failed in state %s: %s", attempts, job['id'], job['state'], e)
+            if attempts >= self.max_attempts:
+                self._update(job, worker, FAILED, str(e), release=True, error=str(e))
+            else:
+                self._update(job, worker, job['state'], str(e), release=True, error=str(e),
+                             lease_expires=time.time() + self.retry_delay)
+        return job['id']
+    
+    def _was_sent(self, pamfax, fax_uuid):
+        """Returns whether PamFax knows a fax with this uuid as sent or in progress.
+        
+        Returns False only if PamFax does not know the fax or reports it as not
+        sent yet. Any other error is raised, so that the job stays in SENDING
+        and is looked up again later instead of being sent twice.
+        
+        """
+        if fax_uuid is None:
+            return False
+        response = pamfax.get_fax_details(fax_uuid)
+        if response['result']['code'] in UNKNOWN_FAX_CODES:
+            return False
+        check(response)
+        state = field(container(response), ('state', 'status'))
+        return state is not None and state not in UNSENT_STATES
+    
+    def _run(self, pamfax, job, worker):
+        """Builds and sends the fax of a leased job, recording each step."""
+        spec = job['spec']
+        if job['state'] == SENDING:
+            if self._was_sent(pamfax, job['fax_uuid']):
+                self._update(job, worker, SENT, 'found in fax history after restart', release=True)
+                return
+            logger.info("Outbox job %d was not sent before it was interrupted, building it again", job['id'])
+        elif job['state'] != QUEUED:
+            logger.info("Outbox job %d was interrupted in state %s, building it again", job['id'], job['state'])
+        response = check(pamfax.create())
+        if job['state'] != QUEUED or job['attempts'] > 1:
+            # Create returns the fax still in edit mode in this session, if any
+            check(pamfax.remove_all_files())
+            check(pamfax.remove_all_recipients())
+        self._update(job, worker, CREATED, fax_uuid=response.get('FaxContainer', {}).get('uuid'))
+        for url in spec['remote_files']:
+            check(pamfax.add_remote_file(url))
+        if spec['files']:
+            for response in pamfax.add_files(spec['files']):
+                check(response)
+        self._update(job, worker, FILES_ADDED)
+        check(pamfax.set_recipients(spec['numbers'], spec['names']))
+        if spec['cover'] is not None:
+            check(pamfax.set_cover(*spec['cover']))
+        if spec['notifications'] is not None:
+            check(pamfax.set_notifications(*spec['notifications']))
+        self._update(job, worker, PREPARED)
+        self._update(job, worker, SENDING)
+        response = check(pamfax.send(spec['send_at']))
+        self._update(job, worker, SENT, release=True, result=jsonlib.dumps(response), error=None)
+    
+    def close(self):
+        """Closes the database connection of the current thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
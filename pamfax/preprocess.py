@@ -0,0 +1,152 @@
+"""
+Optional local preprocessing of documents before they are added to a fax job.
+
+PamFax converts every document to 1-bit fax resolution on the server side, so
+colour images and high resolution scans carry many bytes that never reach the
+recipient. The functions in this module shrink such files locally first:
+images are downsampled to fax width and converted to black and white, and
+identical attachments are only processed once, keyed by their content hash.
+
+Image processing requires PIL (or Pillow). Without it, and for documents other
+than single page images, files are passed through unchanged.
+"""
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+import atexit
+import hashlib
+import logging
+import mimetypes
+import multiprocessing
+import os
+import tempfile
+import threading
+
+FAX_WIDTH = 1728
+FAX_DPI = (204, 196)
+HASH_BLOCK_SIZE = 64 * 1024
+
+logger = logging.getLogger('pamfax')
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def file_digest(filename):
+    """Returns the hex SHA-1 digest of a file's content, read in blocks."""
+    digest = hashlib.sha1()
+    f = open(filename, 'rb')
+    try:
+        block = f.read(HASH_BLOCK_SIZE)
+        while block:
+            digest.update(block)
+            block = f.read(HASH_BLOCK_SIZE)
+    finally:
+        f.close()
+    return digest.hexdigest()
+
+def optimize_file(filename, directory):
+    """Shrinks a single document for faxing and returns the name of the file to upload.
+    
+    Images are scaled down to FAX_WIDTH pixels and converted to a bilevel PNG
+    in directory. The original filename is returned if the file is not a
+    single page image, PIL is unavailable or the result would not be smaller.
+    
+    Arguments:
+    filename -- The local file to optimize
+    directory -- An existing directory to write the optimized file to
+    
+    """
+    mimetype = mimetypes.guess_type(filename)[0]
+    if Image is None or mimetype is None or not mimetype.startswith('image/'):
+        return filename
+    try:
+        with Image.open(filename) as image:
+            if getattr(image, 'n_frames', 1) > 1:
+                return filename
+            width, height = image.size
+            if width > FAX_WIDTH:
+                image = image.resize((FAX_WIDTH, max(1, height * FAX_WIDTH // width)), Image.LANCZOS)
+            image = image.convert('L').convert('1')
+            basename = os.path.splitext(os.path.basename(filename))[0]
+            optimized = os.path.join(directory, '%s.png' % basename)
+            image.save(optimized, 'PNG', optimize=True, dpi=FAX_DPI)
+    except IOError as e:
+        logger.warning("Could not optimize %s: %s", filename, e)
+        return filename
+    if os.path.getsize(optimized) >= os.path.getsize(filename):
+        os.remove(optimized)
+        return filename
+    logger.debug("Optimized %s from %d to %d bytes", filename, os.path.getsize(filename), os.path.getsize(optimized))
+    return optimized
+
+def _optimize_job(job):
+    """Unpacks a (filename, directory) job for multiprocessing.Pool.map"""
+    return optimize_file(*job)
+
+def _pool(processes):
+    """Returns the shared pool of worker processes of the given size, starting it on first use.
+    
+    The workers are spawned rather than forked: the calling process usually
+    runs other threads (e.g. uploads), and a forked child could inherit a lock
+    one of them was holding and deadlock.
+    
+    """
+    _pools_lock.acquire()
+    try:
+        pool = _pools.get(processes)
+        if pool is None:
+            pool = _pools[processes] = multiprocessing.get_context('spawn').Pool(processes)
+        return pool
+    finally:
+        _pools_lock.release()
+
+def close_pools():
+    """Stops the worker processes started by optimize_files. Called automatically at exit."""
+    _pools_lock.acquire()
+    try:
+        for pool in _pools.values():
+            pool.close()
+            pool.join()
+        _pools.clear()
+    finally:
+        _pools_lock.release()
+
+atexit.register(close_pools)
+
+def optimize_files(filenames, directory=None, processes=None):
+    """Optimizes a set of documents in parallel and returns the filenames to upload instead.
+    
+    Files with identical content are only optimized once and share the same
+    output file. The returned list is in the same order as filenames.
+    
+    Arguments:
+    filenames -- Sequence of local files to optimize
+    
+    Keyword arguments:
+    directory -- Directory to write optimized files to (a new temporary directory by default)
+    processes -- Number of worker processes to use (the number of CPUs by default)
+    
+    The worker processes are started on the first call and reused by later
+    ones, until close_pools is called.
+    
+    """
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix='pamfax-')
+    digests = [file_digest(filename) for filename in filenames]
+    jobs = []
+    unique = {}
+    for filename, digest in zip(filenames, digests):
+        if digest not in unique:
+            unique[digest] = len(jobs)
+            subdirectory = os.path.join(directory, digest)
+            if not os.path.isdir(subdirectory):
+                os.mkdir(subdirectory)
+            jobs.append((filename, subdirectory))
+    if len(jobs) > 1 and processes != 1:
+        results = _pool(processes).map(_optimize_job, jobs)
+    else:
+        results = [_optimize_job(job) for job in jobs]
+    return [results[unique[digest]] for digest in digests]
@@ -0,0 +1,247 @@
+"""
+Caching of fax page previews.
+
+Common/GetPagePreview renders a page image on every call, although the pages
+of a received or sent fax never change. PreviewCache keeps previews in an LRU
+cache in memory and, optionally, in a directory on disk. When the first page
+of a fax is requested, the following pages (up to the fax's page count, if
+given) are fetched in the background, and a request for a small preview is
+answered from a larger one already cached (scaled down if PIL is available).
+"""
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from io import BytesIO
+from collections import OrderedDict
+from .processors import CONTENT_TYPE, Response
+
+import logging
+import os
+import threading
+
+MAX_ITEMS = 256
+PREFETCH_PAGES = 2
+
+logger = logging.getLogger('pamfax')
+
+def _dimension(value):
+    """Returns a max_width or max_height parameter as an int, or None if it is not set."""
+    if value in (None, ''):
+        return None
+    return int(value)
+
+def _covers(size, wanted):
+    """Returns whether a rendition of size (max_width, max_height) is at least as large as wanted."""
+    for have, want in zip(size, wanted):
+        have, want = _dimension(have), _dimension(want)
+        if have is not None and (want is None or have < want):
+            return False
+    return True
+
+def _response(preview):
+    """Returns a Response for a cached (content, content_type) preview."""
+    content, content_type = preview
+    return Response(200, 'OK', {CONTENT_TYPE: content_type}, content, len(content))
+
+def _scale(preview, size):
+    """Scales a (content, content_type) preview down to fit size, if PIL is available."""
+    content, content_type = preview
+    if Image is None or size == (None, None):
+        return preview
+    try:
+        image = Image.open(BytesIO(content))
+        width, height = image.size
+        image.thumbnail((size[0] or width, size[1] or height))
+        output = BytesIO()
+        image.save(output, image.format or 'PNG')
+        return (output.getvalue(), content_type)
+    except IOError as e:
+        logger.warning("Could not scale preview: %s", e)
+        return preview
+
+class PreviewCache:
+    """A two tier cache in front of Common/GetPagePreview.
+    
+    Only image responses are cached; error responses are passed through.
+    Previews are returned as Response objects, like Common.get_page_preview.
+    
+    """
+    
+    def __init__(self, pamfax, directory=None, max_items=MAX_ITEMS, prefetch=PREFETCH_PAGES):
+        """Instantiates the PreviewCache class
+        
+        Arguments:
+        pamfax -- The PamFax object to fetch previews with
+        
+        Keyword arguments:
+        directory -- Optional directory for the on-disk tier, created if it does not exist
+        max_items -- Number of previews to keep in memory
+        prefetch -- Number of pages after the first to fetch in the background when page 1 is requested
+        
+        """
+        self.pamfax = pamfax
+        self.directory = directory
+        self.max_items = max_items
+        self.prefetch = prefetch
+        self._memory = OrderedDict()
+        self._sizes = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+    
+    def _filename(self, key):
+        """Returns the on-disk name for a cache key: one directory per fax, one file per rendition."""
+        uuid, page_no, max_width, max_height = key
+        return os.path.join(self.directory, uuid, '%s_%sx%s' % (page_no, max_width or '', max_height or ''))
+    
+    def _remember(self, key, preview):
+        """Puts a preview in the memory tier, evicting the least recently used ones."""
+        self._lock.acquire()
+        try:
+            self._memory.pop(key, None)
+            self._memory[key] = preview
+            self._sizes.setdefault(key[:2], set()).add(key[2:])
+            while len(self._memory) > self.max_items:
+                evicted, preview = self._memory.popitem(last=False)
+                sizes = self._sizes.get(evicted[:2])
+                if sizes is not None:
+                    sizes.discard(evicted[2:])
+                    if not sizes:
+                        del self._sizes[evicted[:2]]
+        finally:
+            self._lock.release()
+    
+    def _store(self, key, preview):
+        """Writes a preview to the disk tier, content type first, then the image data."""
+        filename = self._filename(key)
+        if not os.path.isdir(os.path.dirname(filename)):
+            try:
+                os.makedirs(os.path.dirname(filename))
+            except OSError:
+                pass
+        temp = '%s.%d.tmp' % (filename, threading.current_thread().ident)
+        f = open(temp, 'wb')
+        try:
+            f.write(('%s\n' % (preview[1] or '')).encode('utf-8'))
+            f.write(preview[0])
+        finally:
+            f.close()
+        os.replace(temp, filename)
+    
+    def _lookup(self, key):
+        """Returns a cached preview for exactly key from memory or disk, or None."""
+        self._lock.acquire()
+        try:
+            preview = self._memory.pop(key, None)
+            if preview is not None:
+                self._memory[key] = preview
+                return preview
+        finally:
+            self._lock.release()
+        if self.directory is None or not os.path.exists(self._filename(key)):
+            return None
+        f = open(self._filename(key), 'rb')
+        try:
+            content_type = f.readline().rstrip(b'\n').decode('utf-8') or None
+            preview = (f.read(), content_type)
+        finally:
+            f.close()
+        self._remember(key, preview)
+        return preview
+    
+    def _known_sizes(self, key):
+        """Returns the (max_width, max_height) renditions cached in memory or on disk for key's page."""
+        sizes = set(self._sizes.get(key[:2], ()))
+        if self.directory is not None and os.path.isdir(os.path.dirname(self._filename(key))):
+            prefix = '%s_' % key[1]
+            for name in os.listdir(os.path.dirname(self._filename(key))):
+                if name.startswith(prefix) and not name.endswith('.tmp'):
+                    width, height = name[len(prefix):].split('x')
+                    sizes.add((width and int(width) or None, height and int(height) or None))
+        return sizes
+    
+    def _lookup_larger(self, key):
+        """Returns a cached rendition of the same page scaled down to key's size, or None."""
+        for size in self._known_sizes(key):
+            if size != key[2:] and _covers(size, key[2:]):
+                preview = self._lookup(key[:2] + size)
+                if preview is not None:
+                    return _scale(preview, key[2:])
+        return None
+    
+    def _fetch(self, key):
+        """Fetches a preview from the API, at most once at a time per key, and caches it."""
+        self._lock.acquire()
+        event = self._pending.get(key)
+        owner = event is None
+        if owner:
+            event = self._pending[key] = threading.Event()
+        self._lock.release()
+        if not owner:
+            event.wait()
+            preview = self._lookup(key)
+            if preview is not None:
+                return preview
+            return self._fetch(key)
+        try:
+            result = self.pamfax.get_page_preview(*key)
+            if isinstance(result, Response):
+                preview = tuple(result)
+                self._remember(key, preview)
+                if self.directory is not None:
+                    self._store(key, preview)
+            return result
+        finally:
+            self._lock.acquire()
+            del self._pending[key]
+            self._lock.release()
+            event.set()
+    
+    def _prefetch(self, key, pages):
+        """Fetches the pages following page 1 in the background, but not beyond pages if it is given."""
+        uuid, page_no, max_width, max_height = key
+        last = 1 + self.prefetch
+        if pages is not None:
+            last = min(last, int(pages))
+        for page in range(2, last + 1):
+            following = (uuid, page, max_width, max_height)
+            if self._lookup(following) is None:
+                thread = threading.Thread(target=self._fetch_quietly, args=(following,))
+                thread.daemon = True
+                thread.start()
+    
+    def _fetch_quietly(self, key):
+        """Fetches a preview, logging instead of raising errors."""
+        try:
+            self._fetch(key)
+        except Exception as e:
+            logger.debug("Prefetching preview %s failed: %s", key, e)
+    
+    def get_page_preview(self, uuid, page_no, max_width=None, max_height=None, pages=None):
+        """Returns a preview page for a fax, like Common.get_page_preview, from the cache if possible.
+        
+        Arguments:
+        uuid -- The uuid of the fax
+        page_no -- The page number, starting at 1
+        
+        Keyword arguments:
+        max_width -- Maximum width of the preview in pixels
+        max_height -- Maximum height of the preview in pixels
+        pages -- The number of pages of the fax, if known, so that no pages beyond it are prefetched
+        
+        """
+        key = (uuid, int(page_no), _dimension(max_width), _dimension(max_height))
+        if key[1] == 1 and self.prefetch:
+            self._prefetch(key, pages)
+        preview = self._lookup(key)
+        if preview is None:
+            preview = self._lookup_larger(key)
+        if preview is None:
+            preview = self._fetch(key)
+        if isinstance(preview, tuple):
+            preview = _response(preview)
+        return preview
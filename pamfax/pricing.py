@@ -0,0 +1,114 @@
+"""
+Cost estimation for faxes to many recipients.
+
+NumberInfo/GetPagePrice prices a single number, but prices only vary by
+destination country and zone. CostEstimator groups recipients by the country
+and zone detected offline by a NumberValidator, looks up the page price once
+per group (and caches it), and multiplies by the number of pages, so a fax to
+50,000 recipients costs one price lookup per destination country.
+"""
+
+from .responses import check, field
+
+import logging
+import threading
+
+logger = logging.getLogger('pamfax')
+
+def _price(response):
+    """Returns (price per page, currency) from a GetPagePrice response."""
+    for key, value in check(response).items():
+        if key != 'result' and isinstance(value, dict):
+            price = field(value, ('price_per_page', 'price'))
+            if price is not None:
+                return float(price), field(value, ('currency', 'currency_code'))
+    raise Exception("No price in response: %s" % response)
+
+def _pages(fax_state):
+    """Returns the page count of the current fax from a GetFaxState response."""
+    pages = field(fax_state.get('FaxContainer', {}), ('pages', 'page_count'))
+    if pages is None:
+        raise Exception("No page count in fax state: %s" % fax_state)
+    return int(pages)
+
+class CostEstimator:
+    """Estimates the cost of sending a fax to a list of recipients with few API calls.
+    
+    Page prices are cached per (country code, zone) group for the lifetime of
+    the estimator, so repeated estimates only look up groups not seen before.
+    
+    """
+    
+    def __init__(self, pamfax, validator):
+        """Instantiates the CostEstimator class
+        
+        Arguments:
+        pamfax -- The PamFax object to look prices and page counts up with
+        validator -- A NumberValidator used to group numbers (see pamfax.faxnumbers)
+        
+        """
+        self.pamfax = pamfax
+        self.validator = validator
+        self._prices = {}
+        self._lock = threading.Lock()
+    
+    def page_price(self, group, number):
+        """Returns the (price per page, currency) for a group, looking it up with number the first time."""
+        price = self._prices.get(group)
+        if price is None:
+            price = _price(self.pamfax.get_page_price(number))
+            self._lock.acquire()
+            try:
+                self._prices[group] = price
+            finally:
+                self._lock.release()
+        return price
+    
+    def estimate(self, numbers, pages=None):
+        """Returns the estimated cost of sending a fax of pages pages to numbers.
+        
+        The result is a dict with the total cost, its currency, the number of
+        pages, the count of numbers that are not valid ('invalid'), the count
+        of valid numbers whose price could not be looked up ('unpriced') and a
+        'groups' dict mapping each (country code, zone) to its number of
+        recipients, price per page and cost. A group whose price lookup failed
+        has None as its price and cost and the reason as 'error', and is left
+        out of the total, so the total is partial if 'unpriced' is not 0.
+        
+        Arguments:
+        numbers -- An iterable of fax numbers, consumed in a single pass
+        
+        Keyword arguments:
+        pages -- Number of pages per fax (taken from the current fax job's state by default)
+        
+        """
+        if pages is None:
+            pages = _pages(self.pamfax.get_fax_state())
+        groups = {}
+        invalid = 0
+        currency = None
+        for number in numbers:
+            number = self.validator.normalize(number)
+            if number is None:
+                invalid += 1
+                continue
+            group = self.validator.country(number)
+            entry = groups.get(group)
+            if entry is None:
+                try:
+                    price, currency = self.page_price(group, number)
+                    entry = groups[group] = {'recipients': 0, 'price_per_page': price}
+                except Exception as e:
+                    logger.warning("Could not look up the page price for %s: %s", group, e)
+                    entry = groups[group] = {'recipients': 0, 'price_per_page': None, 'error': str(e)}
+            entry['recipients'] += 1
+        total = 0.0
+        unpriced = 0
+        for entry in groups.values():
+            if entry['price_per_page'] is None:
+                entry['cost'] = None
+                unpriced += entry['recipients']
+                continue
+            entry['cost'] = entry['recipients'] * entry['price_per_page'] * pages
+            total += entry['cost']
+        return {'total': total, 'currency': currency, 'pages': pages, 'invalid': invalid, 'unpriced': unpriced, 'groups': groups}
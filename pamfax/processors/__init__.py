@@ -4,40 +4,437 @@ specifications in the PamFax API docs. See the link below for more info:
 
 https://sandbox-apifrontend.pamfax.biz/summary/processors/
 
+Most actions are declared in the endpoints table of their processor, from
+which its methods are generated (see Endpoint and Processor).
+
 Users should not need to instantiate this class in applications using PamFax.
 Instead, just call the action directly on the PamFax object, and it will be
 delegated to the correct processor automatically.
 """
 
 try:
-    import cjson as jsonlib
-    jsonlib.dumps = jsonlib.encode
-    jsonlib.loads = jsonlib.decode
+    import simplejson as jsonlib
 except ImportError:
-    try:
-        from django.utils import simplejson as jsonlib
-    except ImportError:
-        try:
-            import simplejson as jsonlib
-        except ImportError:
-            import json as jsonlib
+    import json as jsonlib
+
+from ..responses import ITEMS_PER_PAGE, pages
 
-from httplib import HTTPException
-from urllib import urlencode
+from collections import deque
+from contextlib import contextmanager
+from http.client import HTTPException, HTTPSConnection
+from queue import Empty, Queue
+from urllib.parse import unquote, urlencode
 
+import binascii
+import copy
+import inspect
 import logging
+import math
 import mimetypes
+import mmap
 import os
+import re
+import shutil
 import socket
+import ssl
+import tempfile
+import threading
+import time
+import zlib
 
 IP_ADDR = socket.gethostbyname(socket.gethostname())
 USER_AGENT = 'dynaptico-pamfax'
 ORIGIN = 'script'
 CONTENT_TYPE = 'content-type'
 CONTENT_TYPE_JSON = 'application/json'
+CONTENT_TYPE_FORM = 'application/x-www-form-urlencoded'
+CONTENT_ENCODING = 'content-encoding'
+ACCEPT_ENCODING = 'gzip, deflate'
+MAX_URL_LENGTH = 2000
+UPLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+SPOOL_THRESHOLD = 8 * 1024 * 1024
+MAX_CACHED_RESPONSES = 256
+TLS_SESSIONS = hasattr(ssl.SSLSocket, 'session')
 
 logger = logging.getLogger('pamfax')
 
+# ----------------------------------------------------------------------------
+# Timeouts
+# ----------------------------------------------------------------------------
+
+class Timeout:
+    """Time limits for a request in seconds, where None means no limit.
+    
+    connect -- for opening the TCP connection and the TLS handshake
+    read -- for each send or receive on the socket, i.e. how long a request may sit idle
+    total -- for the whole request, from sending it to receiving the last byte of the response
+    
+    """
+    
+    def __init__(self, connect=None, read=None, total=None):
+        """Instantiates the Timeout class"""
+        self.connect = connect
+        self.read = read
+        self.total = total
+    
+    def __repr__(self):
+        return 'Timeout(connect=%r, read=%r, total=%r)' % (self.connect, self.read, self.total)
+
+DEFAULT_TIMEOUT = Timeout(connect=10, read=60, total=142)
+SHORT_TIMEOUT = Timeout(connect=5, read=10, total=20)
+LONG_TIMEOUT = Timeout(connect=10, read=120, total=None)
+
+ACTION_TIMEOUTS = {
+    'Ping': SHORT_TIMEOUT,
+    'GetFaxState': SHORT_TIMEOUT,
+    'GetNumberInfo': SHORT_TIMEOUT,
+    'GetPagePrice': SHORT_TIMEOUT,
+    'AddFile': LONG_TIMEOUT,
+    'GetFile': LONG_TIMEOUT,
+    'GetInvoice': LONG_TIMEOUT,
+    'GetPagePreview': LONG_TIMEOUT,
+    'GetProviderLogo': LONG_TIMEOUT,
+    'GetTransmissionReport': LONG_TIMEOUT,
+}
+
+_local = threading.local()
+
+@contextmanager
+def request_timeout(timeout):
+    """Applies a Timeout to every pooled request the current thread makes inside the with block.
+    
+    For example:
+    
+    with request_timeout(Timeout(connect=2, read=5, total=5)):
+        pamfax.get_fax_details(uuid)
+    
+    """
+    previous = getattr(_local, 'timeout', None)
+    _local.timeout = timeout
+    try:
+        yield
+    finally:
+        _local.timeout = previous
+
+# ----------------------------------------------------------------------------
+# Hedging
+# ----------------------------------------------------------------------------
+
+HEDGED_ACTIONS = ('GetFaxState', 'GetNumberInfo', 'GetFaxDetails')
+
+class Hedging:
+    """Settings and latency history for hedged requests.
+    
+    A hedged request is sent a second time, on another pooled connection, if
+    no response has arrived after the given percentile of the action's recent
+    latencies. Whichever response arrives first is used. Only read-only
+    actions are safe to hedge. The number of duplicates is capped at budget
+    times the number of hedged-eligible requests, so a slow server does not
+    get twice the load.
+    
+    """
+    
+    def __init__(self, actions=HEDGED_ACTIONS, percentile=95, budget=0.05, min_samples=20, window=200):
+        """Instantiates the Hedging class
+        
+        Keyword arguments:
+        actions -- The names of the actions to hedge
+        percentile -- The latency percentile after which a duplicate is sent
+        budget -- The maximum ratio of duplicates to hedged-eligible requests
+        min_samples -- Number of latencies of an action to collect before hedging it
+        window -- Number of recent latencies per action to compute the percentile over
+        
+        """
+        self.actions = set(actions)
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.window = window
+        self.requests = 0
+        self.hedges = 0
+        self._latencies = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, action, seconds):
+        """Adds the latency of a successful request to the action's history."""
+        self._lock.acquire()
+        try:
+            self._latencies.setdefault(action, deque(maxlen=self.window)).append(seconds)
+        finally:
+            self._lock.release()
+    
+    def delay(self, action):
+        """Returns the seconds to wait before hedging a request for action, or None while there are too few samples."""
+        self._lock.acquire()
+        try:
+            latencies = sorted(self._latencies.get(action, ()))
+        finally:
+            self._lock.release()
+        if len(latencies) < self.min_samples:
+            return None
+        index = int(math.ceil(self.percentile / 100.0 * len(latencies))) - 1
+        return latencies[max(index, 0)]
+    
+    def count(self):
+        """Counts a hedged-eligible request, adding to the duplicate budget."""
+        self._lock.acquire()
+        try:
+            self.requests += 1
+        finally:
+            self._lock.release()
+    
+    def spend(self):
+        """Takes one duplicate from the budget. Returns False if the budget is used up."""
+        self._lock.acquire()
+        try:
+            if self.hedges + 1 > self.budget * self.requests:
+                return False
+            self.hedges += 1
+            return True
+        finally:
+            self._lock.release()
+
+# ----------------------------------------------------------------------------
+# Circuit breaking
+# ----------------------------------------------------------------------------
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the circuit to the PamFax host is open."""
+    pass
+
+class CircuitBreaker:
+    """Stops sending requests to a PamFax host that keeps failing.
+    
+    After failures consecutive connection errors, timeouts or non-OK HTTP
+    responses, the circuit opens and requests fail right away with
+    CircuitOpenError. After reset_timeout seconds it is half-open: the next
+    request first calls probe (the session's ping when used through PamFax)
+    and only goes ahead if the probe succeeds, which closes the circuit again.
+    While one thread probes, the others keep failing fast. Without a probe,
+    the next request itself is the trial.
+    
+    By default there is one circuit per host. With per_processor set there is
+    one per processor, e.g. '/FaxJob', so an outage of one part of the API
+    does not block the others.
+    
+    """
+    
+    def __init__(self, failures=5, reset_timeout=30, per_processor=False, probe=None):
+        """Instantiates the CircuitBreaker class
+        
+        Keyword arguments:
+        failures -- Number of consecutive failures that open the circuit
+        reset_timeout -- Seconds an open circuit waits before probing the host
+        per_processor -- Whether to keep a separate circuit for each processor
+        probe -- Callable that raises an exception if the host is still unavailable
+        
+        """
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.per_processor = per_processor
+        self.probe = probe
+        self._circuits = {}
+        self._lock = threading.Lock()
+    
+    def _circuit(self, url):
+        """Returns the state dict of the circuit a URL belongs to. Must be called with the lock held."""
+        key = None
+        if self.per_processor:
+            key = '/' + url.split('?', 1)[0].strip('/').split('/', 1)[0]
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            circuit = self._circuits[key] = {'key': key, 'state': CLOSED, 'failures': 0, 'opened_at': 0, 'probing': False}
+        return circuit
+    
+    def state(self, url=''):
+        """Returns the state of the circuit for a URL: CLOSED, OPEN or HALF_OPEN."""
+        self._lock.acquire()
+        try:
+            circuit = self._circuit(url)
+            if circuit['state'] == OPEN and time.time() >= circuit['opened_at'] + self.reset_timeout:
+                return HALF_OPEN
+            return circuit['state']
+        finally:
+            self._lock.release()
+    
+    def before(self, url):
+        """Raises CircuitOpenError unless a request to url may be sent, probing the host first if the circuit is half-open."""
+        if getattr(_local, 'probing', False):
+            return
+        self._lock.acquire()
+        try:
+            circuit = self._circuit(url)
+            if circuit['state'] == CLOSED:
+                return
+            if circuit['probing'] or time.time() < circuit['opened_at'] + self.reset_timeout:
+                raise CircuitOpenError("Circuit to %s is open" % (circuit['key'] or 'PamFax'))
+            circuit['probing'] = True
+        finally:
+            self._lock.release()
+        if self.probe is None:
+            return
+        logger.info("Probing %s", circuit['key'] or 'PamFax')
+        _local.probing = True
+        try:
+            self.probe()
+        except Exception as e:
+            self.failure(url)
+            raise CircuitOpenError("Circuit to %s is open, probe failed: %s" % (circuit['key'] or 'PamFax', e))
+        except BaseException:
+            self.abandon(url)
+            raise
+        finally:
+            _local.probing = False
+        self.success(url)
+    
+    def abandon(self, url):
+        """Forgets a probe or trial request that was interrupted (e.g. by KeyboardInterrupt), so that the next request may probe again."""
+        self._lock.acquire()
+        try:
+            self._circuit(url)['probing'] = False
+        finally:
+            self._lock.release()
+    
+    def success(self, url):
+        """Records a request that reached the host, closing its circuit."""
+        self._lock.acquire()
+        try:
+            circuit = self._circuit(url)
+            if circuit['state'] != CLOSED:
+                logger.info("Circuit to %s closed", circuit['key'] or 'PamFax')
+            circuit.update(state=CLOSED, failures=0, probing=False)
+        finally:
+            self._lock.release()
+    
+    def failure(self, url):
+        """Records a failed request, opening the circuit after too many in a row or after a failed probe."""
+        self._lock.acquire()
+        try:
+            circuit = self._circuit(url)
+            circuit['failures'] += 1
+            if circuit['probing'] or circuit['failures'] >= self.failures:
+                if circuit['state'] == CLOSED:
+                    logger.warning("Circuit to %s opened after %d failures", circuit['key'] or 'PamFax', circuit['failures'])
+                circuit.update(state=OPEN, opened_at=time.time(), probing=False)
+        finally:
+            self._lock.release()
+
+# ----------------------------------------------------------------------------
+# Responses
+# ----------------------------------------------------------------------------
+
+class Response:
+    """A binary (non-JSON) response, such as a file, preview or invoice.
+    
+    The body is kept in memory up to SPOOL_THRESHOLD bytes and in a
+    temporary file beyond that. Use view() for a buffer over it that does not
+    copy the data, and save() or write_to() to store it without building
+    another copy in memory. If the response was streamed to a sink, body is
+    the sink and view() is not available.
+    
+    For compatibility with code that expects a (content, content_type) tuple,
+    a Response unpacks and indexes like one:
+    
+    content, content_type = pamfax.get_file(file_uuid)
+    
+    Attributes: status, reason, headers (a dict with lowercase names),
+    content_type, filename (from Content-Disposition, or None), size and
+    timings (seconds from sending the request to the first byte and to the
+    last byte of the response, as 'first_byte' and 'total').
+    
+    """
+    
+    def __init__(self, status, reason, headers, body, size, timings=None, file=None):
+        """Instantiates the Response class"""
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.content_type = headers.get(CONTENT_TYPE)
+        self.filename = _disposition_filename(headers.get('content-disposition'))
+        self.body = body
+        self.size = size
+        self.timings = timings or {}
+        self._file = file
+        self._map = None
+    
+    @property
+    def content(self):
+        """The body as bytes. Reads a spooled body into memory."""
+        if self._file is not None:
+            self._file.seek(0)
+            return self._file.read()
+        return self.body
+    
+    def view(self):
+        """Returns a read-only buffer over the body, memory-mapping it if it was spooled to a file."""
+        if self._file is None:
+            return memoryview(self.body)
+        if self._map is None:
+            if self.size == 0:
+                return memoryview(b'')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)
+    
+    def write_to(self, f):
+        """Writes the body to a file object."""
+        if self._file is not None:
+            self._file.seek(0)
+            shutil.copyfileobj(self._file, f, DOWNLOAD_CHUNK_SIZE)
+        else:
+            f.write(self.view())
+    
+    def save(self, path):
+        """Writes the body to a file and returns its path.
+        
+        If path is a directory, the file is named after the response's
+        Content-Disposition filename.
+        
+        """
+        if os.path.isdir(path):
+            if not self.filename:
+                raise ValueError("The response has no filename to save it under in %s" % path)
+            path = os.path.join(path, self.filename)
+        f = open(path, 'wb')
+        try:
+            self.write_to(f)
+        finally:
+            f.close()
+        return path
+    
+    def close(self):
+        """Releases the temporary file of a spooled body."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+    
+    def __iter__(self):
+        return iter((self.content, self.content_type))
+    
+    def __getitem__(self, index):
+        return tuple(self)[index]
+    
+    def __repr__(self):
+        return '<Response %s %s, %d bytes of %s>' % (self.status, self.reason, self.size, self.content_type)
+
+def _disposition_filename(disposition):
+    """Returns the file name from a Content-Disposition header, or None."""
+    if not disposition:
+        return None
+    match = re.search(r"filename\*=(?:[\w-]+'[\w-]*')?([^;]+)", disposition)
+    if match:
+        return os.path.basename(unquote(match.group(1).strip().strip('"')))
+    match = re.search(r'filename="?([^";]+)"?', disposition)
+    if match:
+        return os.path.basename(match.group(1).strip())
+    return None
+
 # ----------------------------------------------------------------------------
 # "private" helper methods
 # ----------------------------------------------------------------------------
@@ -58,101 +455,785 @@ def _get_url(base_url, action, api_credentials, **kwargs):
     url = '%s/%s%s' % (base_url, action, api_credentials)
     if len(kwargs) == 0:
         return url
+    url = '%s&%s' % (url, urlencode(_query(kwargs)))
+    return url
+
+def _query(params):
+    """Returns the HTTP parameters for a dict of action parameters, without the ones whose value is None and with lists expanded to name[i] entries."""
     query = {}
-    for arg in kwargs:
-        kwarg = kwargs[arg]
+    for arg in params:
+        kwarg = params[arg]
         if kwarg is not None:
             if isinstance(kwarg, list):
                 for i in range(0, len(kwarg)):
                     query['%s[%d]' % (arg, i)] = kwarg[i]
             else:
                 query[arg] = kwarg
-    url = '%s&%s' % (url, urlencode(query))
-    return url
+    return query
 
-def _get_and_check_response(http):
+def _get_and_check_response(http, record=None, sink=None, started=None):
     """Wait for the HTTP response and throw an exception if the return 
     status is not OK. Return either a dict based on the 
     HTTP response in JSON, or if the response is not in JSON format,
-    return a tuple containing the data in the body and the content type.
+    a Response holding the body, headers and timings, which unpacks
+    like a tuple of the data in the body and the content type.
+    
+    Gzip and deflate encoded bodies are decompressed as they are read.
+    If record is given, it is called with the number of bytes received
+    and the number of bytes after decompression. If sink is given, a
+    non-JSON body is written to it chunk by chunk instead of being kept
+    in memory, and the returned Response has sink as its body. Timings
+    are measured from started, the time the request was sent.
     
     """
+    if started is None:
+        started = time.time()
+    _arm(http)
     response = http.getresponse()
+    timings = {'first_byte': time.time() - started}
     codes = (response.status, response.reason)
-    content = response.read()
+    headers = dict((name.lower(), value) for name, value in response.getheaders())
+    encoding = headers.get(CONTENT_ENCODING, '').lower()
+    content_type = headers.get(CONTENT_TYPE)
+    is_json = content_type is not None and content_type.startswith(CONTENT_TYPE_JSON)
+    received = [0]
+    if response.status == 200 and not is_json:
+        if sink is not None:
+            body, f, size = sink, None, 0
+            for chunk in _iter_body(http, response, encoding, received):
+                sink.write(chunk)
+                size += len(chunk)
+        else:
+            body, f, size = _spool(_iter_body(http, response, encoding, received))
+        timings['total'] = time.time() - started
+        if record is not None:
+            record(requests=1, bytes_received=received[0], bytes_decoded=size)
+        logger.debug('%s\n<%d bytes of %s>', codes, size, content_type)
+        return Response(response.status, response.reason, headers, body, size, timings, f)
+    content = b''.join(_iter_body(http, response, encoding, received))
+    if record is not None:
+        record(requests=1, bytes_received=received[0], bytes_decoded=len(content))
     logger.debug('%s\n%s', codes, content)
     if response.status != 200:
         raise HTTPException("Response from server not OK: %s %s" % codes)
-    content_type = response.getheader(CONTENT_TYPE, None)
-    if content_type is not None and content_type.startswith(CONTENT_TYPE_JSON):
-        return jsonlib.loads(content)
+    return jsonlib.loads(content)
+
+def _spool(chunks):
+    """Collects body chunks in memory, or in a temporary file once they exceed SPOOL_THRESHOLD bytes.
+    
+    Returns a tuple of the body (None if spooled), the temporary file (None if not) and the size.
+    
+    """
+    parts = []
+    size = 0
+    f = None
+    for chunk in chunks:
+        size += len(chunk)
+        if f is None and size > SPOOL_THRESHOLD:
+            f = tempfile.TemporaryFile()
+            for part in parts:
+                f.write(part)
+            parts = None
+        if f is None:
+            parts.append(chunk)
+        else:
+            f.write(chunk)
+    if f is not None:
+        f.flush()
+        return None, f, size
+    return b''.join(parts), None, size
+
+def _iter_body(http, response, encoding, received):
+    """Yields a response body chunk by chunk, decompressing gzip and deflate encoded bodies.
+    
+    The number of bytes read off the wire is added to received[0].
+    Deflate bodies are accepted both with and without the zlib header.
+    
+    """
+    decompressor = None
+    if encoding == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        decompressor = zlib.decompressobj()
+    first = True
+    _arm(http)
+    chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+    while chunk:
+        received[0] += len(chunk)
+        if decompressor is None:
+            yield chunk
+        else:
+            try:
+                data = decompressor.decompress(chunk)
+            except zlib.error:
+                if encoding != 'deflate' or not first:
+                    raise
+                decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                data = decompressor.decompress(chunk)
+            yield data
+        first = False
+        _arm(http)
+        chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+    if decompressor is not None:
+        yield decompressor.flush()
+
+def _arm(http):
+    """Sets the socket timeout for the next send or receive on a pooled connection.
+    
+    The timeout is the connection's read timeout, shortened to the time left
+    before its deadline. Raises socket.timeout once the deadline has passed.
+    
+    """
+    if not hasattr(http, 'deadline') or http.sock is None:
+        return
+    timeout = http.read_timeout
+    if http.deadline is not None:
+        remaining = http.deadline - time.time()
+        if remaining <= 0:
+            raise socket.timeout("Request to %s exceeded its total time limit" % http.host)
+        if timeout is None or remaining < timeout:
+            timeout = remaining
+    http.sock.settimeout(timeout)
+
+def _action(url):
+    """Returns the PamFax action name of a URL, e.g. 'GetFaxState' for '/FaxJob/GetFaxState?...'."""
+    return url.split('?', 1)[0].rsplit('/', 1)[-1]
+
+def _request(http, method, url, body='', headers={}, progress=None, sink=None):
+    """Sends a request and returns the checked response.
+    
+    If http is a ConnectionPool, a connection is checked out for the duration
+    of the request and returned afterwards, so the call is safe to make from
+    several threads at once. A connection that fails mid-request is closed
+    before it goes back to the pool. Pooled requests are subject to the
+    connect, read and total limits of the Timeout that applies to the action,
+    are hedged if the pool has hedging enabled for the action, and fail fast
+    with CircuitOpenError while the pool's circuit breaker is open.
+    
+    How a request is treated also depends on the Endpoint registered for its
+    action: only idempotent actions are hedged, successful responses of
+    actions with a ttl are reused by identical requests until it expires,
+    and a request for an action that is not idempotent drops the cached
+    responses of the processors it invalidates, both before it is sent and
+    once it has been answered.
+    
+    """
+    headers = dict(headers, **{'Accept-Encoding': ACCEPT_ENCODING})
+    if not isinstance(http, ConnectionPool):
+        return _send(None, http, None, method, url, body, headers, progress, sink)
+    pool = http
+    action = _action(url)
+    endpoint = _endpoint(url)
+    key = None
+    invalidates = None
+    if endpoint is not None and endpoint.ttl and sink is None and isinstance(body, str):
+        key = (url, body)
+        result = pool.cached(key)
+        if result is not None:
+            return result
+    elif endpoint is not None and not endpoint.idempotent:
+        invalidates = endpoint.invalidates
+        if invalidates:
+            pool.invalidate(invalidates)
+    timeout = pool.timeout_for(action)
+    breaker = pool.breaker
+    if breaker is not None:
+        try:
+            breaker.before(url)
+        except CircuitOpenError:
+            pool.record(rejected_requests=1)
+            raise
+    try:
+        if pool.hedging is not None and action in pool.hedging.actions and (endpoint is None or endpoint.idempotent) and progress is None and sink is None:
+            result = _hedged_request(pool, action, timeout, method, url, body, headers)
+        else:
+            result = _send(pool, pool.acquire(), timeout, method, url, body, headers, progress, sink)
+    except (socket.error, HTTPException):
+        if breaker is not None:
+            breaker.failure(url)
+        raise
+    except Exception:
+        # the host answered, even if the answer could not be used
+        if breaker is not None:
+            breaker.success(url)
+        raise
+    except BaseException:
+        if breaker is not None:
+            breaker.abandon(url)
+        raise
+    finally:
+        # reads answered while the call was under way may be stale, and even a failed call may have changed something
+        if invalidates:
+            pool.invalidate(invalidates)
+    if breaker is not None:
+        breaker.success(url)
+    if key is not None:
+        pool.store(key, result, endpoint.ttl)
+    return result
+
+def _hedged_request(pool, action, timeout, method, url, body, headers):
+    """Sends a request and, if it is slower than usual, a duplicate on another connection. Returns the first response."""
+    hedging = pool.hedging
+    hedging.count()
+    delay = hedging.delay(action)
+    if delay is None:
+        # too few latencies yet to tell a slow response from a usual one
+        started = time.time()
+        result = _send(pool, pool.acquire(), timeout, method, url, body, headers, None, None)
+        hedging.observe(action, time.time() - started)
+        return result
+    results = Queue()
+    
+    def attempt(http, hedge):
+        start = time.time()
+        try:
+            result = _send(pool, http, timeout, method, url, body, headers, None, None)
+        except Exception as e:
+            results.put((False, e, hedge))
+            return
+        hedging.observe(action, time.time() - start)
+        results.put((True, result, hedge))
+    
+    def start(http, hedge):
+        thread = threading.Thread(target=attempt, args=(http, hedge))
+        thread.daemon = True
+        thread.start()
+    
+    start(pool.acquire(), False)
+    outstanding = 1
+    try:
+        first = results.get(True, delay)
+    except Empty:
+        first = None
+        http = pool.acquire(block=False)
+        if http is not None and not hedging.spend():
+            pool.release(http)
+            http = None
+        if http is not None:
+            logger.debug("Hedging %s after %.3fs", action, delay)
+            pool.record(hedged_requests=1)
+            start(http, True)
+            outstanding += 1
+    if first is None:
+        first = results.get()
+    succeeded, value, hedge = first
+    if not succeeded and outstanding > 1:
+        succeeded, value, hedge = results.get()
+    if not succeeded:
+        raise value
+    if hedge:
+        pool.record(hedges_won=1)
+    return value
+
+def _send(pool, http, timeout, method, url, body, headers, progress, sink):
+    """Sends a request on a connection checked out of pool (or on a single connection if pool is None) and returns the checked response."""
+    record = None
+    if pool is not None:
+        record = pool.record
+    try:
+        if pool is not None:
+            http.read_timeout = timeout.read
+            http.deadline = None
+            if timeout.total is not None:
+                http.deadline = time.time() + timeout.total
+            if http.sock is None:
+                http.timeout = timeout.connect
+                http.connect()
+            _arm(http)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        started = time.time()
+        if progress is None and isinstance(body, bytes):
+            http.request(method, url, body, headers)
+        else:
+            _send_body(http, method, url, body, headers, progress)
+        result = _get_and_check_response(http, record, sink, started)
+    except:
+        if pool is not None:
+            pool.release(http, discard=True)
+        raise
+    if pool is not None:
+        pool.release(http)
+    return result
+
+def _send_body(http, method, url, body, headers, progress=None):
+    """Sends a request with a bytes or MultipartEncoder body in chunks, calling progress(bytes_sent, bytes_total) after each one if given."""
+    total = len(body)
+    http.putrequest(method, url, skip_accept_encoding=True)
+    for key, value in headers.items():
+        http.putheader(key, value)
+    if 'Content-Length' not in headers:
+        http.putheader('Content-Length', str(total))
+    http.endheaders()
+    if isinstance(body, bytes):
+        view = memoryview(body)
+        chunks = (view[i:i + UPLOAD_CHUNK_SIZE] for i in range(0, total, UPLOAD_CHUNK_SIZE))
     else:
-        return (content, content_type)
+        chunks = body
+    sent = 0
+    if progress is not None:
+        progress(sent, total)
+    for chunk in chunks:
+        _arm(http)
+        http.send(chunk)
+        sent += len(chunk)
+        if progress is not None:
+            progress(sent, total)
 
-def _get(http, url, body=''):
-    """Gets the specified url and returns the response."""
+def _get(http, url, body='', sink=None):
+    """Gets the specified url and returns the response.
+    
+    URLs longer than MAX_URL_LENGTH, for example with large recipient lists,
+    are sent as a POST to the same action instead, with the query string as
+    a form-encoded body, so they are neither rejected by the server nor
+    logged in full.
+    
+    Keyword arguments:
+    sink -- Optional file-like object that a binary response body is streamed into
+    
+    """
+    if not body and len(url) > MAX_URL_LENGTH and '?' in url:
+        path, query = url.split('?', 1)
+        logger.info("posting to url '%s' with %d bytes of form data", path, len(query))
+        return _request(http, 'POST', path, query, {'Content-Type': CONTENT_TYPE_FORM}, sink=sink)
     logger.info("getting url '%s' with body '%s'", url, body)
-    http.request('GET', url, body)
-    return _get_and_check_response(http)
-
-def _post(http, url, body, headers={}):
-    """Posts to the specified url and returns the response."""
-    logger.info("posting to url '%s' with body '%s'", url, body)
-    http.request('POST', url, body, headers)
-    return _get_and_check_response(http)
+    return _request(http, 'GET', url, body, sink=sink)
 
-def _encode_multipart_formdata(fields, files):
-    """Encode multipart form data per mime spec and return (content_type, body)
+def _post(http, url, body, headers={}, progress=None):
+    """Posts to the specified url and returns the response.
     
     Arguments:
-    fields -- A sequence of (name, value) elements for regular form fields.
-    files -- A sequence of (name, filename, value) elements for data to be uploaded as files
+    body -- The request body, bytes, a string or a MultipartEncoder
+    
+    Keyword arguments:
+    progress -- Optional callable(bytes_sent, bytes_total) invoked as the body is sent
     
     """
-    BOUNDARY = '----------Boundary_of_form_part_$'
-    CRLF = '\r\n'
-    L = []
-    for (key, value) in fields:
-        L.append('--' + BOUNDARY)
-        L.append('Content-Disposition: form-data; name="%s"' % key)
-        L.append('')
-        L.append(value)
-    for (key, filename, value) in files:
-        L.append('--' + BOUNDARY)
-        L.append('Content-Disposition: form-data; name="%s"; filename="%s"' % (key, filename))
-        L.append('Content-Type: %s' % mimetypes.guess_type(filename)[0] or 'application/octet-stream')
-        L.append('')
-        L.append(value)
-    L.append('--' + BOUNDARY + '--')
-    L.append('')
-    body = CRLF.join(L)
-    content_type = 'multipart/form-data; boundary=%s' % BOUNDARY
-    return content_type, body
+    logger.info("posting to url '%s' with body of %d bytes", url, len(body))
+    return _request(http, 'POST', url, body, headers, progress)
+
+class MultipartEncoder:
+    """A multipart/form-data request body that is streamed instead of built in memory.
+    
+    The total length is known up front, so the body can be sent with a
+    Content-Length header. Iterating over the encoder yields the part
+    headers and the file contents in chunks of UPLOAD_CHUNK_SIZE bytes read
+    straight from the files; it can be iterated again, e.g. to retry a
+    request. The boundary is random, so it cannot clash with file content.
+    
+    For example:
+    
+    encoder = MultipartEncoder([('filename', 'fax.pdf')], [('file', 'fax.pdf', open('fax.pdf', 'rb'))])
+    _post(http, url, encoder, {'Content-Type': encoder.content_type, 'Content-Length': str(len(encoder))})
+    
+    """
+    
+    def __init__(self, fields, files, boundary=None):
+        """Instantiates the MultipartEncoder class
+        
+        Arguments:
+        fields -- A sequence of (name, value) elements for regular form fields
+        files -- A sequence of (name, filename, f) elements for files to upload, where f is a file object opened in binary mode, bytes or a string
+        
+        Keyword arguments:
+        boundary -- The boundary between parts (a random one by default)
+        
+        """
+        self.boundary = boundary or '----------pamfax%s' % binascii.hexlify(os.urandom(16)).decode('ascii')
+        self.content_type = 'multipart/form-data; boundary=%s' % self.boundary
+        self._parts = []
+        for (name, value) in fields:
+            if isinstance(value, str):
+                value = value.encode('utf-8')
+            header = ('--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n' % (self.boundary, name)).encode('utf-8')
+            self._parts.append((header, value, None, len(value)))
+        for (name, filename, f) in files:
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            header = ('--%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\nContent-Type: %s\r\n\r\n' % (self.boundary, name, filename, mimetype)).encode('utf-8')
+            if isinstance(f, str):
+                f = f.encode('utf-8')
+            if isinstance(f, bytes):
+                self._parts.append((header, f, None, len(f)))
+            else:
+                start = f.tell()
+                self._parts.append((header, None, (f, start), os.fstat(f.fileno()).st_size - start))
+        self._footer = ('--%s--\r\n' % self.boundary).encode('ascii')
+        self.length = sum(len(header) + size + 2 for (header, value, f, size) in self._parts) + len(self._footer)
+    
+    def __len__(self):
+        return self.length
+    
+    def __iter__(self):
+        for (header, value, f, size) in self._parts:
+            yield header
+            if f is None:
+                yield value
+            else:
+                f, start = f
+                f.seek(start)
+                remaining = size
+                while remaining > 0:
+                    chunk = f.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise IOError("%s is shorter than when the upload started" % getattr(f, 'name', 'File'))
+                    remaining -= len(chunk)
+                    yield chunk
+            yield b'\r\n'
+        yield self._footer
 
 # ----------------------------------------------------------------------------
-# Common
+# Connection pooling
 # ----------------------------------------------------------------------------
 
-class Common:
-    """Class encapsulating common actions for the PamFax API"""
+class PooledHTTPSConnection(HTTPSConnection):
+    """An HTTPS connection that shares its TLS context and session with the other connections of its pool.
+    
+    Where the ssl module supports it, the TLS session of the pool is offered
+    when connecting, so reconnects and new connections resume the session
+    instead of doing a full handshake. Connect and handshake times are
+    recorded in the pool's statistics.
+    
+    """
+    
+    def __init__(self, pool):
+        """Instantiates the PooledHTTPSConnection class"""
+        HTTPSConnection.__init__(self, pool.host, timeout=pool.timeout.connect)
+        self.pool = pool
+        self.read_timeout = pool.timeout.read
+        self.deadline = None
+    
+    def connect(self):
+        """Connects to the host and performs the TLS handshake, resuming the pool's TLS session if possible."""
+        start = time.time()
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        connected = time.time()
+        kwargs = {'server_hostname': self.host}
+        if TLS_SESSIONS and self.pool.tls_session is not None:
+            kwargs['session'] = self.pool.tls_session
+        self.sock = self.pool.context.wrap_socket(sock, **kwargs)
+        resumed = TLS_SESSIONS and self.sock.session_reused
+        self.pool.record(connections=1, connect_seconds=connected - start, handshake_seconds=time.time() - connected, tls_sessions_resumed=int(resumed))
+        logger.debug("Connected to %s in %.3fs (TLS session resumed: %s)", self.host, time.time() - start, resumed)
+
+class ConnectionPool:
+    """A thread-safe pool of HTTPS connections to a single PamFax host.
+    
+    Processors accept either a ConnectionPool or a single HTTPSConnection as
+    their http argument. Connections are opened lazily, up to size of them,
+    and each one is used by only one request at a time.
+    
+    The stats attribute counts the requests made through the pool and the
+    response bytes received, both as sent over the wire (bytes_received) and
+    after decompression (bytes_decoded), as well as the connections opened,
+    the total time spent connecting and in TLS handshakes, how many
+    handshakes resumed an earlier TLS session, and how many requests were
+    hedged and how many of those the duplicate answered first, how many
+    were rejected by an open circuit breaker, and how many were answered
+    from the cache of responses to actions with a ttl (see Endpoint).
+    
+    """
+    
+    def __init__(self, host, size=4, timeout=DEFAULT_TIMEOUT, context=None, timeouts=None, hedging=None, breaker=None):
+        """Instantiates the ConnectionPool class
+        
+        Arguments:
+        host -- The PamFax API host to connect to
+        
+        Keyword arguments:
+        size -- The maximum number of connections to keep open at once
+        timeout -- The Timeout for actions without a timeout of their own
+        context -- The ssl.SSLContext shared by all connections (the default context by default)
+        timeouts -- Dict of action names to Timeouts, overriding ACTION_TIMEOUTS
+        hedging -- Optional Hedging settings for hedged requests (no hedging by default)
+        breaker -- Optional CircuitBreaker guarding the host (no circuit breaking by default)
+        
+        """
+        self.host = host
+        self.size = size
+        self.timeout = timeout
+        self.timeouts = dict(ACTION_TIMEOUTS)
+        self.timeouts.update(timeouts or {})
+        self.context = context or ssl.create_default_context()
+        self.tls_session = None
+        self.hedging = hedging
+        self.breaker = breaker
+        self._idle = Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._cache = {}
+        self.stats = {'requests': 0, 'bytes_received': 0, 'bytes_decoded': 0,
+                      'connections': 0, 'connect_seconds': 0.0, 'handshake_seconds': 0.0, 'tls_sessions_resumed': 0,
+                      'hedged_requests': 0, 'hedges_won': 0, 'rejected_requests': 0, 'cache_hits': 0}
+    
+    def timeout_for(self, action):
+        """Returns the Timeout for an action: the one set with request_timeout, the action's own, or the pool default."""
+        return getattr(_local, 'timeout', None) or self.timeouts.get(action, self.timeout)
+    
+    def record(self, **counts):
+        """Adds the given counts to the pool's statistics."""
+        self._lock.acquire()
+        try:
+            for key, value in counts.items():
+                self.stats[key] = self.stats.get(key, 0) + value
+        finally:
+            self._lock.release()
+    
+    def cached(self, key):
+        """Returns a copy of the response cached under key, or None if there is none or it has expired."""
+        self._lock.acquire()
+        try:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._cache[key]
+                return None
+            self.stats['cache_hits'] += 1
+        finally:
+            self._lock.release()
+        return copy.deepcopy(entry[1])
+    
+    def store(self, key, result, ttl):
+        """Caches a copy of a response under key for ttl seconds, if it is a successful JSON response."""
+        if not isinstance(result, dict) or result.get('result', {}).get('code') != 'success':
+            return
+        result = copy.deepcopy(result)
+        self._lock.acquire()
+        try:
+            if len(self._cache) >= MAX_CACHED_RESPONSES:
+                self._cache.clear()
+            self._cache[key] = (time.time() + ttl, result)
+        finally:
+            self._lock.release()
+    
+    def invalidate(self, base_urls=None):
+        """Drops the cached responses of the processors with the given base URLs, e.g. ('/Common',), or all of them."""
+        self._lock.acquire()
+        try:
+            if base_urls is None:
+                self._cache.clear()
+                return
+            prefixes = tuple('%s/' % base_url for base_url in base_urls)
+            for key in [key for key in self._cache if key[0].startswith(prefixes)]:
+                del self._cache[key]
+        finally:
+            self._lock.release()
+    
+    def acquire(self, block=True):
+        """Returns an idle connection, opening a new one if the pool is not full.
+        
+        If the pool is exhausted, blocks until a connection is released, or
+        returns None if block is false.
+        
+        """
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+        self._lock.acquire()
+        try:
+            if self._created < self.size:
+                self._created += 1
+                logger.info("Opening connection %d to %s", self._created, self.host)
+                return PooledHTTPSConnection(self)
+        finally:
+            self._lock.release()
+        if not block:
+            return None
+        return self._idle.get()
+    
+    def warm(self, count=None):
+        """Opens up to count new connections (by default, until the pool is full) in parallel and adds them to the pool.
+        
+        Warmed connections have finished their TCP and TLS handshakes, so the
+        first requests sent over them only take a single round trip.
+        
+        """
+        self._lock.acquire()
+        try:
+            count = min(self.size - self._created, self.size if count is None else count)
+            self._created += max(count, 0)
+        finally:
+            self._lock.release()
+        
+        def connect():
+            http = PooledHTTPSConnection(self)
+            try:
+                http.connect()
+            except Exception as e:
+                logger.warning("Warming a connection to %s failed: %s", self.host, e)
+                http.close()
+            self._idle.put(http)
+        
+        threads = [threading.Thread(target=connect) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    
+    def release(self, http, discard=False):
+        """Returns a connection to the pool.
+        
+        If discard is true, the underlying socket is closed first so that the
+        next request on this connection reconnects from scratch.
+        
+        """
+        if discard:
+            http.close()
+        elif TLS_SESSIONS and getattr(http, 'sock', None) is not None:
+            self.tls_session = getattr(http.sock, 'session', None) or self.tls_session
+        self._idle.put(http)
+
+# ----------------------------------------------------------------------------
+# Endpoints
+# ----------------------------------------------------------------------------
+
+STATIC_TTL = 3600
+SETTINGS_TTL = 300
+READ_PREFIXES = ('Count', 'Get', 'Has', 'List', 'Ping', 'Validate')
+
+ENDPOINTS = {}
+
+class Endpoint:
+    """A PamFax API action, as described in the endpoints table of a processor.
+    
+    action -- The PamFax action name, e.g. 'GetFaxState'
+    required -- The names of the parameters that must be given, in order
+    optional -- The names of the parameters that may be left out, in order
+    defaults -- Dict of the optional parameters that default to something other than None
+    method -- 'GET', or 'POST' to send the parameters as a form body instead of in the URL (e.g. for passwords)
+    idempotent -- Whether the action is safe to send twice (by default, if its name starts with one of READ_PREFIXES)
+    ttl -- Seconds that a successful response may be reused for the same request on the same connection pool
+    invalidates -- The base URLs of the processors whose cached responses a call drops if the action is not idempotent (its own processor by default)
+    paginated -- Whether the action takes current_page and items_per_page; an iter_ method that yields the items of all pages is generated as well
+    binary -- Whether the action returns file data instead of JSON; the generated method takes a sink to stream it into
+    doc -- The docstring of the generated method
+    name -- The name of the generated method (the action name in snake case by default)
+    
+    """
+    
+    def __init__(self, action, required=(), optional=(), defaults=None, method='GET', idempotent=None, ttl=None, invalidates=None, paginated=False, binary=False, doc=None, name=None):
+        """Instantiates the Endpoint class"""
+        self.action = action
+        self.required = required
+        self.optional = optional
+        self.defaults = defaults or {}
+        self.method = method
+        if idempotent is None:
+            idempotent = action.startswith(READ_PREFIXES)
+        self.idempotent = idempotent
+        self.ttl = ttl
+        self.invalidates = invalidates
+        self.paginated = paginated
+        self.binary = binary
+        self.doc = doc
+        self.name = name or re.sub(r'(?<=[a-z0-9])([A-Z])|(?<=[A-Z])([A-Z])(?=[a-z])', r'_\1\2', action).lower()
+        parameters = [inspect.Parameter('self', inspect.Parameter.POSITIONAL_OR_KEYWORD)]
+        parameters.extend(inspect.Parameter(name, inspect.Parameter.POSITIONAL_OR_KEYWORD) for name in required)
+        parameters.extend(inspect.Parameter(name, inspect.Parameter.POSITIONAL_OR_KEYWORD, default=self.defaults.get(name)) for name in optional)
+        if binary:
+            parameters.append(inspect.Parameter('sink', inspect.Parameter.POSITIONAL_OR_KEYWORD, default=None))
+        self.signature = inspect.Signature(parameters)
+    
+    def __repr__(self):
+        return 'Endpoint(%r)' % self.action
+    
+    def bind(self, args, kwargs):
+        """Returns a dict of the parameters of a call to the generated method, by name and in order, with defaults applied."""
+        bound = self.signature.bind(None, *args, **kwargs)
+        bound.apply_defaults()
+        params = bound.arguments
+        del params['self']
+        return params
+
+def _endpoint(url):
+    """Returns the Endpoint of a URL, e.g. the one for FaxJob/GetFaxState for '/FaxJob/GetFaxState?...', or None."""
+    return ENDPOINTS.get(url.split('?', 1)[0])
+
+def _method(endpoint):
+    """Returns a processor method that sends the request of an endpoint."""
+    
+    def method(self, *args, **kwargs):
+        params = endpoint.bind(args, kwargs)
+        return self._call(endpoint, params, params.pop('sink', None))
+    
+    method.__name__ = endpoint.name
+    method.__doc__ = endpoint.doc
+    method.__signature__ = endpoint.signature
+    return method
+
+def _pages(endpoint):
+    """Returns a processor method that yields the items of every page of a paginated endpoint."""
+    
+    def iterate(self, *args, **kwargs):
+        params = endpoint.bind(args, kwargs)
+        current_page = params.pop('current_page') or 1
+        items_per_page = params.pop('items_per_page') or ITEMS_PER_PAGE
+        call = lambda **page: self._call(endpoint, dict(params, **page))
+        for items in pages(call, items_per_page, current_page):
+            for item in items:
+                yield item
+    
+    iterate.__name__ = 'iter_' + endpoint.name
+    iterate.__doc__ = """Yields the items of all pages of %s, starting at current_page, fetching items_per_page (%d by default) at a time.""" % (endpoint.name, ITEMS_PER_PAGE)
+    iterate.__signature__ = endpoint.signature
+    return iterate
+
+class Processor:
+    """Base class of the processors, whose methods are generated from their endpoints tables.
+    
+    Each Endpoint in the endpoints of a subclass is registered in ENDPOINTS,
+    where the transport looks up how to treat its requests, and gets a method
+    unless the subclass defines one of the same name itself. The names of all
+    public methods of a subclass are collected in its methods attribute, so
+    that PamFax can delegate to them without inspecting the processors.
+    
+    """
+    
+    base_url = None
+    endpoints = ()
+    methods = ()
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for endpoint in cls.endpoints:
+            ENDPOINTS['%s/%s' % (cls.base_url, endpoint.action)] = endpoint
+            if endpoint.invalidates is None:
+                endpoint.invalidates = (cls.base_url,)
+            if endpoint.name not in cls.__dict__:
+                setattr(cls, endpoint.name, _method(endpoint))
+            if endpoint.paginated:
+                setattr(cls, 'iter_' + endpoint.name, _pages(endpoint))
+        cls.methods = tuple(sorted(name for name, value in cls.__dict__.items() if callable(value) and not name.startswith('_')))
     
     def __init__(self, api_credentials, http):
-        """Instantiates the Common class"""
-        self.base_url = '/Common'
+        """Instantiates the processor"""
         self.api_credentials = api_credentials
         self.http = http
     
-    def get_current_settings(self):
-        """Returns the current settings for timezone and currency. 
+    def _call(self, endpoint, params, sink=None):
+        """Sends the request of an endpoint with the given parameters and returns the response."""
+        if endpoint.method == 'POST':
+            url = _get_url(self.base_url, endpoint.action, self.api_credentials)
+            return _post(self.http, url, urlencode(_query(params)), {'Content-Type': CONTENT_TYPE_FORM})
+        url = _get_url(self.base_url, endpoint.action, self.api_credentials, **params)
+        return _get(self.http, url, sink=sink)
+
+# ----------------------------------------------------------------------------
+# Common
+# ----------------------------------------------------------------------------
+
+class Common(Processor):
+    """Class encapsulating common actions for the PamFax API"""
+    
+    base_url = '/Common'
+    endpoints = (
+        Endpoint('GetCurrentSettings', ttl=SETTINGS_TTL, doc="""Returns the current settings for timezone and currency. 
         This is the format/timezone ALL return values of the API are in. These are taken from the user 
         (if logged in, the api user's settings or the current ip address)
         
-        """
-        url = _get_url(self.base_url, 'GetCurrentSettings', self.api_credentials)
-        return _get(self.http, url)
-    
-    def get_file(self, file_uuid):
-        """Returns file content.
+        """),
+        Endpoint('GetFile', ('file_uuid',), binary=True, doc="""Returns file content.
         
         Will return binary data and headers that give the filename and mimetype.
         Note: User identified by usertoken must be owner of the file or
@@ -163,22 +1244,17 @@ class Common:
         Arguments:
         file_uuid -- The uuid of the file to get
         
-        """
-        url = _get_url(self.base_url, 'GetFile', self.api_credentials, file_uuid=file_uuid)
-        return _get(self.http, url)
-    
-    def get_geo_ip_information(self, ip):
-        """Returns Geo information based on the given IP address (IPV4)
+        Keyword arguments:
+        sink -- Optional file-like object to stream the file content into instead of returning it
+        
+        """),
+        Endpoint('GetGeoIPInformation', ('ip',), ttl=STATIC_TTL, doc="""Returns Geo information based on the given IP address (IPV4)
         
         Arguments:
         ip -- the ip to get geo information off
         
-        """
-        url = _get_url(self.base_url, 'GetGeoIPInformation', self.api_credentials, ip=ip)
-        return _get(self.http, url)
-    
-    def get_page_preview(self, uuid, page_no, max_width=None, max_height=None):
-        """Returns a preview page for a fax.
+        """),
+        Endpoint('GetPagePreview', ('uuid', 'page_no'), ('max_width', 'max_height'), binary=True, doc="""Returns a preview page for a fax.
         
         May be in progress, sent or from inbox.
         
@@ -187,34 +1263,19 @@ class Common:
         page_no -- Page number to get (1,2,...)
         max_width -- Maximum width in Pixel
         max_height -- Maximum height in Pixel
+        sink -- Optional file-like object to stream the image into instead of returning it
         
-        """
-        url = _get_url(self.base_url, 'GetPagePreview', self.api_credentials, uuid=uuid, page_no=page_no, max_width=max_width, max_height=max_height)
-        return _get(self.http, url)
-    
-    def list_constants(self):
-        """DEPRECATED"""
-        return None
-    
-    def list_countries(self):
-        """Returns all countries with their translated names and the default zone"""
-        url = _get_url(self.base_url, 'ListCountries', self.api_credentials)
-        return _get(self.http, url)
-    
-    def list_countries_for_zone(self, zone):
-        """Returns all countries in the given zone
+        """),
+        Endpoint('ListCountries', ttl=STATIC_TTL, doc="""Returns all countries with their translated names and the default zone"""),
+        Endpoint('ListCountriesForZone', ('zone',), ttl=STATIC_TTL, doc="""Returns all countries in the given zone
         
         Result includes their translated names, countrycode and country-prefix.
         
         Arguments:
         zone -- Zone of the country which is wanted (1-7)
         
-        """
-        url = _get_url(self.base_url, 'ListCountriesForZone', self.api_credentials, zone=zone)
-        return _get(self.http, url)
-    
-    def list_currencies(self, code=None):
-        """Returns the list of supported currencies.
+        """),
+        Endpoint('ListCurrencies', (), ('code',), ttl=SETTINGS_TTL, doc="""Returns the list of supported currencies.
         
         Result contains convertion rates too.
         If code is given will only return the specified currency's information.
@@ -222,12 +1283,8 @@ class Common:
         Keyword arguments:
         code -- CurrencyCode
         
-        """
-        url = _get_url(self.base_url, 'ListCurrencies', self.api_credentials, code=code)
-        return _get(self.http, url)
-    
-    def list_languages(self, min_percent_translated=None):
-        """List all available languages.
+        """),
+        Endpoint('ListLanguages', (), ('min_percent_translated',), ttl=STATIC_TTL, doc="""List all available languages.
         
         Result may be filtered tso that only languages are returned that are
         at least translated $min_percent_translated %
@@ -235,12 +1292,8 @@ class Common:
         Keyward arguments:
         min_percent_translated -- the percentage value the languages have to be translated
         
-        """
-        url = _get_url(self.base_url, 'ListLanguages', self.api_credentials, min_percent_translated=min_percent_translated)
-        return _get(self.http, url)
-    
-    def list_strings(self, ids, culture=None):
-        """Returns a list of strings translated into the given language.
+        """),
+        Endpoint('ListStrings', ('ids',), ('culture',), ttl=STATIC_TTL, doc="""Returns a list of strings translated into the given language.
         
         Arguments:
         ids -- array of String identifiers. You may also pass a comma separated list as $ids[0] (ids[0]=BTN_YES,BTN_NO).
@@ -248,137 +1301,79 @@ class Common:
         Keyword arguments:
         culture -- culture identifier, defaults to users culture. Accepts full culture-codes like en-US, de-DE and just a language code like en, de, ...
         
-        """
-        url = _get_url(self.base_url, 'ListStrings', self.api_credentials, ids=ids, culture=culture)
-        return _get(self.http, url)
-    
-    def list_supported_file_types(self):
-        """Returns the supported file types for documents that can be faxed."""
-        url = _get_url(self.base_url, 'ListSupportedFileTypes', self.api_credentials)
-        return _get(self.http, url)
-    
-    def list_timezones(self):
-        """List all supported timezones"""
-        url = _get_url(self.base_url, 'ListTimezones', self.api_credentials)
-        return _get(self.http, url)
-    
-    def list_versions(self):
-        """Lists the current Versions.
+        """),
+        Endpoint('ListSupportedFileTypes', ttl=STATIC_TTL, doc="""Returns the supported file types for documents that can be faxed."""),
+        Endpoint('ListTimezones', ttl=STATIC_TTL, doc="""List all supported timezones"""),
+        Endpoint('ListVersions', ttl=STATIC_TTL, doc="""Lists the current Versions.
         Result contains versions for the PamFax Gadget, Client etc and returns
         the version and update url
-        """
-        url = _get_url(self.base_url, 'ListVersions', self.api_credentials)
-        return _get(self.http, url)
+        """),
+        Endpoint('ListZones', ttl=STATIC_TTL, doc="""Returns price and price_pro for a given zone"""),
+    )
     
-    def list_zones(self):
-        """Returns price and price_pro for a given zone"""
-        url = _get_url(self.base_url, 'ListZones', self.api_credentials)
-        return _get(self.http, url)
+    def list_constants(self):
+        """DEPRECATED"""
+        return None
 
 # ----------------------------------------------------------------------------
 # FaxHistory
 # ----------------------------------------------------------------------------
 
-class FaxHistory:
+class FaxHistory(Processor):
     """Class encapsulating actions related to fax history for this account"""
     
-    def __init__(self, api_credentials, http):
-        """Instantiates the FaxHistory class"""
-        self.base_url = '/FaxHistory'
-        self.api_credentials = api_credentials
-        self.http = http
-    
-    def add_fax_note(self, fax_uuid, note):
-        """Add a note (free text) to the fax
+    base_url = '/FaxHistory'
+    endpoints = (
+        Endpoint('AddFaxNote', ('fax_uuid', 'note'), doc="""Add a note (free text) to the fax
         
         Arguments:
         fax_uuid -- uuid of the fax
         note -- text to add to the fax
         
-        """
-        url = _get_url(self.base_url, 'AddFaxNote', self.api_credentials, fax_uuid=fax_uuid, note=note)
-        return _get(self.http, url)
-    
-    def count_faxes(self, type):
-        """Returns the number of faxes from users history with a specific state.
+        """),
+        Endpoint('CountFaxes', ('type',), doc="""Returns the number of faxes from users history with a specific state.
         
         Arguments:
         type -- Possible values: history, inbox, inbox_unread, outbox or unpaid
         
-        """
-        url = _get_url(self.base_url, 'CountFaxes', self.api_credentials, type=type)
-        return _get(self.http, url)
-    
-    def delete_fax(self):
-        """DEPRECATED! Use DeleteFaxes instead"""
-        return None
-    
-    def delete_fax_from_trash(self):
-        """DEPRECATED! Use DeleteFaxesFromTrash instead"""
-        return None
-    
-    def delete_faxes(self, uuids, siblings_too=None):
-        """Moves faxes to the trash.
+        """),
+        Endpoint('DeleteFaxes', ('uuids',), ('siblings_too',), doc="""Moves faxes to the trash.
         
         If siblings_too is true will perform for the given faxes and all other recipients
         from the same fax jobs.
         siblings_too will only be evaluated for uuids beloging to an outgoing fax and will be
         ignored for incoming faxes uuids
         
-        """
-        url = _get_url(self.base_url, 'DeleteFaxes', self.api_credentials, uuids=uuids, siblings_too=siblings_too)
-        return _get(self.http, url)
-    
-    def delete_faxes_from_trash(self, uuids):
-        """Removes faxes from trash
+        """),
+        Endpoint('DeleteFaxesFromTrash', ('uuids',), doc="""Removes faxes from trash
         
         This method is similar to EmptyTrash() which deletes all the faxes from trash
         
         Arguments:
         uuids -- ids of faxes to be removed vom trash
         
-        """
-        url = _get_url(self.base_url, 'DeleteFaxesFromTrash', self.api_credentials, uuids=uuids)
-        return _get(self.http, url)
-    
-    def empty_trash(self):
-        """Removes all faxes from trash for user and if user is member of a company and has delete rights also for the owners inbox faxes"""
-        url = _get_url(self.base_url, 'EmptyTrash', self.api_credentials)
-        return _get(self.http, url)
-    
-    def get_fax_details(self, uuid):
-        """Returns the details of a fax in progress.
+        """),
+        Endpoint('EmptyTrash', doc="""Removes all faxes from trash for user and if user is member of a company and has delete rights also for the owners inbox faxes"""),
+        Endpoint('GetFaxDetails', ('uuid',), doc="""Returns the details of a fax in progress.
         
         Arguments:
         uuid -- UUID of the fax to show
         
-        """
-        url = _get_url(self.base_url, 'GetFaxDetails', self.api_credentials, uuid=uuid)
-        return _get(self.http, url)
-    
-    def get_fax_group(self, uuid):
-        """Returns a fax groups details.
+        """),
+        Endpoint('GetFaxGroup', ('uuid',), doc="""Returns a fax groups details.
         
         Arguments:
         uuid -- Uuid of one of the faxes in the group.
         
-        """
-        url = _get_url(self.base_url, 'GetFaxGroup', self.api_credentials, uuid=uuid)
-        return _get(self.http, url)
-    
-    def get_inbox_fax(self, uuid, mark_read=None):
-        """Returns the details of a fax in the inbox.
+        """),
+        Endpoint('GetInboxFax', ('uuid',), ('mark_read',), doc="""Returns the details of a fax in the inbox.
         
         Arguments:
         uuid -- UUID of the fax to show
         mark_read -- If true marks the fax as read (default: false).
         
-        """
-        url = _get_url(self.base_url, 'GetInboxFax', self.api_credentials, uuid=uuid, mark_read=mark_read)
-        return _get(self.http, url)
-    
-    def get_transmission_report(self, uuid):
-        """Get a .pdf-Version of a transmission report.
+        """),
+        Endpoint('GetTransmissionReport', ('uuid',), binary=True, doc="""Get a .pdf-Version of a transmission report.
         
         On the transmission report basic data of the fax and a preview of the first page is shown.
         Should always be called with API_MODE_PASSTHRU, as the result is the pdf as binary data
@@ -386,12 +1381,11 @@ class FaxHistory:
         Arguments:
         uuid -- @attribute[RequestParam('uuid','string')]
         
-        """
-        url = _get_url(self.base_url, 'GetTransmissionReport', self.api_credentials, uuid=uuid)
-        return _get(self.http, url)
-    
-    def list_fax_group(self, uuid, current_page=None, items_per_page=None):
-        """Lists all faxes in a group (that are sent as on job).
+        Keyword arguments:
+        sink -- Optional file-like object to stream the report into instead of returning it
+        
+        """),
+        Endpoint('ListFaxGroup', ('uuid',), ('current_page', 'items_per_page'), paginated=True, doc="""Lists all faxes in a group (that are sent as on job).
         
         Arguments:
         uuid -- Uuid of one of the faxes in the group.
@@ -400,44 +1394,28 @@ class FaxHistory:
         current_page -- The page which should be shown
         items_per_page -- How many items are shown per page
         
-        """
-        url = _get_url(self.base_url, 'ListFaxGroup', self.api_credentials, uuid=uuid, current_page=current_page, items_per_page=items_per_page)
-        return _get(self.http, url)
-    
-    def list_fax_notes(self, fax_uuid):
-        """Lists all notes for the given fax in reverse order (latest first)
+        """),
+        Endpoint('ListFaxNotes', ('fax_uuid',), doc="""Lists all notes for the given fax in reverse order (latest first)
         
         Arguments:
         fax_uuid -- uuid of the fax to list notes for
         
-        """
-        url = _get_url(self.base_url, 'ListFaxNotes', self.api_credentials, fax_uuid=fax_uuid)
-        return _get(self.http, url)
-    
-    def list_inbox_faxes(self, current_page=None, items_per_page=None):
-        """List all faxes in the inbox of the current user.
+        """),
+        Endpoint('ListInboxFaxes', (), ('current_page', 'items_per_page'), paginated=True, doc="""List all faxes in the inbox of the current user.
         
         Keyword arguments:
         current_page -- The page which should be shown
         items_per_page -- How many items are shown per page
         
-        """
-        url = _get_url(self.base_url, 'ListInboxFaxes', self.api_credentials, current_page=current_page, items_per_page=items_per_page)
-        return _get(self.http, url)
-    
-    def list_outbox_faxes(self, current_page=None, items_per_page=None):
-        """Faxes in the outbox that are currently in the sending process
+        """),
+        Endpoint('ListOutboxFaxes', (), ('current_page', 'items_per_page'), paginated=True, doc="""Faxes in the outbox that are currently in the sending process
         
         Keyword arguments:
         current_page -- The page which should be shown
         items_per_page -- How many items are shown per page
         
-        """
-        url = _get_url(self.base_url, 'ListOutboxFaxes', self.api_credentials, current_page=current_page, items_per_page=items_per_page)
-        return _get(self.http, url)
-    
-    def list_recent_faxes(self, count=None, data_to_list=None):
-        """Returns a list of latest faxes for the user.
+        """),
+        Endpoint('ListRecentFaxes', (), ('count', 'data_to_list'), doc="""Returns a list of latest faxes for the user.
         
         Does not contain deleted and delayed faxes (See ListTrash for deleted faxes).
         
@@ -445,34 +1423,22 @@ class FaxHistory:
         count -- The count of items to return. Valid values are between 1 and 100
         data_to_list -- Any message types you want this function to return. Allowed models are 'sent', 'inbox', 'outbox'. Leave empty to get faxes of any type.
         
-        """
-        url = _get_url(self.base_url, 'ListRecentFaxes', self.api_credentials, count=count, data_to_list=data_to_list)
-        return _get(self.http, url)
-    
-    def list_sent_faxes(self, current_page=None, items_per_page=None):
-        """List all sent faxes (successful or not)
+        """),
+        Endpoint('ListSentFaxes', (), ('current_page', 'items_per_page'), paginated=True, doc="""List all sent faxes (successful or not)
         
         Keyword arguments:
         current_page -- The page which should be shown
         items_per_page -- How many items are shown per page
         
-        """
-        url = _get_url(self.base_url, 'ListSentFaxes', self.api_credentials, current_page=current_page, items_per_page=items_per_page)
-        return _get(self.http, url)
-    
-    def list_trash(self, current_page=None, items_per_page=None):
-        """List all faxes in trash
+        """),
+        Endpoint('ListTrash', (), ('current_page', 'items_per_page'), paginated=True, doc="""List all faxes in trash
         
         Keyword arguments:
         current_page -- The page which should be shown
         items_per_page -- How many items are shown per page
         
-        """
-        url = _get_url(self.base_url, 'ListTrash', self.api_credentials, current_page=current_page, items_per_page=items_per_page)
-        return _get(self.http, url)
-    
-    def list_unpaid_faxes(self, current_page=None, items_per_page=None):
-        """Lists all unpaid faxes that are waiting for a payment.
+        """),
+        Endpoint('ListUnpaidFaxes', (), ('current_page', 'items_per_page'), paginated=True, doc="""Lists all unpaid faxes that are waiting for a payment.
         
         When this user makes a transaction to add credit, these faxes will be sent automatically
         if they are younger that 2 hours.
@@ -481,88 +1447,56 @@ class FaxHistory:
         current_page -- The page which should be shown
         items_per_page -- How many items are shown per page
         
-        """
-        url = _get_url(self.base_url, 'ListUnpaidFaxes', self.api_credentials, current_page=current_page, items_per_page=items_per_page)
-        return _get(self.http, url)
-    
-    def restore_fax(self, uuid):
-        """Restores a fax from the trash.
+        """),
+        Endpoint('RestoreFax', ('uuid',), doc="""Restores a fax from the trash.
         
         Arguments:
         uuid -- uuid of fax to restore
         
-        """
-        url = _get_url(self.base_url, 'RestoreFax', self.api_credentials, uuid=uuid)
-        return _get(self.http, url)
-    
-    def set_fax_read(self, uuid):
-        """Sets a fax' read date to current time.
+        """),
+        Endpoint('SetFaxRead', ('uuid',), doc="""Sets a fax' read date to current time.
         
         Fax needs to be a fax in the inbox.
         
         Arguments:
         uuid -- uuid of fax to set as read
         
-        """
-        url = _get_url(self.base_url, 'SetFaxRead', self.api_credentials, uuid=uuid)
-        return _get(self.http, url)
-    
-    def set_faxes_as_read(self, uuids):
-        """Sets the read date of all the faxes to the current time
+        """),
+        Endpoint('SetFaxesAsRead', ('uuids',), doc="""Sets the read date of all the faxes to the current time
         
         Arguments:
         uuids -- array of uuids for faxes to set as read
         
-        """
-        url = _get_url(self.base_url, 'SetFaxesAsRead', self.api_credentials, uuids=uuids)
-        return _get(self.http, url)
-    
-    def set_spam_state_for_faxes(self, uuids, is_spam=None):
-        """Sets the spamscore for all the faxes depending on the flag "is_spam"
+        """),
+        Endpoint('SetSpamStateForFaxes', ('uuids',), ('is_spam',), doc="""Sets the spamscore for all the faxes depending on the flag "is_spam"
         Takes an array of faxes UUIDs and marks them a spam if the second argument (is_spam) is true.
         Removes the Spam state if is_spam is false.
         If 15 or more faxes of the same sender has been marked as spam, all incoming faxes are directly moved to the trash.
         This is user specific, so if user A reports 15 faxes of one sender, then only all incoming faxes from the sender to
         him are directly sent to the trash.
         
-        """
-        url = _get_url(self.base_url, 'SetSpamStateForFaxes', self.api_credentials, uuids=uuids, is_spam=is_spam)
-        return _get(self.http, url)
+        """),
+    )
+    
+    def delete_fax(self):
+        """DEPRECATED! Use DeleteFaxes instead"""
+        return None
+    
+    def delete_fax_from_trash(self):
+        """DEPRECATED! Use DeleteFaxesFromTrash instead"""
+        return None
 
 # ----------------------------------------------------------------------------
 # FaxJob
 # ----------------------------------------------------------------------------
 
-class FaxJob:
+class FaxJob(Processor):
     """Class encapsulating a specific fax job"""
     
-    def __init__(self, api_credentials, http):
-        """Instantiates the FaxJob class"""
-        self.base_url = '/FaxJob'
-        self.api_credentials = api_credentials
-        self.http = http
-    
-    def add_file(self, filename, origin=None):
-        """Adds a file to the current fax.
-        
-        Requires the file to be uploaded as POST parameter named 'file' as a standard HTTP upload. This could be either Content-type: multipart/form-data with file content as base64-encoded data or as Content-type: application/octet-stream with just the binary data.
-        See http://www.faqs.org/rfcs/rfc1867.html for documentation on file uploads.
-        
-        Arguments:
-        filename -- Name of the file. You can also use the same file name for each file (i.e "fax.pdf")
-        
-        Keyword arguments:
-        origin -- Optional file origin (ex: photo, scan,... - maximum length is 20 characters).
-        
-        """
-        file = open(filename, 'rb')
-        basename = os.path.basename(file.name)
-        content_type, body = _encode_multipart_formdata([('filename', basename)], [('file', basename, file.read())])
-        url = _get_url(self.base_url, 'AddFile', self.api_credentials, filename=basename, origin=origin)
-        return _post(self.http, url, body, {'Content-Type': content_type, 'Content-Length': str(len(body))})
-    
-    def add_file_from_online_storage(self, provider, uuid):
-        """Add a file identified by an online storage identifier.
+    base_url = '/FaxJob'
+    endpoints = (
+        Endpoint('AddFile', ('filename',), ('origin',), method='POST'),
+        Endpoint('AddFileFromOnlineStorage', ('provider', 'uuid'), doc="""Add a file identified by an online storage identifier.
         
         You'll have to use the OnlineStorageApi to identify a user for an online storage provider first
         and then get listings of his files. These will contain the file identifiers used by this method.
@@ -571,45 +1505,25 @@ class FaxJob:
         provider -- Identifies the provider used (see OnlineStorageApi)
         uuid -- Identifies the file to be added (see OnlineStorageApi)
         
-        """
-        url = _get_url(self.base_url, 'AddFileFromOnlineStorage', self.api_credentials, provider=provider, uuid=uuid)
-        return _get(self.http, url)
-    
-    def add_recipient(self, number, name=None):
-        """Adds a recipient to the current fax."""
-        url = _get_url(self.base_url, 'AddRecipient', self.api_credentials, number=number, name=name)
-        return _get(self.http, url)
-    
-    def add_recipients(self, numbers, names=None):
-        """Adds recipients to the current fax.
+        """),
+        Endpoint('AddRecipient', ('number',), ('name',), doc="""Adds a recipient to the current fax."""),
+        Endpoint('AddRecipients', ('numbers',), ('names',), doc="""Adds recipients to the current fax.
         The given recipients will be added to current recipients.
         
-        """
-        url = _get_url(self.base_url, 'AddRecipients', self.api_credentials, numbers=numbers, names=names)
-        return _get(self.http, url)
-    
-    def add_remote_file(self, url):
-        """Add a remote file to the fax.
+        """),
+        Endpoint('AddRemoteFile', ('url',), doc="""Add a remote file to the fax.
         url may contain username:password for basic http auth, but this is the only supported
         authentication method.
         URL Examples:
         http://myusername:andpassord
         
-        """
-        url = _get_url(self.base_url, 'AddRemoteFile', self.api_credentials, url=url)
-        return _get(self.http, url)
-    
-    def cancel(self, uuid, siblings_too=None):
-        """Cancels fax sending for a fax recipient or a whole fax job.
+        """),
+        Endpoint('Cancel', ('uuid',), ('siblings_too',), doc="""Cancels fax sending for a fax recipient or a whole fax job.
         If siblings_too is true will cancel all faxes in the job the
         fax with uuid belongs to.
         
-        """
-        url = _get_url(self.base_url, 'Cancel', self.api_credentials, uuid=uuid, siblings_too=siblings_too)
-        return _get(self.http, url)
-    
-    def clone_fax(self, uuid, user_ip=IP_ADDR, user_agent=USER_AGENT):
-        """Clones an already sent fax in the API backend and returns it.
+        """),
+        Endpoint('CloneFax', ('uuid',), ('user_ip', 'user_agent'), defaults={'user_ip': IP_ADDR, 'user_agent': USER_AGENT}, doc="""Clones an already sent fax in the API backend and returns it.
         
         Arguments:
         uuid -- The uuid of the source fax
@@ -618,12 +1532,8 @@ class FaxJob:
         user_ip -- The IP address of the client (if available). Put your own IP address otherwise.
         user_agent -- User agent string of the client device. If not available, put something descriptive (like "iPhone OS 2.2")
         
-        """
-        url = _get_url(self.base_url, 'CloneFax', self.api_credentials, uuid=uuid, user_ip=user_ip, user_agent=user_agent)
-        return _get(self.http, url)
-    
-    def create(self, user_ip=IP_ADDR, user_agent=USER_AGENT, origin=ORIGIN):
-        """Creates a new fax in the API backend and returns it.
+        """),
+        Endpoint('Create', (), ('user_ip', 'user_agent', 'origin'), defaults={'user_ip': IP_ADDR, 'user_agent': USER_AGENT, 'origin': ORIGIN}, doc="""Creates a new fax in the API backend and returns it.
         
         If a fax job is currently in edit mode in this session, this fax job is returned instead.
         Note: This is not an error. It provides you with the possibility to continue with the fax.
@@ -633,123 +1543,55 @@ class FaxJob:
         user_agent -- User agent string of the client device. If not available, put something descriptive (like "iPhone OS 2.2")
         origin -- From where was this fax started? i.e. "printer", "desktop", "home", ... For reporting and analysis purposes.
         
-        """
-        url = _get_url(self.base_url, 'Create', self.api_credentials, user_ip=user_ip, user_agent=user_agent, origin=origin)
-        return _get(self.http, url)
-    
-    def get_fax_state(self):
-        """Returns the state of the current fax."""
-        url = _get_url(self.base_url, 'GetFaxState', self.api_credentials)
-        return _get(self.http, url)
-    
-    def get_preview(self):
-        """Returns the states of all preview pages."""
-        url = _get_url(self.base_url, 'GetPreview', self.api_credentials)
-        return _get(self.http, url)
-    
-    def list_available_covers(self):
-        """Returns a list of all coverpages the user may use.
+        """),
+        Endpoint('GetFaxState', doc="""Returns the state of the current fax."""),
+        Endpoint('GetPreview', doc="""Returns the states of all preview pages."""),
+        Endpoint('ListAvailableCovers', ttl=SETTINGS_TTL, doc="""Returns a list of all coverpages the user may use.
         Result includes the "no cover" if the fax job already contains a file as in that case
         there's no need to add a cover.
-        """
-        url = _get_url(self.base_url, 'ListAvailableCovers', self.api_credentials)
-        return _get(self.http, url)
-    
-    def list_fax_files(self):
-        """Get all uploaded files for the current fax"""
-        url = _get_url(self.base_url, 'ListFaxFiles', self.api_credentials)
-        return _get(self.http, url)
-    
-    def list_recipients(self, current_page=None, items_per_page=None):
-        """Returns the recipients for the current fax.
+        """),
+        Endpoint('ListFaxFiles', doc="""Get all uploaded files for the current fax"""),
+        Endpoint('ListRecipients', (), ('current_page', 'items_per_page'), paginated=True, doc="""Returns the recipients for the current fax.
         
         Keyword arguments:
         current_page -- The page which should be shown
         items_per_page -- How many items are shown per page
         
-        """
-        url = _get_url(self.base_url, 'ListRecipients', self.api_credentials, current_page=current_page, items_per_page=items_per_page)
-        return _get(self.http, url)
-    
-    def remove_all_files(self):
-        """Remove all uploaded files from the current fax"""
-        url = _get_url(self.base_url, 'RemoveAllFiles', self.api_credentials)
-        return _get(self.http, url)
-    
-    def remove_all_recipients(self):
-        """Removes all recipients for the current fax."""
-        url = _get_url(self.base_url, 'RemoveAllRecipients', self.api_credentials)
-        return _get(self.http, url)
-    
-    def remove_cover(self):
-        """Removes the cover from fax"""
-        url = _get_url(self.base_url, 'RemoveCover', self.api_credentials)
-        return _get(self.http, url)
-    
-    def remove_file(self, file_uuid):
-        """Remove a file from the current fax."""
-        url = _get_url(self.base_url, 'RemoveFile', self.api_credentials, file_uuid=file_uuid)
-        return _get(self.http, url)
-    
-    def remove_recipient(self, number):
-        """Removes a recipient from the current fax"""
-        url = _get_url(self.base_url, 'RemoveRecipient', self.api_credentials, number=number)
-        return _get(self.http, url)
-    
-    def send(self, send_at=None):
-        """Start the fax sending.
+        """),
+        Endpoint('RemoveAllFiles', doc="""Remove all uploaded files from the current fax"""),
+        Endpoint('RemoveAllRecipients', doc="""Removes all recipients for the current fax."""),
+        Endpoint('RemoveCover', doc="""Removes the cover from fax"""),
+        Endpoint('RemoveFile', ('file_uuid',), doc="""Remove a file from the current fax."""),
+        Endpoint('RemoveRecipient', ('number',), doc="""Removes a recipient from the current fax"""),
+        Endpoint('Send', (), ('send_at',), doc="""Start the fax sending.
         
         Only successful if all necessary data is set to the fax: at least 1 recipient and a cover page or a file uploaded.
         Will only work if user has enough credit to pay for the fax.
         You may pass in a datetime when the fax shall be sent. This must be a string formatted in the users chosen culture
         (so exactly as you would show it to him) and may not be in the past nor be greater than 'now + 14days'.
         
-        """
-        url = _get_url(self.base_url, 'Send', self.api_credentials, send_at=send_at)
-        return _get(self.http, url)
-    
-    def send_delayed_fax_now(self, uuid):
-        """Send a previously delayed fax now.
+        """),
+        Endpoint('SendDelayedFaxNow', ('uuid',), doc="""Send a previously delayed fax now.
         
         Use this method if you want to send a fax right now that was initially delayed (by giving a send_at value into Send).
         
-        """
-        url = _get_url(self.base_url, 'SendDelayedFaxNow', self.api_credentials, uuid=uuid)
-        return _get(self.http, url)
-    
-    def send_later(self, send_at=None):
-        """Put the fax in the unpaid faxes queue.
+        """),
+        Endpoint('SendLater', (), ('send_at',), doc="""Put the fax in the unpaid faxes queue.
         
         Only possible if user has NOT enough credit to send this fax directly.
         You may pass in a datetime when the fax shall be sent. This must be a string formatted in the users chosen culture
         (so exactly as you would show it to him) and may not be in the past nor be greater than 'now + 14days'.
         
-        """
-        url = _get_url(self.base_url, 'SendLater', self.api_credentials, send_at=send_at)
-        return _get(self.http, url)
-    
-    def send_unpaid(self):
-        """DEPRECATED! Use SendUnpaidFaxes instead"""
-        return None
-    
-    def send_unpaid_faxes(self, uuids):
-        """Send unpaid faxes
+        """),
+        Endpoint('SendUnpaidFaxes', ('uuids',), doc="""Send unpaid faxes
         
         Will work until credit reaches zero.
         Will return two lists: SentFaxes and UnpaidFaxes that contain the
         faxes that could or not be sent.
         
-        """
-        url = _get_url(self.base_url, 'SendUnpaidFaxes', self.api_credentials, uuids=uuids)
-        return _get(self.http, url)
-    
-    def set_cover(self, template_id, text=None):
-        """Sets the cover template for the current fax."""
-        url = _get_url(self.base_url, 'SetCover', self.api_credentials, template_id=template_id, text=text)
-        return _get(self.http, url)
-    
-    def set_notifications(self, notifications, group_notification=None, error_notification=None, save_defaults=None):
-        """Sets the notification options for the current fax.
+        """),
+        Endpoint('SetCover', ('template_id',), ('text',), doc="""Sets the cover template for the current fax."""),
+        Endpoint('SetNotifications', ('notifications',), ('group_notification', 'error_notification', 'save_defaults'), doc="""Sets the notification options for the current fax.
         
         Notification options that are not in the array will not be changed/resetted.
         Note: defaults for notification settings will be taken from users account, so potentially not need
@@ -758,43 +1600,56 @@ class FaxJob:
         Keyword arguments:
         save_defaults -- Save Notification-Settings to user's Profile
         
-        """
-        url = _get_url(self.base_url, 'SetNotifications', self.api_credentials, notifications=notifications, group_notification=group_notification, error_notification=error_notification, save_defaults=save_defaults)
-        return _get(self.http, url)
-    
-    def set_recipients(self, numbers, names=None):
-        """Creates recipients for the current fax.
+        """),
+        Endpoint('SetRecipients', ('numbers',), ('names',), doc="""Creates recipients for the current fax.
         
         All recipients are replaced with the given ones!
         
-        """
-        url = _get_url(self.base_url, 'SetRecipients', self.api_credentials, numbers=numbers, names=names)
-        return _get(self.http, url)
-    
-    def start_preview_creation(self):
-        """Starts creating the preview for this fax.
+        """),
+        Endpoint('StartPreviewCreation', doc="""Starts creating the preview for this fax.
         
         Call after fax is ready (GetFaxState returns FAX_READY_TO_SEND)
         
+        """),
+    )
+    
+    def add_file(self, filename, origin=None, progress=None):
+        """Adds a file to the current fax.
+        
+        Requires the file to be uploaded as POST parameter named 'file' as a standard HTTP upload. This could be either Content-type: multipart/form-data with file content as base64-encoded data or as Content-type: application/octet-stream with just the binary data.
+        See http://www.faqs.org/rfcs/rfc1867.html for documentation on file uploads.
+        
+        Arguments:
+        filename -- Name of the file. You can also use the same file name for each file (i.e "fax.pdf")
+        
+        Keyword arguments:
+        origin -- Optional file origin (ex: photo, scan,... - maximum length is 20 characters).
+        progress -- Optional callable(bytes_sent, bytes_total) invoked as the upload proceeds.
+        
         """
-        url = _get_url(self.base_url, 'StartPreviewCreation', self.api_credentials)
-        return _get(self.http, url)
+        file = open(filename, 'rb')
+        try:
+            basename = os.path.basename(file.name)
+            body = MultipartEncoder([('filename', basename)], [('file', basename, file)])
+            url = _get_url(self.base_url, 'AddFile', self.api_credentials, filename=basename, origin=origin)
+            return _post(self.http, url, body, {'Content-Type': body.content_type, 'Content-Length': str(len(body))}, progress)
+        finally:
+            file.close()
+    
+    def send_unpaid(self):
+        """DEPRECATED! Use SendUnpaidFaxes instead"""
+        return None
 
 # ----------------------------------------------------------------------------
 # NumberInfo
 # ----------------------------------------------------------------------------
 
-class NumberInfo:
+class NumberInfo(Processor):
     """Class encapsulating information for a given fax number"""
     
-    def __init__(self, api_credentials, http):
-        """Instantiates the NumberInfo class"""
-        self.base_url = '/NumberInfo'
-        self.api_credentials = api_credentials
-        self.http = http
-    
-    def get_number_info(self, faxnumber):
-        """Get some information about a fax number.
+    base_url = '/NumberInfo'
+    endpoints = (
+        Endpoint('GetNumberInfo', ('faxnumber',), ttl=STATIC_TTL, doc="""Get some information about a fax number.
         
         Result contains zone, type, city, ...
         Validates and corrects the number too.
@@ -802,37 +1657,27 @@ class NumberInfo:
         Arguments:
         faxnumber -- The faxnumber to query (incl countrycode: +12139851886, min length: 8)
         
-        """
-        url = _get_url(self.base_url, 'GetNumberInfo', self.api_credentials, faxnumber=faxnumber)
-        return _get(self.http, url)
-    
-    def get_page_price(self, faxnumber):
-        """Calculate the expected price per page to a given fax number.
+        """),
+        Endpoint('GetPagePrice', ('faxnumber',), doc="""Calculate the expected price per page to a given fax number.
         
         Use GetNumberInfo when you do not need pricing information, as calculating expected price takes longer then just looking up the info for a number.
         
         Arguments:
         faxnumber -- The faxnumber to query (incl countrycode: +12139851886, min length: 8). Login user first to get personalized prices.
         
-        """
-        url = _get_url(self.base_url, 'GetPagePrice', self.api_credentials, faxnumber=faxnumber)
-        return _get(self.http, url)
+        """),
+    )
 
 # ----------------------------------------------------------------------------
 # OnlineStorage
 # ----------------------------------------------------------------------------
 
-class OnlineStorage:
+class OnlineStorage(Processor):
     """Class encapsulating actions related to online storage"""
     
-    def __init__(self, api_credentials, http):
-        """Instantiates the OnlineStorage class"""
-        self.base_url = '/OnlineStorage'
-        self.api_credentials = api_credentials
-        self.http = http
-    
-    def authenticate(self, provider, username, password):
-        """Authenticate the current user for a Provider.
+    base_url = '/OnlineStorage'
+    endpoints = (
+        Endpoint('Authenticate', ('provider', 'username', 'password'), method='POST', doc="""Authenticate the current user for a Provider.
         
         This is a one-time process and must be done only once for each user.
         PamFax API will perform the login and store only an authentication token which
@@ -843,46 +1688,29 @@ class OnlineStorage:
         username -- The user's name/login for the provider
         password -- User's password to access his data at the provider side
         
-        """
-        url = _get_url(self.base_url, 'Authenticate', self.api_credentials, provider=provider, username=username, password=password)
-        return _get(self.http, url)
-    
-    def drop_authentication(self, provider):
-        """Will drop the users authentication for the given provider.
+        """),
+        Endpoint('DropAuthentication', ('provider',), doc="""Will drop the users authentication for the given provider.
         
         This will permanently erase all data related to the account!
         
-        """
-        url = _get_url(self.base_url, 'DropAuthentication', self.api_credentials, provider=provider)
-        return _get(self.http, url)
-    
-    def get_provider_logo(self, provider, size):
-        """Outputs a providers logo in a given size.
+        """),
+        Endpoint('GetProviderLogo', ('provider', 'size'), binary=True, doc="""Outputs a providers logo in a given size.
         
         Call ListProviders for valid sizes per Provider.
         
-        """
-        url = _get_url(self.base_url, 'GetProviderLogo', self.api_credentials, provider=provider, size=size)
-        return _get(self.http, url)
-    
-    def list_folder_contents(self, provider, folder=None, clear_cache=None):
-        """Lists all files and folders inside a given folder.
+        Keyword arguments:
+        sink -- Optional file-like object to stream the logo into instead of returning it
+        
+        """),
+        Endpoint('ListFolderContents', ('provider',), ('folder', 'clear_cache'), doc="""Lists all files and folders inside a given folder.
         
         Leave folder empty to get the contents of the root folder.
         User must be autheticated for the provider given here to be able to recieve listings (see Authenticate method).
         If clear_cache is set to true all subitems will be deleted and must be refetched (previously cached UUIDs are invalid)
         
-        """
-        url = _get_url(self.base_url, 'ListFolderContents', self.api_credentials, provider=provider, folder=folder, clear_cache=clear_cache)
-        return _get(self.http, url)
-    
-    def list_providers(self, attach_settings=None):
-        """Returns a list of supported providers."""
-        url = _get_url(self.base_url, 'ListProviders', self.api_credentials, attach_settings=attach_settings)
-        return _get(self.http, url)
-    
-    def set_auth_token(self, provider, token, username=None):
-        """Manually sets auth token for the current user.
+        """),
+        Endpoint('ListProviders', (), ('attach_settings',), ttl=SETTINGS_TTL, doc="""Returns a list of supported providers."""),
+        Endpoint('SetAuthToken', ('provider', 'token'), ('username',), doc="""Manually sets auth token for the current user.
         
         token must contain an associative array including the tokens.
         sample (google):
@@ -896,25 +1724,19 @@ class OnlineStorage:
         token -- Associative array with token information
         username -- Optional username (for displaying purposes)
         
-        """
-        url = _get_url(self.base_url, 'SetAuthToken', self.api_credentials, provider=provider, token=token, username=username)
-        return _get(self.http, url)
+        """),
+    )
 
 # ----------------------------------------------------------------------------
 # Session
 # ----------------------------------------------------------------------------
 
-class Session:
+class Session(Processor):
     """Class encapsulating a PamFax session"""
     
-    def __init__(self, api_credentials, http):
-        """Instantiates the Session class."""
-        self.base_url = '/Session'
-        self.api_credentials = api_credentials
-        self.http = http
-    
-    def create_login_identifier(self, user_ip=None, timetolifeminutes=None):
-        """Creates an identifier for the current user, which then can be passed to the portal to directly log in the user: https://portal.pamfax.biz/?_id=
+    base_url = '/Session'
+    endpoints = (
+        Endpoint('CreateLoginIdentifier', (), ('user_ip', 'timetolifeminutes'), doc="""Creates an identifier for the current user, which then can be passed to the portal to directly log in the user: https://portal.pamfax.biz/?_id=
         
         Be aware that these identifiers are case sensitive. Identifiers with ttl > 0 can only be used once.
         
@@ -922,79 +1744,49 @@ class Session:
         user_ip -- The IP address of the client on which this identifier will be bound to. Using the identfier from a different ip address will fail
         timetolifeminutes -- Optional a lifetime of this identifier. Defaults to 60 seconds. If <= 0 is given, the identifier does not expire and can be used more then once, but are tied to your current API key and can not be passed to online shop, portal, ... in the url
         
-        """
-        url = _get_url(self.base_url, 'CreateLoginIdentifier', self.api_credentials, user_ip=user_ip, timetolifeminutes=timetolifeminutes)
-        return _get(self.http, url)
-    
-    def list_changes(self):
-        """Returns all changes in the system that affect the currently logged in user. This could be changes to the user's profile, credit, settings, ...
+        """),
+        Endpoint('ListChanges', idempotent=False, doc="""Returns all changes in the system that affect the currently logged in user. This could be changes to the user's profile, credit, settings, ...
         
         Changes will be deleted after you received them once via this call, so use it wisely ;)
         
-        """
-        url = _get_url(self.base_url, 'ListChanges', self.api_credentials)
-        return _get(self.http, url)
-    
-    def logout(self):
-        """Terminate the current session. Log out."""
-        url = _get_url(self.base_url, 'Logout', self.api_credentials)
-        return _get(self.http, url)
-    
-    def ping(self):
-        """Just keeps a session alive. If there is no activity in a Session for 5 minutes, it will be terminated.
+        """),
+        Endpoint('Logout', doc="""Terminate the current session. Log out."""),
+        Endpoint('Ping', doc="""Just keeps a session alive. If there is no activity in a Session for 5 minutes, it will be terminated.
         
         You then would need to call Session::VerifyUser again and start a new FaxJob
         
-        """
-        url = _get_url(self.base_url, 'Ping', self.api_credentials)
-        return _get(self.http, url)
-    
-    def register_listener(self, listener_types, append=None):
-        """Registers listeners for the current session. Any change of the listened types will then be available via Session::ListChanges function
+        """),
+        Endpoint('RegisterListener', ('listener_types',), ('append',), doc="""Registers listeners for the current session. Any change of the listened types will then be available via Session::ListChanges function
         
         Arguments:
         listener_types -- Array of types to be registered ('faxall','faxsending','faxsucceeded','faxfailed','faxretrying')
         
-        """
-        url = _get_url(self.base_url, 'RegisterListener', self.api_credentials, listener_types=listener_types, append=append)
-        return _get(self.http, url)
-    
-    def reload_user(self):
-        """Returns the current user object.
+        """),
+        Endpoint('ReloadUser', doc="""Returns the current user object.
         
         Use this if you need to ensure that your locally stored user
         object is up to date.
         
-        """
-        url = _get_url(self.base_url, 'ReloadUser', self.api_credentials)
-        return _get(self.http, url)
-    
-    def verify_user(self, username, password):
-        """Verifies a user via username/password
+        """),
+        Endpoint('VerifyUser', ('username', 'password'), method='POST', doc="""Verifies a user via username/password
         
         Arguments:
         username -- Username of the user or the md5 of user's username. That's what he has entered when he registered
         password -- The password (or the md5 of the password) that the user entered in the registration process for the given username (case sensitive)
         
-        """
-        url = _get_url(self.base_url, 'VerifyUser', self.api_credentials, username=username, password=password)
-        return _get(self.http, url)
+        """),
+    )
 
 # ----------------------------------------------------------------------------
 # Shopping
 # ----------------------------------------------------------------------------
 
-class Shopping:
+class Shopping(Processor):
     """Class encapsulating shopping options available through PamFax"""
     
-    def __init__(self, api_credentials, http):
-        """Instantiates the Shopping class"""
-        self.base_url = '/Shopping'
-        self.api_credentials = api_credentials
-        self.http = http
-    
-    def add_credit_to_sandbox_user(self, amount, reason=None):
-        """Adds some credit in user's currency to the currently logged in user.
+    base_url = '/Shopping'
+    endpoints = (
+        Endpoint('AddCreditToSandboxUser', ('amount',), ('reason',), doc="""Adds some credit in user's currency to the currently logged in user.
         
         NOTES:
         This method is for testing purposes only, so it is not available in the LIVE system. Use it to create
@@ -1006,33 +1798,24 @@ class Shopping:
         Keyword arguments:
         reason -- Optionally add some reason why you added this credit
         
-        """
-        url = _get_url(self.base_url, 'AddCreditToSandboxUser', self.api_credentials, amount=amount, reason=reason)
-        return _get(self.http, url)
-    
-    def get_invoice(self, payment_uuid, hidecopy=None):
-        """Returns an invoice pdf file for a payment (see UserInfo/ListOrders).
+        """),
+        Endpoint('GetInvoice', ('payment_uuid',), ('hidecopy',), binary=True, doc="""Returns an invoice pdf file for a payment (see UserInfo/ListOrders).
         
         Returns binary data so call with API_FORMAT_PASSTHRU.
         
-        """
-        url = _get_url(self.base_url, 'GetInvoice', self.api_credentials, payment_uuid=payment_uuid, hidecopy=hidecopy)
-        return _get(self.http, url)
-    
-    def get_nearest_fax_in_number(self, ip_address):
-        """Get the nearest available fax-in area code for the given IP-Address.
+        Keyword arguments:
+        sink -- Optional file-like object to stream the invoice into instead of returning it
+        
+        """),
+        Endpoint('GetNearestFaxInNumber', ('ip_address',), doc="""Get the nearest available fax-in area code for the given IP-Address.
         
         Used to show "You can get a fax-in number in ..." to the user to offer PamFax plans to him
         
         Arguments:
         ip_address -- IP-Address to find nearest number for
         
-        """
-        url = _get_url(self.base_url, 'GetNearestFaxInNumber', self.api_credentials, ip_address=ip_address)
-        return _get(self.http, url)
-    
-    def get_shop_link(self, type=None, product=None, pay=None):
-        """Returns different shop links.
+        """),
+        Endpoint('GetShopLink', (), ('type', 'product', 'pay'), doc="""Returns different shop links.
         
         Use these links to open a browser window with the shop in a specific state.
         
@@ -1041,31 +1824,15 @@ class Shopping:
         product -- Product to add. Available: '',BasicPlan12,ProPlan12,OnDemand,Pack10,Pack30,Pack50,Pack100,Pack250,Pack500,Pack1000
         pay -- (DEPRECATED) direct leads to checkout page
         
-        """
-        url = _get_url(self.base_url, 'GetShopLink', self.api_credentials, type=type, product=product, pay=pay)
-        return _get(self.http, url)
-    
-    def list_available_items(self):
-        """Returns a list of available items from the shop.
+        """),
+        Endpoint('ListAvailableItems', ttl=SETTINGS_TTL, doc="""Returns a list of available items from the shop.
         
         When a user is logged in, it will also contain the items only available to validated customers.
         
-        """
-        url = _get_url(self.base_url, 'ListAvailableItems', self.api_credentials)
-        return _get(self.http, url)
-    
-    def list_fax_in_areacodes(self, country_code, state=None):
-        """Returns available fax-in area codes in a given country+state"""
-        url = _get_url(self.base_url, 'ListFaxInAreacodes', self.api_credentials, country_code=country_code, state=state)
-        return _get(self.http, url)
-    
-    def list_fax_in_countries(self):
-        """Retruns a list of countries where new fax-in numbers are currently available"""
-        url = _get_url(self.base_url, 'ListFaxInCountries', self.api_credentials)
-        return _get(self.http, url)
-    
-    def redeem_credit_voucher(self, vouchercode):
-        """Redeem a credit voucher.
+        """),
+        Endpoint('ListFaxInAreacodes', ('country_code',), ('state',), ttl=STATIC_TTL, doc="""Returns available fax-in area codes in a given country+state"""),
+        Endpoint('ListFaxInCountries', ttl=STATIC_TTL, doc="""Retruns a list of countries where new fax-in numbers are currently available"""),
+        Endpoint('RedeemCreditVoucher', ('vouchercode',), doc="""Redeem a credit voucher.
         
         These are different then the shop vouchers to be used in the online shop!
         You can use "PCPC0815" to test this function in the Sandbox API
@@ -1073,25 +1840,19 @@ class Shopping:
         Arguments:
         vouchercode -- The voucher code. Format is ignored.
         
-        """
-        url = _get_url(self.base_url, 'RedeemCreditVoucher', self.api_credentials, vouchercode=vouchercode)
-        return _get(self.http, url)
+        """),
+    )
 
 # ----------------------------------------------------------------------------
 # UserInfo
 # ----------------------------------------------------------------------------
 
-class UserInfo:
+class UserInfo(Processor):
     """Class encapsulating user info"""
     
-    def __init__(self, api_credentials, http):
-        """Instantiates the UserInfo class"""
-        self.base_url = '/UserInfo'
-        self.api_credentials = api_credentials
-        self.http = http
-    
-    def create_user(self, name, username, password, email, culture, externalprofile=None, campaign_id=None):
-        """Create a new PamFax user and logs him in
+    base_url = '/UserInfo'
+    endpoints = (
+        Endpoint('CreateUser', ('name', 'username', 'password', 'email', 'culture'), ('externalprofile', 'campaign_id'), method='POST', doc="""Create a new PamFax user and logs him in
         
         Arguments:
         name -- First and last name of the user
@@ -1104,93 +1865,49 @@ class UserInfo:
         externalprofile -- External profile data. externalprofile["type"] is the type of data: skype. externalprofile["client_ip"] should be set to the user's ip address
         campaign_id -- is used to payout recommendation bonus to given user uuid. i.e if user clicked on links like http://www.pamfax.biz/?ref=b36d019d53ba, the b36d019d53ba should be passed as campaign_id
         
-        """
-        url = _get_url(self.base_url, 'CreateUser', self.api_credentials, name=name, username=username, password=password, email=email, culture=culture, externalprofile=externalprofile, campaign_id=campaign_id)
-        return _get(self.http, url)
-    
-    def delete_user(self):
-        """Deletes the currently logged in users account.
+        """),
+        Endpoint('DeleteUser', doc="""Deletes the currently logged in users account.
         
         All assigned numbers and data will be deleted too!
         Warning: User will be deleted permanently without any chance to recover his data!
         
-        """
-        url = _get_url(self.base_url, 'DeleteUser', self.api_credentials)
-        return _get(self.http, url)
-    
-    def get_culture_info(self):
-        """Returns the users culture information"""
-        url = _get_url(self.base_url, 'GetCultureInfo', self.api_credentials)
-        return _get(self.http, url)
-    
-    def get_users_avatar(self, provider=None):
-        """Returns avatars for current user
+        """),
+        Endpoint('GetCultureInfo', ttl=SETTINGS_TTL, doc="""Returns the users culture information"""),
+        Endpoint('GetUsersAvatar', (), ('provider',), doc="""Returns avatars for current user
         
         Keyword arguments:
         provider -- Provider to load Image from
         
-        """
-        url = _get_url(self.base_url, 'GetUsersAvatar', self.api_credentials, provider=provider)
-        return _get(self.http, url)
-    
-    def has_avatar(self):
-        """Return if Avatar is available or not"""
-        url = _get_url(self.base_url, 'HasAvatar', self.api_credentials)
-        return _get(self.http, url)
-    
-    def has_plan(self):
-        """Check if the user has a Plan.
+        """),
+        Endpoint('HasAvatar', doc="""Return if Avatar is available or not"""),
+        Endpoint('HasPlan', doc="""Check if the user has a Plan.
         
         This would NOT include other fax numbers user has access to. Will return NONE if no plan, PRO or BASIC otherwise
         
-        """
-        url = _get_url(self.base_url, 'HasPlan', self.api_credentials)
-        return _get(self.http, url)
-    
-    def list_expirations(self, type=None):
-        """Returns expirations from current user
+        """),
+        Endpoint('ListExpirations', (), ('type',), doc="""Returns expirations from current user
         
         if type==false all Expirations are Returned
         else CREDIT, PROPLAN and
         
-        """
-        url = _get_url(self.base_url, 'ListExpirations', self.api_credentials, type=type)
-        return _get(self.http, url)
-    
-    def list_inboxes(self, expired_too=None, shared_too=None):
-        """Return the inboxes of the user with some additional data (like expiration).
+        """),
+        Endpoint('ListInboxes', (), ('expired_too', 'shared_too'), doc="""Return the inboxes of the user with some additional data (like expiration).
         
         Keyword arguments:
         expired_too -- If true, lists all expired numbers too.
         
-        """
-        url = _get_url(self.base_url, 'ListInboxes', self.api_credentials, expired_too=expired_too, shared_too=shared_too)
-        return _get(self.http, url)
-    
-    def list_orders(self, current_page=None, items_per_page=None):
-        """Returns a list of orders for this user"""
-        url = _get_url(self.base_url, 'ListOrders', self.api_credentials, current_page=current_page, items_per_page=items_per_page)
-        return _get(self.http, url)
-    
-    def list_profiles(self):
-        """Read the full profile of the user."""
-        url = _get_url(self.base_url, 'ListProfiles', self.api_credentials)
-        return _get(self.http, url)
-    
-    def list_user_agents(self, max=None):
-        """Returns a list of user-agents the user has used to sent faxes.
+        """),
+        Endpoint('ListOrders', (), ('current_page', 'items_per_page'), paginated=True, doc="""Returns a list of orders for this user"""),
+        Endpoint('ListProfiles', doc="""Read the full profile of the user."""),
+        Endpoint('ListUserAgents', (), ('max',), doc="""Returns a list of user-agents the user has used to sent faxes.
         
         List will be sorted by amount of faxes sent, so it is a top max list.
         
         Keyword arguments:
         max -- How many results (5-20, default 5)
         
-        """
-        url = _get_url(self.base_url, 'ListUserAgents', self.api_credentials, max=max)
-        return _get(self.http, url)
-    
-    def list_wall_messages(self, count=None, data_to_list=None):
-        """Returns a list of activities for the user
+        """),
+        Endpoint('ListWallMessages', (), ('count', 'data_to_list'), doc="""Returns a list of activities for the user
         
         This list contains report about what has been happened lately in users account
         (like messages sent to the user, faxes sent, faxes received, orders placed, ...)
@@ -1199,23 +1916,15 @@ class UserInfo:
         count -- The count of items to return. Valid values are between 1 and 100
         data_to_list -- Any message types you want this function to return. Allowed models are 'faxsent', 'faxin', 'faxout', 'payment', 'message' and 'news'. Leave empty to get messages of any type.
         
-        """
-        url = _get_url(self.base_url, 'ListWallMessages', self.api_credentials, count=count, data_to_list=data_to_list)
-        return _get(self.http, url)
-    
-    def save_user(self, user=None, profile=None):
-        """Saves user profile
+        """),
+        Endpoint('SaveUser', (), ('user', 'profile'), invalidates=('/UserInfo', '/Common'), doc="""Saves user profile
         
         Keyword arguments:
         user -- Users settings as associative array
         profile -- UserProfiles properties as associative array
         
-        """
-        url = _get_url(self.base_url, 'SaveUser', self.api_credentials, user=user, profile=profile)
-        return _get(self.http, url)
-    
-    def send_message(self, body, type=None, recipient=None, subject=None):
-        """Send a message to the user
+        """),
+        Endpoint('SendMessage', ('body',), ('type', 'recipient', 'subject'), doc="""Send a message to the user
         
         Arguments:
         body -- The message body
@@ -1225,22 +1934,14 @@ class UserInfo:
         recipient -- Recipient of the message. Might be an email address, IM username or phone number depending on the message type
         subject -- Optionally a subject. Not used in all message types (likely not used in SMS and chat)
         
-        """
-        url = _get_url(self.base_url, 'SendMessage', self.api_credentials, body=body, type=type, recipient=recipient, subject=subject)
-        return _get(self.http, url)
-    
-    def send_password_reset_message(self, username, user_ip=None):
-        """Send a password reset message to a user
+        """),
+        Endpoint('SendPasswordResetMessage', ('username',), ('user_ip',), doc="""Send a password reset message to a user
         
         Arguments:
         username -- PamFax username to send the message to
         
-        """
-        url = _get_url(self.base_url, 'SendPasswordResetMessage', self.api_credentials, username=username, user_ip=user_ip)
-        return _get(self.http, url)
-    
-    def set_online_storage_settings(self, provider, settings):
-        """Sets users OnlineStorage settings.
+        """),
+        Endpoint('SetOnlineStorageSettings', ('provider', 'settings'), invalidates=('/UserInfo', '/OnlineStorage'), doc="""Sets users OnlineStorage settings.
         
         Expects the settings to be given as key-value pairs.
         Currently supported settings are:
@@ -1251,12 +1952,8 @@ class UserInfo:
         provider -- Provider store settings for (see OnlineStorageApi::ListProviders)
         settings -- Key-value pairs of settings.
         
-        """
-        url = _get_url(self.base_url, 'SetOnlineStorageSettings', self.api_credentials, provider=provider, settings=settings)
-        return _get(self.http, url)
-    
-    def set_password(self, password, hashFunction=None, old_password=None):
-        """Set a new login password for the currently logged in user.
+        """),
+        Endpoint('SetPassword', ('password',), ('hashFunction', 'old_password'), method='POST', doc="""Set a new login password for the currently logged in user.
         
         You may use md5 encrypted passwords by setting the value of hashFunction to 'md5'.
         Note: password values must be lower case when using a hashFunction other than 'plain'!
@@ -1268,12 +1965,8 @@ class UserInfo:
         hashFunction -- The function used to enrycpt the password. Allowed values: plain or md5.
         old_password -- The current password. This is optional for the moment but will be required in future versions. Note that the $hashFunction value applies to this argument too.
         
-        """
-        url = _get_url(self.base_url, 'SetPassword', self.api_credentials, password=password, hashFunction=hashFunction, old_password=old_password)
-        return _get(self.http, url)
-    
-    def set_profile_properties(self, profile, properties, ignoreerrors=None):
-        """Saves values to an extended user profile
+        """),
+        Endpoint('SetProfileProperties', ('profile', 'properties'), ('ignoreerrors',), doc="""Saves values to an extended user profile
         
         Users may have different profiles. Use this method to store values in them.
         Profiles will be created if not present yet.
@@ -1284,18 +1977,13 @@ class UserInfo:
         Keyword arguments:
         ignoreerrors -- If a field can not be found in the profile object, just ignore it. Otherwise returns an error
         
-        """
-        url = _get_url(self.base_url, 'SetProfileProperties', self.api_credentials, profile=profile, properties=properties, ignoreerrors=ignoreerrors)
-        return _get(self.http, url)
-    
-    def validate_new_username(self, username, dictionary=None):
-        """Validate a username for a new user.
+        """),
+        Endpoint('ValidateNewUsername', ('username',), ('dictionary',), doc="""Validate a username for a new user.
         
         Returns a list of suggestions for the username if given username is already in use. Call this prior to UserInfo/CreateUser to show alternative usernames to the user if the entered username is already occupied or invalid.
         
         Arguments:
         username -- Unique username to validate. Call will fail with bad_username error if the username already exists. Min 6 chars, max 60 chars.
         
-        """
-        url = _get_url(self.base_url, 'ValidateNewUsername', self.api_credentials, username=username, dictionary=dictionary)
-        return _get(self.http, url)
+        """),
+    )
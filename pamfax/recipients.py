@@ -0,0 +1,226 @@
+"""
+Streaming loader for adding very large recipient lists to a fax job.
+
+Recipients are read lazily from a CSV file or any iterable, normalized and
+de-duplicated one at a time, optionally validated on several pooled
+connections at once, then handed to FaxJob/AddRecipients in batches, again on
+several connections at once. Only a bounded number of recipients and batches
+is held in memory, plus one integer per distinct number seen so far for
+de-duplication.
+"""
+
+from .faxnumbers import normalize_number
+
+from collections import OrderedDict
+from queue import Queue
+
+import csv
+import logging
+import threading
+
+BATCH_SIZE = 500
+CACHE_SIZE = 100000
+
+logger = logging.getLogger('pamfax')
+
+def read_recipients(source, number_column=0, name_column=None):
+    """Lazily yields (number, name) tuples from a CSV file or an iterable.
+    
+    Arguments:
+    source -- A CSV filename, an open file, or an iterable of numbers or (number, name) sequences
+    
+    Keyword arguments:
+    number_column -- Index of the column holding the fax number
+    name_column -- Index of the column holding the recipient's name, if any
+    
+    """
+    if isinstance(source, str):
+        f = open(source, 'r', newline='')
+        try:
+            for recipient in read_recipients(f, number_column, name_column):
+                yield recipient
+        finally:
+            f.close()
+        return
+    if hasattr(source, 'read'):
+        source = csv.reader(source)
+    for row in source:
+        if isinstance(row, str):
+            yield row, None
+        elif len(row) > number_column:
+            name = None
+            if name_column is not None and len(row) > name_column:
+                name = row[name_column]
+            yield row[number_column], name
+
+class NumberInfoCache:
+    """A cached view of NumberInfo/GetNumberInfo used to validate fax numbers.
+    
+    Only whether PamFax accepted each number is kept, for the size most
+    recently used numbers, so the cache stays bounded however long the
+    recipient list is. Use as the validator of load_recipients.
+    
+    """
+    
+    def __init__(self, pamfax, size=CACHE_SIZE):
+        """Instantiates the NumberInfoCache class
+        
+        Arguments:
+        pamfax -- The PamFax object to look numbers up with
+        
+        Keyword arguments:
+        size -- Maximum number of numbers to remember
+        
+        """
+        self.pamfax = pamfax
+        self.size = size
+        self._valid = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._valid)
+    
+    def __call__(self, faxnumber):
+        """Returns whether PamFax accepts the number as a fax number."""
+        self._lock.acquire()
+        try:
+            valid = self._valid.get(faxnumber)
+            if valid is not None:
+                self._valid.move_to_end(faxnumber)
+                return valid
+        finally:
+            self._lock.release()
+        valid = self.pamfax.get_number_info(faxnumber)['result']['code'] == 'success'
+        self._lock.acquire()
+        try:
+            self._valid[faxnumber] = valid
+            while len(self._valid) > self.size:
+                self._valid.popitem(last=False)
+        finally:
+            self._lock.release()
+        return valid
+
+def load_recipients(pamfax, source, batch_size=BATCH_SIZE, threads=None, validator=None, normalizer=normalize_number, number_column=0, name_column=None):
+    """Streams recipients into the current fax job and returns counts of what happened to them.
+    
+    Numbers are normalized with normalizer and repeated numbers are skipped.
+    If a validator is given, the remaining numbers are checked by threads
+    validating threads at once, so a validator that calls the API uses the
+    pooled connections concurrently, and numbers it rejects are dropped. The
+    rest are added in batches of batch_size, with up to threads batches in
+    flight. The result is a dict with the keys 'added', 'duplicate',
+    'invalid' and 'failed'.
+    
+    Arguments:
+    pamfax -- The PamFax object whose current fax job receives the recipients
+    source -- A CSV filename, an open file, or an iterable (see read_recipients)
+    
+    Keyword arguments:
+    batch_size -- Number of recipients per AddRecipients call
+    threads -- Number of concurrent AddRecipients and validator calls (the PamFax connection pool size by default)
+    validator -- Optional callable(number) returning whether the number should be added, such as a NumberInfoCache
+    normalizer -- Callable(number) returning the number in +<digits> form or None, such as NumberValidator.normalize (see pamfax.faxnumbers)
+    number_column -- Index of the CSV column holding the fax number
+    name_column -- Index of the CSV column holding the recipient's name, if any
+    
+    """
+    if threads is None:
+        threads = pamfax.http.size
+    counts = {'added': 0, 'duplicate': 0, 'invalid': 0, 'failed': 0}
+    lock = threading.Lock()
+    batches = Queue(threads * 2)
+    candidates = Queue(threads * 2)
+    batch = []
+    
+    def count(key, n):
+        lock.acquire()
+        try:
+            counts[key] += n
+        finally:
+            lock.release()
+    
+    def accept(number, name):
+        full = None
+        lock.acquire()
+        try:
+            batch.append((number, name))
+            if len(batch) >= batch_size:
+                full = batch[:]
+                del batch[:]
+        finally:
+            lock.release()
+        if full is not None:
+            batches.put(full)
+    
+    def validate():
+        while True:
+            candidate = candidates.get()
+            if candidate is None:
+                return
+            number, name = candidate
+            try:
+                valid = validator(number)
+            except Exception as e:
+                logger.error("Validating %s failed: %s", number, e)
+                count('failed', 1)
+                continue
+            if valid:
+                accept(number, name)
+            else:
+                count('invalid', 1)
+    
+    def add():
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            numbers = [number for number, name in batch]
+            names = [name or '' for number, name in batch]
+            if not any(names):
+                names = None
+            try:
+                response = pamfax.add_recipients(numbers, names)
+                if response['result']['code'] == 'success':
+                    count('added', len(batch))
+                    continue
+                logger.error("Adding %d recipients failed: %s", len(batch), response['result']['message'])
+            except Exception as e:
+                logger.error("Adding %d recipients failed: %s", len(batch), e)
+            count('failed', len(batch))
+    
+    workers = [threading.Thread(target=add) for i in range(threads)]
+    validators = []
+    if validator is not None:
+        validators = [threading.Thread(target=validate) for i in range(threads)]
+    for worker in workers + validators:
+        worker.start()
+    try:
+        try:
+            seen = set()
+            for number, name in read_recipients(source, number_column, name_column):
+                number = normalizer(number)
+                if number is None:
+                    count('invalid', 1)
+                    continue
+                key = int(number[1:])
+                if key in seen:
+                    count('duplicate', 1)
+                    continue
+                seen.add(key)
+                if validators:
+                    candidates.put((number, name))
+                else:
+                    accept(number, name)
+        finally:
+            for worker in validators:
+                candidates.put(None)
+            for worker in validators:
+                worker.join()
+        if batch:
+            batches.put(batch)
+    finally:
+        for worker in workers:
+            batches.put(None)
+        for worker in workers:
+            worker.join()
+    return counts
@@ -0,0 +1,64 @@
+"""
+Helpers for reading the responses of the PamFax API.
+
+Every JSON response has a 'result' dict whose 'code' is 'success' if the
+action succeeded, and otherwise a 'message' saying why it did not. List
+actions return their items as the 'content' of a dict under another top
+level key, such as 'InboxFaxes', a page at a time.
+"""
+
+ITEMS_PER_PAGE = 100
+
+def check(response):
+    """Raises an exception carrying the API message if response is not a success. Returns response otherwise."""
+    if response['result']['code'] != 'success':
+        raise Exception(response['result']['message'])
+    return response
+
+def field(item, names):
+    """Returns the value of the first of the given keys that is set in item, or None.
+    
+    The API names some fields differently in different responses, e.g.
+    'state' or 'status', so callers pass every name a field is known by.
+    
+    """
+    for name in names:
+        if item.get(name) not in (None, ''):
+            return item[name]
+    return None
+
+def container(response):
+    """Returns the dict of a single item response, such as the FaxContainer of GetFaxDetails, whatever its top level key is, or an empty dict."""
+    for key, value in response.items():
+        if key != 'result' and isinstance(value, dict):
+            return value
+    return {}
+
+def content(response):
+    """Returns the list of items of a successful list response, whatever its top level key is. Raises an exception carrying the API message otherwise."""
+    for key, value in check(response).items():
+        if key != 'result' and isinstance(value, dict) and 'content' in value:
+            return value['content'] or []
+    return []
+
+def pages(list_method, items_per_page=ITEMS_PER_PAGE, current_page=1, **kwargs):
+    """Yields the list of items on each page of a paginated list action, until a page is not full.
+    
+    Stop iterating to stop fetching pages.
+    
+    Arguments:
+    list_method -- Callable taking current_page and items_per_page keyword arguments, such as PamFax.list_inbox_faxes
+    
+    Keyword arguments:
+    items_per_page -- Number of items to fetch per call
+    current_page -- The first page to fetch
+    
+    Any other keyword arguments are passed to list_method on every call.
+    
+    """
+    while True:
+        items = content(list_method(current_page=current_page, items_per_page=items_per_page, **kwargs))
+        yield items
+        if len(items) < items_per_page:
+            return
+        current_page += 1
@@ -0,0 +1,285 @@
+"""
+Scheduling of delivery status checks for many sent faxes.
+
+Polling FaxHistory/GetFaxDetails for every fax on a fixed interval costs one
+call per fax per interval, mostly for faxes that cannot be done yet.
+StatusScheduler keeps the faxes it tracks in a priority queue ordered by the
+time of their next check. The first check is scheduled for when the fax can
+be expected to be converted and transmitted, based on its page and recipient
+counts, and later checks back off. When many checks are due at once, they
+are settled by a StatusReconciler, which lists the outbox and the sent faxes
+a page at a time, and only the faxes those lists do not account for are
+checked one by one. A StatusReconciler can also be used on its own, to
+resolve all faxes in flight once per cycle.
+"""
+
+from .futures import run_async
+from .responses import ITEMS_PER_PAGE, container, field, pages
+
+import heapq
+import logging
+import threading
+import time
+
+CONVERSION_SECONDS = 30
+SECONDS_PER_PAGE = 60
+MIN_INTERVAL = 15
+MAX_INTERVAL = 600
+BACKOFF = 1.5
+BATCH_THRESHOLD = 10
+MAX_SENT_PAGES = 10
+DONE_STATES = ('success', 'failure', 'partial_success', 'not_enough_credit')
+
+logger = logging.getLogger('pamfax')
+
+class StatusReconciler:
+    """Resolves the states of many faxes from the outbox and sent fax lists instead of one call per fax.
+    
+    Each reconcile pages through FaxHistory/ListOutboxFaxes and, until every
+    tracked fax not in the outbox has been found, FaxHistory/ListSentFaxes,
+    and indexes the faxes by uuid. A fax in the sent list is done. Only faxes
+    found in neither list (stragglers) are looked up with GetFaxDetails.
+    
+    """
+    
+    def __init__(self, pamfax, done_states=DONE_STATES, threads=None, max_sent_pages=MAX_SENT_PAGES):
+        """Instantiates the StatusReconciler class
+        
+        Arguments:
+        pamfax -- The PamFax object to list and look up faxes with
+        
+        Keyword arguments:
+        done_states -- The fax states in which a straggler is done
+        threads -- Number of straggler lookups to run at once (the PamFax connection pool size by default)
+        max_sent_pages -- Maximum number of pages of sent faxes to list per reconcile
+        
+        """
+        self.pamfax = pamfax
+        self.done_states = done_states
+        self.threads = threads or pamfax.http.size
+        self.max_sent_pages = max_sent_pages
+        self.stats = {'calls': 0}
+        self.tracked = set()
+        self._lock = threading.Lock()
+    
+    def _count(self):
+        """Counts an API call."""
+        self._lock.acquire()
+        try:
+            self.stats['calls'] += 1
+        finally:
+            self._lock.release()
+    
+    def snapshot(self, uuids):
+        """Lists the faxes in flight and as many sent ones as needed to find uuids.
+        
+        Returns a tuple of the set of uuids in the outbox and a dict of sent faxes by uuid.
+        
+        """
+        outbox = set()
+        for faxes in pages(self.pamfax.list_outbox_faxes, ITEMS_PER_PAGE):
+            self._count()
+            outbox.update(fax.get('uuid') for fax in faxes)
+        missing = set(uuids) - outbox
+        sent = {}
+        if not missing:
+            return outbox, sent
+        for page, faxes in enumerate(pages(self.pamfax.list_sent_faxes, ITEMS_PER_PAGE), 1):
+            self._count()
+            for fax in faxes:
+                sent[fax.get('uuid')] = fax
+                missing.discard(fax.get('uuid'))
+            if not missing or page >= self.max_sent_pages:
+                break
+        return outbox, sent
+    
+    def details(self, uuids):
+        """Looks faxes up one by one, several at a time. Returns a dict of fax dicts by uuid for the ones that are done."""
+        done = {}
+        for i in range(0, len(uuids), self.threads):
+            futures = [(uuid, run_async(self.pamfax.get_fax_details, uuid)) for uuid in uuids[i:i + self.threads]]
+            for uuid, future in futures:
+                self._count()
+                try:
+                    fax = container(future.result())
+                except Exception as e:
+                    logger.warning("Checking fax %s failed: %s", uuid, e)
+                    continue
+                if field(fax, ('state', 'status')) in self.done_states:
+                    done[uuid] = fax
+        return done
+    
+    def resolve(self, uuids):
+        """Returns a dict of fax dicts by uuid for those of uuids that are done."""
+        outbox, sent = self.snapshot(uuids)
+        done = {}
+        stragglers = []
+        for uuid in uuids:
+            if uuid in sent:
+                done[uuid] = sent[uuid]
+            elif uuid not in outbox:
+                stragglers.append(uuid)
+        if stragglers:
+            logger.debug("Looking up %d faxes missing from the fax lists", len(stragglers))
+            done.update(self.details(stragglers))
+        return done
+    
+    def track(self, uuid):
+        """Adds a fax to the ones resolved by reconcile."""
+        self.tracked.add(uuid)
+    
+    def reconcile(self):
+        """Resolves all tracked faxes, stops tracking the ones that are done and returns those as a dict by uuid."""
+        done = self.resolve(list(self.tracked))
+        self.tracked.difference_update(done)
+        return done
+
+class StatusScheduler:
+    """Tracks sent faxes until they are done and calls back with their final details.
+    
+    Callbacks are called as callback(uuid, fax), where fax is the dict PamFax
+    returned for the fax, on the thread that runs the scheduler.
+    
+    """
+    
+    def __init__(self, pamfax, callback=None, batch_threshold=BATCH_THRESHOLD, done_states=DONE_STATES, threads=None):
+        """Instantiates the StatusScheduler class
+        
+        Arguments:
+        pamfax -- The PamFax object to check fax states with
+        
+        Keyword arguments:
+        callback -- Callable(uuid, fax) invoked for every tracked fax that is done
+        batch_threshold -- Number of checks due at once from which list calls are used instead of per-fax calls
+        done_states -- The fax states in which a fax is done
+        threads -- Number of per-fax checks to run at once (the PamFax connection pool size by default)
+        
+        """
+        self.pamfax = pamfax
+        self.callback = callback
+        self.batch_threshold = batch_threshold
+        self.reconciler = StatusReconciler(pamfax, done_states, threads)
+        self.stats = self.reconciler.stats
+        self.stats['done'] = 0
+        self._queue = []
+        self._entries = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def track(self, uuid, pages=1, recipients=1, sent_at=None, callback=None):
+        """Starts tracking a sent fax.
+        
+        Arguments:
+        uuid -- The uuid of the fax
+        
+        Keyword arguments:
+        pages -- Number of pages of the fax, used to estimate its transmission time
+        recipients -- Number of recipients, used to estimate its transmission time
+        sent_at -- Time the fax was sent, as returned by time.time() (now by default)
+        callback -- Optional callable(uuid, fax) to call instead of the scheduler's callback
+        
+        """
+        expected = CONVERSION_SECONDS + SECONDS_PER_PAGE * pages * recipients
+        entry = {'uuid': uuid, 'callback': callback, 'interval': max(MIN_INTERVAL, min(expected / 2, MAX_INTERVAL))}
+        self._lock.acquire()
+        try:
+            self._entries[uuid] = entry
+            self._push(uuid, (sent_at or time.time()) + expected)
+        finally:
+            self._lock.release()
+    
+    def untrack(self, uuid):
+        """Stops tracking a fax."""
+        self._lock.acquire()
+        try:
+            self._entries.pop(uuid, None)
+        finally:
+            self._lock.release()
+    
+    def _push(self, uuid, at):
+        """Schedules the next check of a fax. Must be called with the lock held."""
+        self._sequence += 1
+        heapq.heappush(self._queue, (at, self._sequence, uuid))
+    
+    def _due(self, now):
+        """Removes and returns the uuids of the tracked faxes whose check is due."""
+        due = []
+        self._lock.acquire()
+        try:
+            while self._queue and self._queue[0][0] <= now:
+                uuid = heapq.heappop(self._queue)[2]
+                if uuid in self._entries and uuid not in due:
+                    due.append(uuid)
+        finally:
+            self._lock.release()
+        return due
+    
+    def next_check(self):
+        """Returns the time of the next scheduled check, or None if no fax is tracked."""
+        self._lock.acquire()
+        try:
+            while self._queue and self._queue[0][2] not in self._entries:
+                heapq.heappop(self._queue)
+            return self._queue and self._queue[0][0] or None
+        finally:
+            self._lock.release()
+    
+    def check(self, now=None):
+        """Runs the checks that are due, calls back for the faxes that are done and reschedules the others.
+        
+        Returns the number of tracked faxes found to be done. If the checks
+        fail, every due fax is rescheduled with a longer interval, as if it
+        was not done yet.
+        
+        """
+        now = now or time.time()
+        due = self._due(now)
+        if not due:
+            return 0
+        try:
+            if len(due) >= self.batch_threshold:
+                done = self.reconciler.resolve(due)
+            else:
+                done = self.reconciler.details(due)
+        except Exception as e:
+            logger.warning("Checking %d faxes failed: %s", len(due), e)
+            done = {}
+        finished = []
+        self._lock.acquire()
+        try:
+            for uuid in due:
+                entry = self._entries.get(uuid)
+                if entry is None:
+                    continue
+                if uuid in done:
+                    del self._entries[uuid]
+                    finished.append((uuid, entry['callback'] or self.callback))
+                else:
+                    entry['interval'] = min(entry['interval'] * BACKOFF, MAX_INTERVAL)
+                    self._push(uuid, now + entry['interval'])
+        finally:
+            self._lock.release()
+        for uuid, callback in finished:
+            self.stats['done'] += 1
+            if callback is not None:
+                try:
+                    callback(uuid, done[uuid])
+                except Exception as e:
+                    logger.error("Status callback for fax %s failed: %s", uuid, e)
+        return len(finished)
+    
+    def run(self, stop=None):
+        """Checks faxes as their checks come due until none are tracked or the threading.Event stop is set."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            at = self.next_check()
+            if at is None:
+                return
+            if at > time.time():
+                # wake up regularly in case faxes are tracked from other threads meanwhile
+                stop.wait(min(at - time.time(), MIN_INTERVAL))
+                continue
+            self.check()
@@ -0,0 +1,89 @@
+"""
+Fax templates for sending the same fax to different recipients over and over.
+
+Building a fax from scratch takes a round trip for every step (create, set the
+cover, add each file, set the notifications, ...). A FaxTemplate instead
+clones an already sent fax that was configured once, so each send only needs
+to replace the recipients and start sending. Clones are prepared in the
+background right after each send, so the next send finds one waiting.
+"""
+
+from queue import Queue
+
+from .responses import check
+
+import logging
+import threading
+
+logger = logging.getLogger('pamfax')
+
+class FaxTemplate:
+    """A sent fax used as a template for new faxes to other recipients.
+    
+    PamFax keeps one fax job in edit mode per session, so each client passed in
+    holds at most one prepared clone at a time. Pass several PamFax objects
+    (each logged in separately) to keep several clones warm and send from
+    several threads at once. The clients should not be used to build other
+    faxes while the template owns them.
+    
+    """
+    
+    def __init__(self, uuid, clients, warm=True):
+        """Instantiates the FaxTemplate class
+        
+        Arguments:
+        uuid -- The uuid of a sent fax with the files, cover and notification settings to reuse
+        clients -- A PamFax object, or a sequence of them, to clone and send faxes with
+        
+        Keyword arguments:
+        warm -- If true, starts cloning the template for every client in the background right away
+        
+        """
+        if not isinstance(clients, (list, tuple)):
+            clients = [clients]
+        self.uuid = uuid
+        self._idle = Queue()
+        for client in clients:
+            if warm:
+                self._warm_in_background(client)
+            else:
+                self._idle.put((client, False))
+    
+    def _warm(self, client):
+        """Clones the template into client's session and marks the client as idle."""
+        warm = False
+        try:
+            check(client.clone_fax(self.uuid))
+            warm = True
+        except Exception as e:
+            logger.warning("Could not prepare a clone of fax %s: %s", self.uuid, e)
+        self._idle.put((client, warm))
+    
+    def _warm_in_background(self, client):
+        """Starts cloning the template into client's session on a background thread."""
+        thread = threading.Thread(target=self._warm, args=(client,))
+        thread.daemon = True
+        thread.start()
+    
+    def send(self, numbers, names=None, send_at=None):
+        """Sends a copy of the template to the given recipients and returns the Send response.
+        
+        Blocks until a client is idle. If that client already holds a clone, this takes
+        two round trips: SetRecipients and Send.
+        
+        Arguments:
+        numbers -- Fax numbers of the recipients
+        
+        Keyword arguments:
+        names -- Names of the recipients, in the same order as numbers
+        send_at -- Optional time to send the fax at (see FaxJob.send)
+        
+        """
+        client, warm = self._idle.get()
+        try:
+            if not warm:
+                check(client.clone_fax(self.uuid))
+            check(client.set_recipients(numbers, names))
+            return check(client.send(send_at))
+        finally:
+            self._warm_in_background(client)
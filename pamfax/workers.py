@@ -0,0 +1,259 @@
+"""
+A multi-process runner for sending the faxes of an Outbox.
+
+A single process is limited to one core for the CPU-bound parts of sending
+faxes (preprocessing documents, encoding uploads, decoding responses).
+WorkerRunner starts several worker processes that each open their own PamFax
+session and connection pool and send jobs from a shared Outbox (see
+pamfax.outbox) until they are told to stop. Each worker's session token is
+kept in a TokenCache, so a restarted worker reuses its session instead of
+verifying the user again. PamFax ends sessions that are idle for a few
+minutes, so idle workers ping theirs, and a worker logs in again when its
+session turns out to be gone. Results are reported back to the parent process.
+"""
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .outbox import SENT, Outbox
+from .processors import jsonlib
+
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+IDLE_INTERVAL = 1
+KEEPALIVE_INTERVAL = 240
+ERROR = 'error'
+
+logger = logging.getLogger('pamfax')
+
+class TokenCache:
+    """A JSON file of PamFax session tokens, shared by processes on the same host.
+    
+    Writes are serialized with a lock file where fcntl is available.
+    
+    """
+    
+    def __init__(self, filename):
+        """Instantiates the TokenCache class
+        
+        Arguments:
+        filename -- The JSON file to keep the tokens in
+        
+        """
+        self.filename = filename
+    
+    def _read(self):
+        """Returns the dict of cached tokens."""
+        if not os.path.exists(self.filename):
+            return {}
+        f = open(self.filename, 'rb')
+        try:
+            return jsonlib.loads(f.read() or '{}')
+        finally:
+            f.close()
+    
+    def get(self, key):
+        """Returns the token cached under key, or None."""
+        return self._read().get(key)
+    
+    def set(self, key, token):
+        """Caches a token under key, or removes the entry if token is None."""
+        lock = open(self.filename + '.lock', 'a')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            tokens = self._read()
+            if token is None:
+                tokens.pop(key, None)
+            else:
+                tokens[key] = token
+            temp = '%s.%d.tmp' % (self.filename, os.getpid())
+            f = open(temp, 'w')
+            try:
+                f.write(jsonlib.dumps(tokens))
+            finally:
+                f.close()
+            os.replace(temp, self.filename)
+        finally:
+            lock.close()
+
+def _session(pamfax_class, pamfax_kwargs, tokens, key):
+    """Returns a PamFax object for a worker, reusing its cached session token if it is still valid."""
+    token = tokens and tokens.get(key)
+    if token is not None:
+        pamfax = pamfax_class(usertoken=token, **pamfax_kwargs)
+        if pamfax.ping()['result']['code'] == 'success':
+            return pamfax
+        logger.info("Cached session of %s has expired", key)
+    pamfax = pamfax_class(**pamfax_kwargs)
+    if tokens is not None:
+        tokens.set(key, pamfax.usertoken)
+    return pamfax
+
+def _alive(pamfax):
+    """Returns whether the session of a PamFax object is still valid."""
+    try:
+        return pamfax.ping()['result']['code'] == 'success'
+    except Exception as e:
+        # a network error says nothing about the session
+        logger.warning("Could not ping PamFax: %s", e)
+        return True
+
+def _work(outbox_filename, pamfax_class, pamfax_kwargs, token_filename, slot, stop, results, idle_interval, keepalive_interval):
+    """The main loop of a worker process: sends outbox jobs until stop is set, reporting each to results.
+    
+    If the worker can not go on, e.g. because its session can not be set up,
+    the error is reported as a result with the state ERROR and no id. The
+    None that tells the parent the worker has exited is always sent last.
+    
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker = '%s#%d' % (pamfax_kwargs.get('username'), slot)
+    outbox = None
+    try:
+        tokens = token_filename and TokenCache(token_filename)
+        outbox = Outbox(outbox_filename)
+        pamfax = _session(pamfax_class, pamfax_kwargs, tokens, worker)
+        alive_at = time.time()
+        suspect = False
+        while not stop.is_set():
+            if suspect or time.time() - alive_at >= keepalive_interval:
+                if not _alive(pamfax):
+                    logger.info("Session of %s has expired, logging in again", worker)
+                    if tokens:
+                        tokens.set(worker, None)
+                    pamfax = _session(pamfax_class, pamfax_kwargs, tokens, worker)
+                alive_at = time.time()
+                suspect = False
+            job_id = outbox.process(pamfax, '%s:%d' % (worker, os.getpid()))
+            if job_id is None:
+                stop.wait(idle_interval)
+                continue
+            alive_at = time.time()
+            job = outbox.get(job_id)
+            # a failed attempt may have failed because the session is gone
+            suspect = job['state'] != SENT
+            results.put({'id': job_id, 'state': job['state'], 'error': job['error'], 'worker': worker})
+    except Exception as e:
+        logger.error("Worker %s stopped: %s", worker, e)
+        results.put({'id': None, 'state': ERROR, 'error': str(e), 'worker': worker})
+    finally:
+        if outbox is not None:
+            outbox.close()
+        results.put(None)
+
+class WorkerRunner:
+    """Runs a number of processes that send the faxes of an Outbox.
+    
+    For example:
+    
+    runner = WorkerRunner('outbox.db', {'username': ..., 'password': ..., 'apikey': ..., 'apisecret': ...})
+    runner.start()
+    ...
+    runner.stop()
+    
+    """
+    
+    def __init__(self, outbox_filename, pamfax_kwargs, processes=None, token_cache=None, callback=None, idle_interval=IDLE_INTERVAL, pamfax_class=None, keepalive_interval=KEEPALIVE_INTERVAL):
+        """Instantiates the WorkerRunner class
+        
+        Arguments:
+        outbox_filename -- The SQLite database file of the Outbox to send from
+        pamfax_kwargs -- Dict of keyword arguments to create each worker's PamFax object with
+        
+        Keyword arguments:
+        processes -- Number of worker processes (one per CPU by default)
+        token_cache -- Optional filename of a TokenCache to reuse worker sessions across restarts
+        callback -- Optional callable(result) invoked in the parent for each job a worker finishes an attempt on, and for each worker that stops on an error
+        idle_interval -- Seconds a worker waits before looking for jobs again when the outbox is empty
+        pamfax_class -- The class to create sessions with (pamfax.PamFax by default)
+        keepalive_interval -- Seconds of inactivity after which a worker checks that its session is still valid
+        
+        """
+        if pamfax_class is None:
+            from pamfax import PamFax as pamfax_class
+        self.outbox_filename = outbox_filename
+        self.pamfax_kwargs = pamfax_kwargs
+        self.processes = processes or multiprocessing.cpu_count()
+        self.token_cache = token_cache
+        self.callback = callback
+        self.idle_interval = idle_interval
+        self.pamfax_class = pamfax_class
+        self.keepalive_interval = keepalive_interval
+        self.counts = {}
+        self._stop = multiprocessing.Event()
+        self._results = multiprocessing.Queue()
+        self._workers = []
+        self._collector = None
+    
+    def _collect(self):
+        """Receives results from the workers until all of them have exited."""
+        running = len(self._workers)
+        while running:
+            result = self._results.get()
+            if result is None:
+                running -= 1
+                continue
+            self.counts[result['state']] = self.counts.get(result['state'], 0) + 1
+            if self.callback is not None:
+                try:
+                    self.callback(result)
+                except Exception as e:
+                    logger.error("Worker result callback failed: %s", e)
+    
+    def start(self):
+        """Starts the worker processes."""
+        Outbox(self.outbox_filename).close()
+        for slot in range(self.processes):
+            process = multiprocessing.Process(target=_work, args=(self.outbox_filename, self.pamfax_class, self.pamfax_kwargs,
+                                                                  self.token_cache, slot, self._stop, self._results, self.idle_interval,
+                                                                  self.keepalive_interval))
+            process.daemon = True
+            process.start()
+            self._workers.append(process)
+        self._collector = threading.Thread(target=self._collect)
+        self._collector.daemon = True
+        self._collector.start()
+    
+    def stop(self, timeout=None):
+        """Lets every worker finish its current job, then waits up to timeout seconds for them to exit.
+        
+        Workers still running after the timeout are terminated; their jobs are
+        picked up again once their leases expire.
+        
+        """
+        self._stop.set()
+        for process in self._workers:
+            process.join(timeout)
+        for process in self._workers:
+            if process.is_alive():
+                logger.warning("Terminating worker process %d", process.pid)
+                process.terminate()
+                self._results.put(None)
+        self._collector.join()
+        self._workers = []
+    
+    def run(self):
+        """Starts the workers and sends jobs until SIGINT or SIGTERM is received, then drains gracefully."""
+        stopping = threading.Event()
+        
+        def handler(signum, frame):
+            stopping.set()
+        
+        previous = signal.signal(signal.SIGTERM, handler), signal.signal(signal.SIGINT, handler)
+        try:
+            self.start()
+            while not stopping.is_set():
+                stopping.wait(self.idle_interval)
+            logger.info("Draining %d worker processes", len(self._workers))
+            self.stop()
+        finally:
+            signal.signal(signal.SIGTERM, previous[0])
+            signal.signal(signal.SIGINT, previous[1])
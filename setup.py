@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 
-from distutils.core import setup
+try:
+    from setuptools import setup
+except ImportError:
+    from distutils.core import setup
 
 setup(
     name              = "dynaptico-pamfax",
-    version           = "1.0.5",
+    version           = "2.0.0",
     url               = "http://github.com/dynaptico/pamfaxp",
     author            = "Jonathan Sweemer",
     author_email      = "sweemer@gmail.com",
@@ -15,11 +18,14 @@ setup(
     platforms         = ["Platform Independent"],
     license           = "MIT",
     packages          = ['pamfax', 'pamfax.processors'],
+    python_requires   = '>=3.7',
     classifiers       = [
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
-        "Programming Language :: Python"
+        "Programming Language :: Python",
+        "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only"
     ],
 )
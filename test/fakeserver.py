@@ -0,0 +1,105 @@
+"""
+A fake PamFax API server for the offline tests.
+
+FakeServer answers every action over HTTPS on a local port with a success
+response, or with whatever the handler registered for the action's path
+returns, and records each request it receives.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import json
+import os
+import ssl
+import threading
+
+CERTIFICATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'localhost.pem')
+
+def client_context():
+    """Returns an ssl.SSLContext that accepts the self-signed certificate of the fake server."""
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+def json_response(data):
+    """Returns a handler result for a JSON body."""
+    return 200, 'application/json', json.dumps(data).encode('utf-8'), {}
+
+def success(**fields):
+    """Returns a handler result for a successful response with the given fields."""
+    return json_response(dict(fields, result={'code': 'success', 'message': ''}))
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def _handle(self, method):
+        length = int(self.headers.get('content-length') or 0)
+        body = length and self.rfile.read(length) or b''
+        url = urlparse(self.path)
+        params = dict(parse_qsl(url.query))
+        if method == 'POST' and (self.headers.get('content-type') or '').startswith('application/x-www-form-urlencoded'):
+            params.update(parse_qsl(body.decode('utf-8')))
+        request = {'method': method, 'path': url.path, 'params': params, 'body': body, 'headers': dict((k.lower(), v) for k, v in self.headers.items())}
+        server = self.server
+        server.requests.append(request)
+        handler = server.handlers.get(url.path)
+        if handler is not None:
+            status, content_type, data, headers = handler(request)
+        elif url.path == '/Session/VerifyUser':
+            status, content_type, data, headers = success(UserToken={'token': 'token'})
+        else:
+            status, content_type, data, headers = success()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        if 'Content-Length' not in headers:
+            self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def do_GET(self):
+        self._handle('GET')
+    
+    def do_POST(self):
+        self._handle('POST')
+    
+    def log_message(self, format, *args):
+        pass
+
+class FakeServer:
+    """A fake PamFax API host on a local port.
+    
+    handlers maps action paths such as '/FaxJob/GetFaxState' to callables
+    taking the request dict and returning a (status, content_type, body,
+    headers) tuple. requests lists the request dicts received so far.
+    
+    """
+    
+    def __init__(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.handlers = self.handlers = {}
+        self._server.requests = self.requests = []
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(CERTIFICATE)
+        self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+        self.host = '127.0.0.1:%d' % self._server.server_address[1]
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+    
+    def paths(self):
+        """Returns the paths of the requests received so far, in order."""
+        return [request['path'] for request in self.requests]
+    
+    def pamfax(self, **kwargs):
+        """Returns a PamFax object logged in to this server."""
+        from pamfax import PamFax
+        return PamFax('username', 'password', host=self.host, context=client_context(), **kwargs)
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
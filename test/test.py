@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 from pamfax import PamFax
+from pamfax.cache import UploadCache
 
 import logging
 import socket
@@ -286,6 +287,58 @@ class TestPamFax(unittest.TestCase):
         #response = pamfax.clone_fax(faxjob['FaxContainer']['uuid'])
         #_assert_json(message, response)
     
+    def test_add_files(self):
+        message = 'Creating a fax job'
+        response = pamfax.create()
+        _assert_json(message, response)
+        
+        message = 'Adding local files concurrently'
+        progress = {}
+        def on_progress(filename, sent, total):
+            progress[filename] = (sent, total)
+        responses = pamfax.add_files(['Dynaptico.pdf', 'Dynaptico.pdf', 'Dynaptico.pdf'], progress=on_progress)
+        for response in responses:
+            _assert_json(message, response)
+        sent, total = progress['Dynaptico.pdf']
+        assert sent == total
+        assert not pamfax.is_converting(pamfax.get_fax_state())
+        
+        message = 'Removing all files'
+        response = pamfax.remove_all_files()
+        _assert_json(message, response)
+    
+    def test_add_file_cached(self):
+        message = 'Creating a fax job'
+        response = pamfax.create()
+        _assert_json(message, response)
+        
+        message = 'Adding a file that is not cached'
+        cache = UploadCache()
+        response = pamfax.add_file_cached('Dynaptico.pdf', cache)
+        _assert_json(message, response)
+        assert cache.lookup('Dynaptico.pdf') is None
+        
+        message = 'Creating a fax job with files'
+        response = pamfax.create_with_files(['Dynaptico.pdf'], cache)
+        _assert_json(message, response)
+        assert cache.lookup_fax(['Dynaptico.pdf']) == response['FaxContainer']['uuid']
+        
+        message = 'Removing all files'
+        response = pamfax.remove_all_files()
+        _assert_json(message, response)
+    
+    def test_endpoints(self):
+        message = 'Listing countries twice'
+        hits = pamfax.http.stats['cache_hits']
+        _assert_json(message, pamfax.list_countries())
+        _assert_json(message, pamfax.list_countries())
+        assert pamfax.http.stats['cache_hits'] > hits
+        
+        message = 'Listing all inbox faxes'
+        faxes = list(pamfax.iter_list_inbox_faxes(items_per_page=1))
+        logger.debug(message)
+        assert uuid in [fax['uuid'] for fax in faxes]
+    
     def test_NumberInfo(self):
         message = 'Getting number info'
         response = pamfax.get_number_info('+81362763902')
@@ -0,0 +1,784 @@
+#!/usr/bin/env python
+
+"""
+Tests that run without a PamFax account or network access.
+
+Run them from this directory with:
+
+     python -m unittest test_offline
+"""
+
+from http.client import HTTPConnection, HTTPException
+from urllib.parse import urlparse
+
+import gzip
+import io
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import unittest
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fakeserver import FakeServer, client_context, json_response, success
+from pamfax import preprocess
+from pamfax import processors
+from pamfax.archive import InboxArchiver
+from pamfax.builder import FaxBuilder
+from pamfax.cache import UploadCache
+from pamfax.faxnumbers import NumberValidator
+from pamfax.futures import run_async
+from pamfax.notifications import NotificationReceiver
+from pamfax.outbox import FAILED, SENDING, SENT, Outbox
+from pamfax.previews import PreviewCache
+from pamfax.scheduler import StatusReconciler, StatusScheduler
+from pamfax.templates import FaxTemplate
+from pamfax.workers import ERROR, TokenCache, WorkerRunner
+from pamfax.pricing import CostEstimator
+from pamfax.recipients import NumberInfoCache, load_recipients
+
+class TestPreprocess(unittest.TestCase):
+    """Tests for pamfax.preprocess"""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pamfax-test-')
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+    
+    def _write(self, name, data):
+        filename = os.path.join(self.directory, name)
+        f = open(filename, 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        return filename
+    
+    def test_passes_documents_through(self):
+        filename = self._write('fax.pdf', b'%PDF-1.4')
+        assert preprocess.optimize_file(filename, self.directory) == filename
+    
+    def test_reuses_worker_pool(self):
+        filenames = [self._write('a.pdf', b'a'), self._write('b.pdf', b'b'), self._write('c.pdf', b'a')]
+        # identical content is only processed once
+        assert preprocess.optimize_files(filenames, self.directory, processes=2) == [filenames[0], filenames[1], filenames[0]]
+        pool = preprocess._pools[2]
+        assert pool._ctx.get_start_method() == 'spawn'
+        preprocess.optimize_files(filenames, self.directory, processes=2)
+        assert preprocess._pools[2] is pool
+        preprocess.close_pools()
+        assert not preprocess._pools
+    
+    @unittest.skipIf(preprocess.Image is None, "requires PIL")
+    def test_shrinks_images(self):
+        filename = os.path.join(self.directory, 'scan.png')
+        preprocess.Image.new('RGB', (3000, 2000), (200, 120, 40)).save(filename)
+        optimized = preprocess.optimize_file(filename, self.directory)
+        assert optimized != filename
+        with preprocess.Image.open(optimized) as image:
+            assert image.size[0] == preprocess.FAX_WIDTH
+            assert image.mode == '1'
+
+class TestUploadCache(unittest.TestCase):
+    """Tests for pamfax.cache with PamFax"""
+    
+    def setUp(self):
+        self.server = FakeServer()
+        self.server.handlers['/FaxJob/Create'] = lambda request: success(FaxContainer={'uuid': 'fax1'})
+        self.server.handlers['/FaxJob/GetFaxState'] = lambda request: success(Files={'content': [{'state': 'success'}]})
+        self.pamfax = self.server.pamfax()
+        self.filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Dynaptico.pdf')
+    
+    def tearDown(self):
+        self.server.stop()
+    
+    def test_adds_registered_reference(self):
+        cache = UploadCache()
+        cache.register_remote_file(self.filename, 'https://example.com/Dynaptico.pdf')
+        self.pamfax.add_file_cached(self.filename, cache)
+        assert self.server.paths()[-1] == '/FaxJob/AddRemoteFile'
+        assert '/FaxJob/AddFile' not in self.server.paths()
+    
+    def test_clones_recorded_fax(self):
+        cache = UploadCache()
+        self.pamfax.create_with_files([self.filename], cache)
+        assert self.server.paths().count('/FaxJob/AddFile') == 1
+        assert cache.lookup_fax([self.filename]) == 'fax1'
+        self.pamfax.create_with_files([self.filename], cache)
+        assert self.server.paths().count('/FaxJob/AddFile') == 1
+        assert '/FaxJob/CloneFax' in self.server.paths()
+    
+    def test_clears_edited_fax_and_records_complete_faxes_only(self):
+        cache = UploadCache()
+        self.server.handlers['/FaxJob/AddFile'] = lambda request: json_response({'result': {'code': 'error', 'message': 'upload failed'}})
+        self.pamfax.create_with_files([self.filename], cache)
+        paths = self.server.paths()
+        assert paths.index('/FaxJob/Create') < paths.index('/FaxJob/RemoveAllFiles') < paths.index('/FaxJob/AddFile')
+        assert '/FaxJob/RemoveAllRecipients' in paths
+        assert cache.lookup_fax([self.filename]) is None
+    
+    def test_saves_over_existing_file(self):
+        directory = tempfile.mkdtemp(prefix='pamfax-test-')
+        try:
+            filename = os.path.join(directory, 'cache.json')
+            cache = UploadCache(filename)
+            cache.register_remote_file(self.filename, 'https://example.com/1.pdf')
+            cache.register_remote_file(self.filename, 'https://example.com/2.pdf')
+            assert UploadCache(filename).lookup(self.filename) == ('remote', 'https://example.com/2.pdf')
+        finally:
+            shutil.rmtree(directory, True)
+
+class TestTransport(unittest.TestCase):
+    """Tests for the connection pool and requests of pamfax.processors"""
+    
+    def setUp(self):
+        self.server = FakeServer()
+        self.pamfax = self.server.pamfax()
+    
+    def tearDown(self):
+        self.server.stop()
+    
+    def test_decodes_compressed_responses(self):
+        data = json.dumps({'result': {'code': 'success', 'message': ''}, 'Zones': {'content': [{'zone': 1}] * 100}}).encode('utf-8')
+        deflate = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+        bodies = {'gzip': gzip.compress(data), 'deflate': deflate.compress(data) + deflate.flush()}
+        for encoding, body in bodies.items():
+            self.server.handlers['/Common/ListZones'] = lambda request, body=body, encoding=encoding: (200, 'application/json', body, {'Content-Encoding': encoding})
+            received = self.pamfax.http.stats['bytes_received']
+            self.pamfax.http.invalidate()
+            response = self.pamfax.list_zones()
+            assert len(response['Zones']['content']) == 100
+            assert self.pamfax.http.stats['bytes_received'] - received == len(body)
+        assert self.server.requests[-1]['headers']['accept-encoding'] == 'gzip, deflate'
+    
+    def test_posts_long_parameter_lists(self):
+        numbers = ['+4930%07d' % i for i in range(2000)]
+        self.pamfax.set_recipients(numbers)
+        request = self.server.requests[-1]
+        assert (request['method'], request['path']) == ('POST', '/FaxJob/SetRecipients')
+        assert request['headers']['content-type'] == 'application/x-www-form-urlencoded'
+        assert request['params']['numbers[1999]'] == numbers[-1]
+        self.pamfax.set_recipients(numbers[:1])
+        request = self.server.requests[-1]
+        assert request['method'] == 'GET'
+        assert request['params']['numbers[0]'] == numbers[0]
+    
+    def test_warms_connections_and_resumes_sessions(self):
+        pamfax = self.server.pamfax(connections=3, warm=True)
+        assert pamfax.http.stats['connections'] == 3
+        pamfax.ping()
+        assert pamfax.http.stats['connections'] == 3
+        pamfax = self.server.pamfax(connections=2)
+        pamfax.http.warm()
+        assert pamfax.http.stats['connections'] == 2
+        if processors.TLS_SESSIONS:
+            assert pamfax.http.stats['tls_sessions_resumed'] == 1
+    
+    def test_selects_timeouts(self):
+        fast = processors.Timeout(2, 5, 5)
+        pool = processors.ConnectionPool(self.server.host, timeouts={'GetFaxState': fast})
+        assert pool.timeout_for('GetFaxState') is fast
+        assert pool.timeout_for('GetFile') is processors.LONG_TIMEOUT
+        assert pool.timeout_for('Ping') is processors.ACTION_TIMEOUTS['Ping']
+        assert pool.timeout_for('Create') is processors.DEFAULT_TIMEOUT
+        with processors.request_timeout(fast):
+            assert pool.timeout_for('Create') is fast
+        assert pool.timeout_for('Create') is processors.DEFAULT_TIMEOUT
+    
+    def test_times_out_slow_responses(self):
+        self.server.handlers['/Common/ListTimezones'] = lambda request: time.sleep(1) or success()
+        with processors.request_timeout(processors.Timeout(connect=5, read=0.2)):
+            self.assertRaises(socket.timeout, self.pamfax.list_timezones)
+        self.server.handlers['/Common/ListTimezones'] = lambda request: time.sleep(0.2) or success()
+        with processors.request_timeout(processors.Timeout(connect=5, read=0.5, total=0.1)):
+            self.assertRaises(socket.timeout, self.pamfax.list_timezones)
+    
+    def test_hedges_only_after_warm_up(self):
+        pamfax = self.server.pamfax(hedging=processors.Hedging(min_samples=3, budget=1.0))
+        states = []
+        def fax_state(request):
+            states.append(request)
+            if len(states) == 4:
+                time.sleep(1)
+            return success(FaxContainer={'state': 'ready'})
+        self.server.handlers['/FaxJob/GetFaxState'] = fax_state
+        for i in range(3):
+            pamfax.get_fax_state()
+        assert len(states) == 3 and pamfax.http.stats['hedged_requests'] == 0
+        started = time.time()
+        pamfax.get_fax_state()
+        assert time.time() - started < 1
+        assert len(states) == 5 and pamfax.http.stats['hedged_requests'] == 1 and pamfax.http.stats['hedges_won'] == 1
+    
+    def test_hedges_idempotent_actions_only(self):
+        pamfax = self.server.pamfax(hedging=processors.Hedging(actions=('Send',), min_samples=1, budget=1.0))
+        sends = []
+        def send(request):
+            sends.append(request)
+            if len(sends) == 2:
+                time.sleep(0.3)
+            return success()
+        self.server.handlers['/FaxJob/Send'] = send
+        pamfax.send()
+        pamfax.send()
+        assert len(sends) == 2 and pamfax.http.stats['hedged_requests'] == 0
+    
+    def test_caches_responses_until_invalidated(self):
+        for i in range(2):
+            self.pamfax.get_number_info('+49301234567')
+            self.pamfax.list_timezones()
+        assert self.server.paths().count('/NumberInfo/GetNumberInfo') == 1 and self.server.paths().count('/Common/ListTimezones') == 1
+        assert self.pamfax.http.stats['cache_hits'] == 2
+        self.pamfax.set_recipients(['+49301234567'])
+        self.pamfax.list_timezones()
+        assert self.server.paths().count('/Common/ListTimezones') == 1
+        # a read answered while the call is under way is dropped with the rest
+        self.server.handlers['/UserInfo/SaveUser'] = lambda request: self.pamfax.list_timezones() and success()
+        self.pamfax.save_user()
+        self.pamfax.list_timezones()
+        self.pamfax.get_number_info('+49301234567')
+        assert self.server.paths().count('/Common/ListTimezones') == 3 and self.server.paths().count('/NumberInfo/GetNumberInfo') == 1
+    
+    def test_breaks_circuit_and_recovers(self):
+        down = lambda request: (503, 'text/plain', b'down', {})
+        pamfax = self.server.pamfax(breaker=processors.CircuitBreaker(failures=2, reset_timeout=0.2))
+        breaker = pamfax.http.breaker
+        self.server.handlers['/FaxJob/GetFaxState'] = self.server.handlers['/Session/Ping'] = down
+        for i in range(2):
+            self.assertRaises(HTTPException, pamfax.get_fax_state)
+        assert breaker.state() == processors.OPEN
+        count = len(self.server.requests)
+        self.assertRaises(processors.CircuitOpenError, pamfax.get_fax_state)
+        assert len(self.server.requests) == count
+        assert pamfax.http.stats['rejected_requests'] == 1
+        time.sleep(0.25)
+        assert breaker.state() == processors.HALF_OPEN
+        self.assertRaises(processors.CircuitOpenError, pamfax.get_fax_state)
+        assert self.server.paths()[count:] == ['/Session/Ping']
+        assert breaker.state() == processors.OPEN
+        del self.server.handlers['/FaxJob/GetFaxState'], self.server.handlers['/Session/Ping']
+        time.sleep(0.25)
+        assert pamfax.get_fax_state()['result']['code'] == 'success'
+        assert self.server.paths()[-2:] == ['/Session/Ping', '/FaxJob/GetFaxState']
+        assert breaker.state() == processors.CLOSED
+    
+    def test_probes_again_after_interrupted_probe(self):
+        interrupted = []
+        def probe():
+            if not interrupted:
+                interrupted.append(True)
+                raise KeyboardInterrupt()
+        pamfax = self.server.pamfax(breaker=processors.CircuitBreaker(failures=1, reset_timeout=0.1, probe=probe))
+        self.server.handlers['/FaxJob/GetFaxState'] = lambda request: (503, 'text/plain', b'down', {})
+        self.assertRaises(HTTPException, pamfax.get_fax_state)
+        del self.server.handlers['/FaxJob/GetFaxState']
+        time.sleep(0.15)
+        self.assertRaises(KeyboardInterrupt, pamfax.get_fax_state)
+        assert pamfax.get_fax_state()['result']['code'] == 'success'
+        assert pamfax.http.breaker.state() == processors.CLOSED
+    
+    def test_uploads_multipart_with_exact_length(self):
+        filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Dynaptico.pdf')
+        progress = []
+        self.pamfax.add_file(filename, progress=lambda sent, total: progress.append((sent, total)))
+        request = self.server.requests[-1]
+        assert (request['method'], request['path']) == ('POST', '/FaxJob/AddFile')
+        assert int(request['headers']['content-length']) == len(request['body'])
+        assert progress[-1] == (len(request['body']), len(request['body']))
+        boundary = request['headers']['content-type'].split('boundary=', 1)[1]
+        assert request['body'].endswith(('--%s--\r\n' % boundary).encode('ascii'))
+        f = open(filename, 'rb')
+        try:
+            assert f.read() in request['body']
+            encoder = processors.MultipartEncoder([('filename', 'Dynaptico.pdf')], [('file', 'Dynaptico.pdf', f), ('note', 'note.txt', 'a note')])
+            assert len(encoder) == len(b''.join(encoder)) == len(b''.join(encoder))
+        finally:
+            f.close()
+
+class TestNumberValidator(unittest.TestCase):
+    """Tests for pamfax.faxnumbers"""
+    
+    def test_normalizes_numbers(self):
+        validator = NumberValidator([('DE', '49', 2), ('US', '1', 1), ('AG', '1268', 3)], default_country='DE')
+        assert validator.normalize('030 / 123 456-7') == '+49301234567'
+        assert validator.normalize('0049 30 1234567') == '+49301234567'
+        assert validator.normalize('+1 (212) 555-0100') == '+12125550100'
+        assert validator.normalize_all(['12', '+99 123456789', '+49 30 abc']) == [None, None, None]
+        assert validator.country('+1 268 460 1234') == ('AG', 3)
+        assert validator('+49301234567') and not validator('+4930')
+    
+    def test_loads_countries_from_pamfax(self):
+        server = FakeServer()
+        try:
+            server.handlers['/Common/ListZones'] = lambda request: success(Zones={'content': [{'zone': 2}]})
+            server.handlers['/Common/ListCountriesForZone'] = lambda request: success(Countries={'content': [{'code': 'DE', 'prefix': '+49'}]})
+            validator = NumberValidator.from_pamfax(server.pamfax())
+            assert validator.countries == [('DE', '49', 2)]
+            server.handlers['/Common/ListZones'] = lambda request: json_response({'result': {'code': 'error', 'message': 'no zones'}})
+            self.assertRaises(Exception, NumberValidator.from_pamfax, server.pamfax())
+        finally:
+            server.stop()
+    
+    def test_rejects_unknown_default_country(self):
+        self.assertRaises(ValueError, NumberValidator, [('DE', '49', 2)], 'FR')
+
+class TestRecipients(unittest.TestCase):
+    """Tests for pamfax.recipients"""
+    
+    def setUp(self):
+        self.server = FakeServer()
+        self.pamfax = self.server.pamfax()
+    
+    def tearDown(self):
+        self.server.stop()
+    
+    def test_validates_concurrently_with_bounded_cache(self):
+        lookups = []
+        def number_info(request):
+            lookups.append(time.time())
+            time.sleep(0.2)
+            if request['params']['faxnumber'] == '+49301234569':
+                return json_response({'result': {'code': 'invalid_number', 'message': 'invalid'}})
+            return success()
+        self.server.handlers['/NumberInfo/GetNumberInfo'] = number_info
+        cache = NumberInfoCache(self.pamfax, size=2)
+        numbers = ['+49 30 1234567', '0049301234567', '+49301234568', '+49301234569', '+49301234560', 'nonsense']
+        counts = load_recipients(self.pamfax, numbers, batch_size=2, threads=4, validator=cache)
+        assert counts == {'added': 3, 'duplicate': 1, 'invalid': 2, 'failed': 0}
+        assert len(lookups) == 4 and max(lookups) - min(lookups) < 0.2
+        assert len(cache) == 2
+        added = [request['params']['numbers[0]'] for request in self.server.requests if request['path'] == '/FaxJob/AddRecipients']
+        assert len(added) == 2
+
+class TestCostEstimator(unittest.TestCase):
+    """Tests for pamfax.pricing"""
+    
+    def setUp(self):
+        self.server = FakeServer()
+        self.pamfax = self.server.pamfax()
+    
+    def tearDown(self):
+        self.server.stop()
+    
+    def test_estimates_partial_totals(self):
+        def page_price(request):
+            if request['params']['faxnumber'].startswith('+1'):
+                return json_response({'result': {'code': 'error', 'message': 'no price'}})
+            return success(Price={'price_per_page': '0.10', 'currency': 'EUR'})
+        self.server.handlers['/NumberInfo/GetPagePrice'] = page_price
+        validator = NumberValidator([('DE', '49', 2), ('US', '1', 1)])
+        estimator = CostEstimator(self.pamfax, validator)
+        estimate = estimator.estimate(['+49301234567', '+49301234568', '+12125550100', 'nonsense'], pages=3)
+        assert estimate['invalid'] == 1 and estimate['unpriced'] == 1 and estimate['currency'] == 'EUR'
+        assert abs(estimate['total'] - 0.6) < 1e-9
+        assert estimate['groups'][('US', 1)]['error'] == 'no price' and estimate['groups'][('US', 1)]['cost'] is None
+        assert self.server.paths().count('/NumberInfo/GetPagePrice') == 2
+
+class TestFaxBuilder(unittest.TestCase):
+    """Tests for pamfax.builder and pamfax.futures"""
+    
+    def setUp(self):
+        self.server = FakeServer()
+        self.server.handlers['/FaxJob/GetFaxState'] = lambda request: success(Files={'content': [{'state': 'success'}]})
+        self.server.handlers['/FaxJob/Send'] = lambda request: success(FaxContainer={'uuid': 'fax1'})
+        self.pamfax = self.server.pamfax()
+    
+    def tearDown(self):
+        self.server.stop()
+    
+    def test_sends_with_steps_overlapped(self):
+        builder = FaxBuilder(self.pamfax).add_remote_file('https://example.com/fax.pdf').add_recipient('+49301234567', 'Test').set_cover(1, 'Hello')
+        future = builder.send(interval=0)
+        assert future.result(10)['FaxContainer']['uuid'] == 'fax1'
+        paths = self.server.paths()
+        assert paths[1] == '/FaxJob/Create' and paths[-1] == '/FaxJob/Send'
+        assert set(paths[2:-2]) == set(['/FaxJob/AddRemoteFile', '/FaxJob/SetRecipients', '/FaxJob/SetCover'])
+    
+    def test_fails_with_first_error(self):
+        self.server.handlers['/FaxJob/SetCover'] = lambda request: json_response({'result': {'code': 'error', 'message': 'no cover'}})
+        future = FaxBuilder(self.pamfax).add_recipient('+49301234567').set_cover(99).send(interval=0)
+        self.assertRaises(Exception, future.result, 10)
+        assert str(future.exception()) == 'no cover'
+        assert '/FaxJob/Send' not in self.server.paths()
+        future = FaxBuilder(self.pamfax).send()
+        assert future.done() and future.exception() is not None
+    
+    def test_runs_functions_asynchronously(self):
+        future = run_async(lambda a, b: a + b, 1, b=2)
+        assert future.result(10) == 3
+
+class TestFaxTemplate(unittest.TestCase):
+    """Tests for pamfax.templates"""
+    
+    def setUp(self):
+        self.server = FakeServer()
+        self.server.handlers['/FaxJob/CloneFax'] = lambda request: success(FaxContainer={'uuid': 'clone'})
+        self.pamfax = self.server.pamfax()
+    
+    def tearDown(self):
+        self.server.stop()
+    
+    def wait_for(self, path, count):
+        deadline = time.time() + 5
+        while self.server.paths().count(path) < count and time.time() < deadline:
+            time.sleep(0.01)
+        return self.server.paths().count(path) >= count
+    
+    def test_sends_warm_clone_and_warms_next(self):
+        template = FaxTemplate('template', self.pamfax)
+        assert self.wait_for('/FaxJob/CloneFax', 1)
+        template.send(['+49301234567'])
+        paths = self.server.paths()
+        assert paths[-2:] == ['/FaxJob/SetRecipients', '/FaxJob/Send'] and paths.count('/FaxJob/CloneFax') == 1
+        assert self.wait_for('/FaxJob/CloneFax', 2)
+        template.send(['+49301234568'])
+        assert self.server.paths().count('/FaxJob/CloneFax') == 2
+    
+    def test_reports_failed_clone(self):
+        self.server.handlers['/FaxJob/CloneFax'] = lambda request: json_response({'result': {'code': 'error', 'message': 'no such fax'}})
+        with self.assertLogs('pamfax', 'WARNING') as logs:
+            template = FaxTemplate('template', self.pamfax)
+            assert self.wait_for('/FaxJob/CloneFax', 1)
+            with self.assertRaises(Exception) as raised:
+                template.send(['+49301234567'])
+        assert str(raised.exception) == 'no such fax'
+        assert any('no such fax' in message for message in logs.output)
+        assert '/FaxJob/Send' not in self.server.paths()
+
+class TestResponse(unittest.TestCase):
+    """Tests for binary responses of pamfax.processors"""
+    
+    def setUp(self):
+        self.server = FakeServer()
+        self.data = os.urandom(5000)
+        self.server.handlers['/Common/GetFile'] = lambda request: (200, 'application/pdf', self.data, {'Content-Disposition': 'attachment; filename="fax.pdf"'})
+        self.pamfax = self.server.pamfax()
+        self.threshold = processors.SPOOL_THRESHOLD
+        self.directory = tempfile.mkdtemp(prefix='pamfax-test-')
+    
+    def tearDown(self):
+        processors.SPOOL_THRESHOLD = self.threshold
+        shutil.rmtree(self.directory, True)
+        self.server.stop()
+    
+    def test_keeps_small_bodies_in_memory(self):
+        response = self.pamfax.get_file('file1')
+        assert response.body == self.data and response.size == len(self.data)
+        content, content_type = response
+        assert content == self.data and content_type == 'application/pdf'
+        assert response.filename == 'fax.pdf'
+    
+    def test_spools_large_bodies(self):
+        processors.SPOOL_THRESHOLD = 1024
+        response = self.pamfax.get_file('file1')
+        try:
+            assert response.body is None
+            assert bytes(response.view()) == self.data
+            assert response[0] == self.data
+            path = response.save(self.directory)
+            assert path == os.path.join(self.directory, 'fax.pdf')
+            f = open(path, 'rb')
+            try:
+                assert f.read() == self.data
+            finally:
+                f.close()
+        finally:
+            response.close()
+    
+    def test_streams_to_sink(self):
+        sink = io.BytesIO()
+        response = self.pamfax.get_file('file1', sink=sink)
+        assert response.body is sink and sink.getvalue() == self.data
+
+class TestInboxArchiver(unittest.TestCase):
+    """Tests for pamfax.archive and pamfax.responses.pages"""
+    
+    def setUp(self):
+        self.server = FakeServer()
+        self.faxes = [{'uuid': 'fax%d' % i, 'file_uuid': 'file%d' % i} for i in range(3)]
+        def inbox(request):
+            size = int(request['params']['items_per_page'])
+            start = (int(request['params']['current_page']) - 1) * size
+            return success(InboxFaxes={'content': self.faxes[start:start + size]})
+        self.server.handlers['/FaxHistory/ListInboxFaxes'] = inbox
+        self.server.handlers['/Common/GetFile'] = lambda request: (200, 'application/pdf', request['params']['file_uuid'].encode('ascii'), {})
+        self.server.handlers['/FaxHistory/SetFaxesAsRead'] = lambda request: json_response({'result': {'code': 'error', 'message': 'not marked'}})
+        self.pamfax = self.server.pamfax()
+        self.directory = tempfile.mkdtemp(prefix='pamfax-test-')
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+        self.server.stop()
+    
+    def test_archives_new_faxes_only(self):
+        os.makedirs(os.path.join(self.directory, 'tmp'))
+        open(os.path.join(self.directory, 'tmp', 'crashed'), 'w').close()
+        archiver = InboxArchiver(self.pamfax, self.directory, threads=2)
+        try:
+            assert os.listdir(os.path.join(self.directory, 'tmp')) == []
+            assert archiver.archive(items_per_page=2) == {'stored': 3, 'skipped': 0, 'failed': 0, 'unmarked': 3}
+            assert self.server.paths().count('/FaxHistory/ListInboxFaxes') == 2
+            f = open(archiver.path('file1'), 'rb')
+            try:
+                assert f.read() == b'file1'
+            finally:
+                f.close()
+            self.faxes.append({'uuid': 'fax3', 'file_uuid': 'file3'})
+            self.server.handlers['/FaxHistory/SetFaxesAsRead'] = lambda request: success()
+            assert archiver.archive(items_per_page=2) == {'stored': 1, 'skipped': 3, 'failed': 0, 'unmarked': 0}
+            marked = [request['params'] for request in self.server.requests if request['path'] == '/FaxHistory/SetFaxesAsRead']
+            assert marked[-1]['uuids[0]'] == 'fax3' and 'uuids[1]' not in marked[-1]
+        finally:
+            archiver.close()
+    
+    def test_iterates_pages(self):
+        assert [fax['uuid'] for fax in self.pamfax.iter_list_inbox_faxes(items_per_page=2)] == ['fax0', 'fax1', 'fax2']
+
+class TestPreviewCache(unittest.TestCase):
+    """Tests for pamfax.previews"""
+    
+    def setUp(self):
+        self.server = FakeServer()
+        self.server.handlers['/Common/GetPagePreview'] = lambda request: (200, 'image/png', ('%(uuid)s/%(page_no)s' % request['params']).encode('ascii'), {})
+        self.pamfax = self.server.pamfax()
+    
+    def tearDown(self):
+        self.server.stop()
+    
+    def test_prefetches_known_pages_only(self):
+        cache = PreviewCache(self.pamfax, max_items=2, prefetch=3)
+        preview = cache.get_page_preview('fax1', 1, pages=2)
+        assert isinstance(preview, processors.Response) and preview.content == b'fax1/1' and preview.content_type == 'image/png'
+        time.sleep(0.5)
+        assert sorted(request['params']['page_no'] for request in self.server.requests if request['path'] == '/Common/GetPagePreview') == ['1', '2']
+        assert cache.get_page_preview('fax1', '2').content == b'fax1/2'
+        assert self.server.paths().count('/Common/GetPagePreview') == 2
+    
+    def test_prunes_sizes_and_matches_string_sizes(self):
+        cache = PreviewCache(self.pamfax, max_items=2, prefetch=0)
+        cache.get_page_preview('fax1', 1, 400, 400)
+        preview = cache.get_page_preview('fax1', '1', '200', '200')
+        assert isinstance(preview, processors.Response) and self.server.paths().count('/Common/GetPagePreview') == 1
+        cache.get_page_preview('fax2', 1)
+        cache.get_page_preview('fax3', 1)
+        assert ('fax1', 1) not in cache._sizes and len(cache._sizes) == 2
+
+class TestNotificationReceiver(unittest.TestCase):
+    """Tests for pamfax.notifications"""
+    
+    def setUp(self):
+        self.receiver = NotificationReceiver()
+        self.receiver.start()
+    
+    def tearDown(self):
+        self.receiver.stop()
+    
+    def post(self, body, content_type='application/json'):
+        http = HTTPConnection(self.receiver.host, self.receiver.port)
+        try:
+            http.request('POST', self.receiver.path, body, {'Content-Type': content_type})
+            return http.getresponse().status
+        finally:
+            http.close()
+    
+    def test_resolves_posted_notifications(self):
+        future = self.receiver.expect('fax1')
+        assert self.post(json.dumps({'fax_uuid': 'fax1', 'type': 'FaxSucceeded'})) == 200
+        assert future.result(5)['type'] == 'faxsucceeded'
+        future = self.receiver.expect('fax2')
+        assert self.post('uuid=fax2&state=failure', 'application/x-www-form-urlencoded') == 200
+        assert future.result(5)['type'] == 'failure'
+    
+    def test_rejects_bad_bodies(self):
+        assert self.post('{"fax_uuid": ') == 400
+        assert self.post('["fax1"]') == 400
+        assert self.post(b'\xff\xfe', 'application/x-www-form-urlencoded') == 400
+    
+    def test_checks_secret(self):
+        receiver = NotificationReceiver(secret='s3cr&t =/\u00e9')
+        receiver.start()
+        try:
+            url = urlparse(receiver.url)
+            statuses = []
+            for path in ('%s?%s' % (url.path, url.query), url.path, url.path + '?secret=s3cr'):
+                http = HTTPConnection(receiver.host, receiver.port)
+                try:
+                    http.request('GET', path + ('&' if '?' in path else '?') + 'fax_uuid=fax1&type=faxsucceeded')
+                    statuses.append(http.getresponse().status)
+                finally:
+                    http.close()
+            assert statuses == [200, 404, 404]
+        finally:
+            receiver.stop()
+
+class TestOutbox(unittest.TestCase):
+    """Tests for pamfax.outbox"""
+    
+    def setUp(self):
+        self.server = FakeServer()
+        self.server.handlers['/FaxJob/Create'] = lambda request: success(FaxContainer={'uuid': 'fax1'})
+        self.pamfax = self.server.pamfax()
+        self.directory = tempfile.mkdtemp(prefix='pamfax-test-')
+        self.outbox = Outbox(os.path.join(self.directory, 'outbox.db'), max_attempts=2, retry_delay=0)
+    
+    def tearDown(self):
+        self.outbox.close()
+        shutil.rmtree(self.directory, True)
+        self.server.stop()
+    
+    def test_clears_fax_before_rebuilding(self):
+        sends = []
+        def send(request):
+            sends.append(request)
+            if len(sends) == 1:
+                return json_response({'result': {'code': 'error', 'message': 'try again'}})
+            return success()
+        self.server.handlers['/FaxJob/Send'] = send
+        self.server.handlers['/FaxHistory/GetFaxDetails'] = lambda request: success(FaxContainer={'uuid': 'fax1', 'state': 'ready_to_send'})
+        job_id = self.outbox.enqueue(['+49301234567'], remote_files=['https://example.com/fax.pdf'])
+        self.outbox.process(self.pamfax, 'worker')
+        assert '/FaxJob/RemoveAllFiles' not in self.server.paths()
+        self.outbox.process(self.pamfax, 'worker')
+        paths = self.server.paths()
+        rebuild = paths[paths.index('/FaxHistory/GetFaxDetails'):]
+        assert rebuild.index('/FaxJob/RemoveAllFiles') < rebuild.index('/FaxJob/AddRemoteFile')
+        assert rebuild.index('/FaxJob/RemoveAllRecipients') < rebuild.index('/FaxJob/SetRecipients')
+        job = self.outbox.get(job_id)
+        assert job['state'] == SENT and job['attempts'] == 2 and len(sends) == 2
+    
+    def test_finds_sent_fax_by_state(self):
+        self.server.handlers['/FaxJob/Send'] = lambda request: json_response({'result': {'code': 'error', 'message': 'timed out'}})
+        self.server.handlers['/FaxHistory/GetFaxDetails'] = lambda request: success(FaxContainer={'uuid': 'fax1', 'state': 'sending'})
+        job_id = self.outbox.enqueue(['+49301234567'])
+        self.outbox.process(self.pamfax, 'worker')
+        self.outbox.process(self.pamfax, 'worker')
+        assert self.outbox.get(job_id)['state'] == SENT and self.server.paths().count('/FaxJob/Send') == 1
+    
+    def test_keeps_sending_job_when_lookup_fails(self):
+        self.server.handlers['/FaxJob/Send'] = lambda request: json_response({'result': {'code': 'error', 'message': 'timed out'}})
+        self.server.handlers['/FaxHistory/GetFaxDetails'] = lambda request: json_response({'result': {'code': 'server_error', 'message': 'try later'}})
+        self.outbox.max_attempts = 5
+        job_id = self.outbox.enqueue(['+49301234567'])
+        self.outbox.process(self.pamfax, 'worker')
+        self.outbox.process(self.pamfax, 'worker')
+        job = self.outbox.get(job_id)
+        assert job['state'] == SENDING and job['error'] == 'try later'
+        assert self.server.paths().count('/FaxJob/Send') == 1
+        self.server.handlers['/FaxHistory/GetFaxDetails'] = lambda request: json_response({'result': {'code': 'fax_not_found', 'message': 'unknown fax'}})
+        assert not self.outbox._was_sent(self.pamfax, 'fax1')
+    
+    def test_fails_jobs_whose_workers_die(self):
+        job_id = self.outbox.enqueue(['+49301234567'])
+        self.outbox.lease_seconds = 0
+        assert self.outbox.lease('worker1')['attempts'] == 1
+        assert self.outbox.lease('worker2')['attempts'] == 2
+        assert self.outbox.lease('worker3') is None
+        job = self.outbox.get(job_id)
+        assert job['state'] == FAILED and job['error'] == 'gave up after 2 attempts'
+
+class TestStatusScheduler(unittest.TestCase):
+    """Tests for pamfax.scheduler"""
+    
+    def setUp(self):
+        self.server = FakeServer()
+        self.pamfax = self.server.pamfax()
+    
+    def tearDown(self):
+        self.server.stop()
+    
+    def test_reschedules_when_checks_fail(self):
+        self.server.handlers['/FaxHistory/ListOutboxFaxes'] = lambda request: json_response({'result': {'code': 'error', 'message': 'unavailable'}})
+        done = []
+        scheduler = StatusScheduler(self.pamfax, lambda uuid, fax: done.append(uuid), batch_threshold=10)
+        now = time.time()
+        for i in range(20):
+            scheduler.track('fax%d' % i, sent_at=now - 3600)
+        assert scheduler.check(now) == 0
+        assert len(scheduler) == 20 and scheduler.next_check() > now
+        self.server.handlers['/FaxHistory/ListOutboxFaxes'] = lambda request: success(OutboxFaxes={'content': []})
+        self.server.handlers['/FaxHistory/ListSentFaxes'] = lambda request: success(SentFaxes={'content': [{'uuid': 'fax%d' % i, 'state': 'success'} for i in range(20)]})
+        assert scheduler.check(scheduler.next_check()) == 20
+        assert len(done) == 20 and scheduler.next_check() is None
+    
+    def test_reconciles_from_lists_and_stragglers(self):
+        self.server.handlers['/FaxHistory/ListOutboxFaxes'] = lambda request: json_response({'result': {'code': 'error', 'message': 'unavailable'}})
+        reconciler = StatusReconciler(self.pamfax)
+        for uuid in ('fax1', 'fax2', 'fax3', 'fax4'):
+            reconciler.track(uuid)
+        self.assertRaises(Exception, reconciler.reconcile)
+        assert len(reconciler.tracked) == 4
+        self.server.handlers['/FaxHistory/ListOutboxFaxes'] = lambda request: success(OutboxFaxes={'content': [{'uuid': 'fax1'}]})
+        self.server.handlers['/FaxHistory/ListSentFaxes'] = lambda request: success(SentFaxes={'content': [{'uuid': 'fax2', 'state': 'success'}]})
+        self.server.handlers['/FaxHistory/GetFaxDetails'] = lambda request: success(FaxContainer={'uuid': request['params']['uuid'], 'status': 'failure' if request['params']['uuid'] == 'fax3' else 'sending'})
+        assert sorted(reconciler.reconcile()) == ['fax2', 'fax3']
+        assert reconciler.tracked == set(['fax1', 'fax4'])
+
+class _BrokenPamFax:
+    """A PamFax class whose sessions can not be set up."""
+    
+    def __init__(self, **kwargs):
+        raise Exception('login failed')
+
+class TestWorkerRunner(unittest.TestCase):
+    """Tests for pamfax.workers"""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pamfax-test-')
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+    
+    def test_stops_when_sessions_fail(self):
+        results = []
+        runner = WorkerRunner(os.path.join(self.directory, 'outbox.db'), {'username': 'username'}, processes=2,
+                              callback=results.append, idle_interval=0.1, pamfax_class=_BrokenPamFax)
+        runner.start()
+        runner.stop(10)
+        assert runner.counts == {ERROR: 2}
+        assert [result['error'] for result in results] == ['login failed', 'login failed']
+    
+    def test_logs_in_again_when_session_expires(self):
+        server = FakeServer()
+        try:
+            tokens = []
+            def verify_user(request):
+                tokens.append('token%d' % (len(tokens) + 1))
+                return success(UserToken={'token': tokens[-1]})
+            def ping(request):
+                if request['params']['usertoken'] == 'token1':
+                    return json_response({'result': {'code': 'not_logged_in', 'message': 'session expired'}})
+                return success()
+            server.handlers['/Session/VerifyUser'] = verify_user
+            server.handlers['/Session/Ping'] = ping
+            filename = os.path.join(self.directory, 'outbox.db')
+            token_cache = os.path.join(self.directory, 'tokens.json')
+            results = []
+            runner = WorkerRunner(filename, {'username': 'username', 'password': 'password', 'host': server.host, 'context': client_context()}, processes=1,
+                                  token_cache=token_cache, callback=results.append, idle_interval=0.05, keepalive_interval=0.1)
+            runner.start()
+            try:
+                deadline = time.time() + 10
+                while len(tokens) < 2 and time.time() < deadline:
+                    time.sleep(0.01)
+                outbox = Outbox(filename)
+                outbox.enqueue(['+49301234567'])
+                outbox.close()
+                while not results and time.time() < deadline:
+                    time.sleep(0.01)
+            finally:
+                runner.stop(10)
+            assert tokens == ['token1', 'token2'] and results[0]['state'] == SENT
+            sends = [request for request in server.requests if request['path'] == '/FaxJob/Send']
+            assert sends[0]['params']['usertoken'] == 'token2'
+            assert TokenCache(token_cache).get('username#0') == 'token2'
+        finally:
+            server.stop()
+
+if __name__ == '__main__':
+    unittest.main()